@@ -5,10 +5,13 @@ import logging
 import uuid
 from typing import Any, Dict, List, Optional
 
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils import timezone
 
+from apps.integrations.concurrency import downstream_semaphore, http2_available
 from apps.integrations.exceptions import AlegraAPIError, AlegraCredentialError
 from apps.integrations.models import IntegrationMessage
 from apps.integrations.error_codes import extract_error_message, map_status
@@ -202,3 +205,143 @@ class AlegraClient:
     def create_invoice(self, invoice_payload: Dict[str, Any]) -> Dict[str, Any]:
         """Creates a new sales invoice in Alegra."""
         return self.request("POST", "invoices", json=invoice_payload, event_type="invoice.create", external_reference=invoice_payload.get("client", {}).get("id"))
+
+
+class AsyncAlegraClient(AlegraClient):
+    """httpx-based Alegra client for fan-out; same method surface as AlegraClient, awaitable."""
+
+    def __init__(
+        self,
+        organization_id: uuid.UUID,
+        base_url: str,
+        api_key: str,
+        api_secret: str,
+        timeout_s: int,
+        max_retries: int,
+        *,
+        http2: Optional[bool] = None,
+        max_concurrency: Optional[int] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
+        self.organization_id = organization_id
+        self.base_url = base_url
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.timeout = timeout_s
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency or getattr(settings, "ALEGRA_MAX_CONCURRENCY", 5)
+
+        if http2 is None:
+            http2 = getattr(settings, "ALEGRA_HTTP2", False)
+        if http2 and not http2_available():
+            logger.warning("HTTP/2 solicitado para Alegra pero el paquete h2 no está instalado; usando HTTP/1.1.")
+            http2 = False
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(
+            http2=http2,
+            timeout=timeout_s,
+            limits=httpx.Limits(max_connections=self.max_concurrency * 2),
+        )
+
+    async def __aenter__(self) -> "AsyncAlegraClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        event_type: str = "",
+        external_reference: str = "",
+    ) -> Dict[str, Any]:
+        url = self._build_url(path)
+        message = await sync_to_async(self._log_outbound_message)(
+            method=method,
+            url=url,
+            params=params,
+            payload=json,
+            event_type=event_type,
+            external_reference=external_reference,
+        )
+
+        started_at = timezone.now()
+        latency_ms: Optional[int] = None
+        try:
+            async with downstream_semaphore(self.base_url, self.max_concurrency):
+                response = await self.client.request(
+                    method=method.upper(),
+                    url=url,
+                    params=params,
+                    json=json,
+                    headers=self._build_headers(),
+                )
+            latency_ms = int((timezone.now() - started_at).total_seconds() * 1000)
+            await sync_to_async(message.mark_dispatched)(
+                attempted_at=started_at,
+                http_status=response.status_code,
+                latency_ms=latency_ms,
+            )
+        except httpx.HTTPError as exc:
+            logger.exception("Error de red al llamar a Alegra")
+            await sync_to_async(message.mark_failed)(
+                "network_error",
+                str(exc),
+                retryable=True,
+            )
+            raise AlegraAPIError(
+                "Error de red al comunicarse con Alegra",
+                status_code=None,
+                error_code="network_error",
+                retryable=True,
+            ) from exc
+
+        body = self._parse_response_body(response)
+        if response.is_success:
+            await sync_to_async(message.mark_processed)(body, http_status=response.status_code, latency_ms=latency_ms)
+            return body
+
+        error_code, retryable = map_status(response.status_code)
+        error_message = extract_error_message(body)
+        await sync_to_async(message.mark_failed)(
+            error_code,
+            error_message,
+            http_status=response.status_code,
+            retryable=retryable,
+        )
+        raise AlegraAPIError(
+            f"Alegra respondió {response.status_code}: {error_message}",
+            status_code=response.status_code,
+            error_code=error_code,
+            retryable=retryable,
+            payload=body if isinstance(body, dict) else {"raw": body},
+        )
+
+    async def get_customer(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieves a single customer by ID."""
+        try:
+            return await self.request("GET", f"contacts/{customer_id}", event_type="customer.get", external_reference=customer_id)
+        except AlegraAPIError as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    async def search_customers(self, query: str) -> List[Dict[str, Any]]:
+        """Searches for customers by query (e.g., email, identification)."""
+        return await self.request("GET", "contacts", params={"query": query}, event_type="customer.search", external_reference=query)
+
+    async def create_customer(self, customer_payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates a new customer in Alegra."""
+        return await self.request("POST", "contacts", json=customer_payload, event_type="customer.create", external_reference=customer_payload.get("name"))
+
+    async def create_invoice(self, invoice_payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates a new sales invoice in Alegra."""
+        return await self.request("POST", "invoices", json=invoice_payload, event_type="invoice.create", external_reference=invoice_payload.get("client", {}).get("id"))
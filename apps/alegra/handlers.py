@@ -9,29 +9,23 @@ from apps.integrations.router import registry
 
 SUPPORTED_DOCTYPES = {"POS Invoice", "Sales Invoice"}
 
-@registry.register(IntegrationMessage.INTEGRATION_ALEGRA, "on_submit")
+@registry.register(IntegrationMessage.INTEGRATION_ALEGRA, "on_submit", when={"doctype": SUPPORTED_DOCTYPES})
 def sync_invoice_to_alegra(message: IntegrationMessage):
     print("--- PASO 13: HANDLER sync_invoice_to_alegra INICIADO ---")
     payload = message.payload or {}
     doctype = payload.get("doctype")
     print(f"--- PASO 14: DOCTYPE ---\n{doctype}")
-    if doctype not in SUPPORTED_DOCTYPES:
-        return {"skipped": True, "reason": "unsupported_doctype", "doctype": doctype}
 
     event = None
     if doctype == "POS Invoice":
         event = ErpnextPosInvoiceSubmitted(
             event_id=str(message.id),
-            event_type="ErpnextPosInvoiceSubmitted",
-            payload=payload,
             organization_id=message.organization_id,
             message_id=message.id,
         )
     elif doctype == "Sales Invoice":
         event = ErpnextSalesInvoiceSubmitted(
             event_id=str(message.id),
-            event_type="ErpnextSalesInvoiceSubmitted",
-            payload=payload,
             organization_id=message.organization_id,
             message_id=message.id,
         )
@@ -65,7 +65,7 @@ class ERPNextToAlegraInvoiceService:
 
     def _load_alegra_credential(self, organization: Organization) -> AlegraCredential:
         try:
-            return AlegraCredential.objects.get(organization=organization, is_active=True)
+            return AlegraCredential.objects.get(organization_id=organization.id, is_active=True)
         except AlegraCredential.DoesNotExist:
             raise WebhookValidationError(f"Alegra credentials for organization {organization.id} not found.")
 
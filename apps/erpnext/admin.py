@@ -1,7 +1,14 @@
 
 from django.contrib import admin
 
-from .models import ERPNextCredential
+from .models import (
+    BackorderLine,
+    ERPNextCredential,
+    InventoryLevel,
+    InventorySyncState,
+    StatusPropagation,
+    StockReservation,
+)
 
 
 @admin.register(ERPNextCredential)
@@ -12,8 +19,44 @@ class ERPNextCredentialAdmin(admin.ModelAdmin):
     readonly_fields = ("created_at", "updated_at", "id")
     fieldsets = (
         (None, {"fields": ("id", "organization_id", "erpnext_url")}),
-        ("Credentials", {"fields": ("api_key", "api_secret")}),
+        ("Credentials", {"fields": ("api_key", "api_secret", "webhook_secret")}),
         ("Status", {"fields": ("is_active",)}),
         ("Timestamps", {"fields": ("created_at", "updated_at")}),
     )
 
+
+@admin.register(InventoryLevel)
+class InventoryLevelAdmin(admin.ModelAdmin):
+    list_display = ("company", "item_code", "warehouse", "actual_qty", "reserved_qty", "modified", "synced_at")
+    list_filter = ("company",)
+    search_fields = ("item_code", "warehouse", "organization_id")
+
+
+@admin.register(InventorySyncState)
+class InventorySyncStateAdmin(admin.ModelAdmin):
+    list_display = ("organization_id", "company", "cursor", "last_synced_at", "last_error")
+    readonly_fields = ("updated_at",)
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("reference", "bucket", "quantity", "status", "expires_at", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("reference", "bucket__item_code", "bucket__warehouse")
+    raw_id_fields = ("bucket",)
+
+
+@admin.register(StatusPropagation)
+class StatusPropagationAdmin(admin.ModelAdmin):
+    list_display = ("company", "doctype", "docname", "status", "attempts", "enqueued_at", "sent_at", "next_attempt_at")
+    list_filter = ("status",)
+    search_fields = ("docname", "company", "organization_id")
+    readonly_fields = ("updated_at",)
+
+
+@admin.register(BackorderLine)
+class BackorderLineAdmin(admin.ModelAdmin):
+    list_display = ("company", "item_code", "warehouse", "quantity", "waiting_since", "fulfillment_order")
+    list_filter = ("company",)
+    search_fields = ("item_code", "warehouse", "fulfillment_order__order_id")
+    raw_id_fields = ("fulfillment_order",)
@@ -8,4 +8,6 @@ class ErpnextConfig(AppConfig):
     def ready(self) -> None:
         super().ready()
         from .handlers import register_handlers
+        from .gateway import item_index  # noqa: F401 - conecta el receiver que invalida el índice de item maps
+        from .services import backorders  # noqa: F401 - conecta el receiver que despierta backorders con stock nuevo
         register_handlers()
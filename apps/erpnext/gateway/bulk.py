@@ -0,0 +1,379 @@
+"""Bulk fulfillment: many pending orders of one distributor company in a single pass."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings as django_settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.erpnext.models import ERPNextCredential
+from apps.erpnext.services.backorders import clear_backorder_index, index_backorder
+from apps.erpnext.services.client import ERPNextClientError, get_client
+from apps.erpnext.services.inventory import InventoryMirror
+from apps.erpnext.services.reservations import ReservationLedger
+from apps.integrations.exceptions import FulfillmentConfigurationError, FulfillmentError
+from apps.integrations.models import FulfillmentOrder
+from apps.organizations.models import Organization
+
+from .documents import DocumentJob, DocumentSteps
+from .dto import MappedOrderLineDTO, OrderDTO
+from .exceptions import GatewayConfigurationError
+from .executor import FulfillmentExecutor, FulfillmentResult
+from .item_index import get_item_map_index
+from .mapper import LineMapper
+from .normalizer import OrderNormalizer
+from .service import propagate_fulfillment_status
+from .settings import GatewaySettings
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, Optional[str]]
+
+
+@dataclass
+class BulkOrderResult:
+    fulfillment_order_id: str
+    order_id: str
+    status: str
+    delivery_note: Optional[str] = None
+    sales_order: Optional[str] = None
+    error_code: str = ""
+    error_message: str = ""
+
+
+@dataclass
+class _PreparedOrder:
+    fulfillment_order: FulfillmentOrder
+    order: OrderDTO
+    lines: List[MappedOrderLineDTO]
+    snapshot: Dict[str, Any]
+    required: Dict[Key, Decimal] = field(default_factory=dict)
+    ledger: Optional[ReservationLedger] = None
+    # Un intento anterior llegó a ERPNext (ver DocumentSteps).
+    resumed: bool = False
+
+
+def oldest_first(fulfillment_order: FulfillmentOrder):
+    return (fulfillment_order.created_at, str(fulfillment_order.pk))
+
+
+class BulkFulfillmentEngine:
+    """Fulfill a burst of orders for one distributor with shared lookups and one stock check.
+
+    Orders are normalized and mapped together (one item-map index per seller),
+    their lines go into a single consolidated Bin check, and stock is
+    allocated all-or-nothing per order following ``priority`` (oldest first by
+    default): an order that does not fit goes to backorder without blocking
+    smaller orders behind it. SO/DN documents of the admitted orders are
+    created step by step with ``DocumentSteps`` (the same checkpoints as the
+    per-message service), with at most ``max_concurrency`` orders in flight.
+
+    Every order is claimed (pending/waiting_stock -> processing) before any
+    work; an order another run or the per-message service already holds is
+    reported as ``skipped``.
+    """
+
+    def __init__(
+        self,
+        organization: Organization,
+        distributor_company: Optional[str] = None,
+        *,
+        max_concurrency: Optional[int] = None,
+        priority: Callable[[FulfillmentOrder], Any] = oldest_first,
+    ) -> None:
+        self.organization = organization
+        try:
+            self.settings = GatewaySettings.for_organization(organization)
+        except GatewayConfigurationError as exc:
+            raise FulfillmentConfigurationError(str(exc)) from exc
+        self.distributor_company = distributor_company or self.settings.distributor_company
+        if not self.distributor_company:
+            raise FulfillmentConfigurationError("metadata.fulfillment_gateway.distributor_company es obligatorio.")
+        credential = ERPNextCredential.objects.for_company(
+            organization_id=organization.id,
+            company=self.distributor_company,
+        )
+        if not credential:
+            raise FulfillmentConfigurationError(
+                f"No hay credenciales activas para la compañía distribuidora {self.distributor_company}."
+            )
+        self.client = get_client(credential)
+        self.max_concurrency = max_concurrency or getattr(django_settings, "ERPNEXT_MAX_CONCURRENCY", 10)
+        self.priority = priority
+        self.inventory = InventoryMirror.for_company(organization.id, self.distributor_company)
+        self.stock = FulfillmentExecutor(self.client, self.settings, inventory=self.inventory)
+        # Sin espejo ni reservas: los hilos solo hablan con ERPNext, la base de datos queda en el hilo principal.
+        self.documents = FulfillmentExecutor(self.client, self.settings)
+        self.normalizer = OrderNormalizer(organization.id, self.settings)
+        self.line_mapper = LineMapper(organization.id, self.settings)
+
+    def pending_orders(self, limit: int = 200) -> List[FulfillmentOrder]:
+        orders = FulfillmentOrder.objects.filter(
+            organization_id=self.organization.id,
+            distributor_company=self.distributor_company,
+        )
+        pending = orders.filter(status=FulfillmentOrder.STATUS_PENDING) | orders.needing_retry()
+        return list(pending.order_by("created_at")[:limit])
+
+    def run(self, fulfillment_orders: Optional[Iterable[FulfillmentOrder]] = None) -> List[BulkOrderResult]:
+        fulfillment_orders = list(self.pending_orders() if fulfillment_orders is None else fulfillment_orders)
+        results: Dict[Any, BulkOrderResult] = {}
+        candidates: List[FulfillmentOrder] = []
+        for fulfillment_order in fulfillment_orders:
+            if fulfillment_order.status in (FulfillmentOrder.STATUS_FULFILLED, FulfillmentOrder.STATUS_RETURNED):
+                results[fulfillment_order.pk] = self._result(fulfillment_order, "already_fulfilled")
+            elif (
+                fulfillment_order.organization_id != self.organization.id
+                or fulfillment_order.distributor_company != self.distributor_company
+            ):
+                results[fulfillment_order.pk] = self._result(
+                    fulfillment_order,
+                    "skipped",
+                    error_code="other_distributor",
+                    error_message=f"El pedido pertenece a {fulfillment_order.distributor_company}.",
+                )
+            else:
+                candidates.append(fulfillment_order)
+
+        prepared = self._prepare(self._claim(candidates, results), results)
+        admitted = self._allocate(prepared, results)
+        if admitted:
+            self._store_admitted(admitted)
+            self._record(admitted, self._create_documents(admitted), results)
+
+        logger.info(
+            "[FULFILLMENT] Bulk %s/%s: %s pedidos, %s admitidos",
+            self.organization.id,
+            self.distributor_company,
+            len(fulfillment_orders),
+            len(admitted),
+        )
+        return [results[fulfillment_order.pk] for fulfillment_order in fulfillment_orders]
+
+    def _claim(self, candidates: List[FulfillmentOrder], results) -> List[FulfillmentOrder]:
+        """Move the candidates still pending/waiting_stock to processing; the rest lose the claim."""
+        if not candidates:
+            return []
+        claimable = (FulfillmentOrder.STATUS_PENDING, FulfillmentOrder.STATUS_WAITING_STOCK)
+        now = timezone.now()
+        with transaction.atomic():
+            # skip_locked: una corrida concurrente que ya los tiene bloqueados se queda con ellos.
+            locked = dict(
+                FulfillmentOrder.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=[fulfillment_order.pk for fulfillment_order in candidates], status__in=claimable)
+                .values_list("pk", "status")
+            )
+            FulfillmentOrder.objects.filter(pk__in=list(locked), status__in=claimable).update(
+                status=FulfillmentOrder.STATUS_PROCESSING, updated_at=now
+            )
+        clear_backorder_index(pk for pk, status in locked.items() if status == FulfillmentOrder.STATUS_WAITING_STOCK)
+
+        claimed: List[FulfillmentOrder] = []
+        for fulfillment_order in candidates:
+            if fulfillment_order.pk not in locked:
+                results[fulfillment_order.pk] = self._result(
+                    fulfillment_order,
+                    "skipped",
+                    error_code="already_claimed",
+                    error_message="El pedido lo está procesando otra corrida.",
+                )
+                continue
+            fulfillment_order.status = FulfillmentOrder.STATUS_PROCESSING
+            fulfillment_order.updated_at = now
+            claimed.append(fulfillment_order)
+        return claimed
+
+    # ------------------------------------------------------------------
+    # Normalización y mapeo
+    # ------------------------------------------------------------------
+    def _prepare(self, candidates: List[FulfillmentOrder], results) -> List[_PreparedOrder]:
+        normalized: List[Tuple[FulfillmentOrder, OrderDTO]] = []
+        for fulfillment_order in candidates:
+            try:
+                # Deja normalized_order en la instancia; _backorder/_store_admitted lo guardan.
+                order, _ = self.normalizer.normalize_stored(fulfillment_order)
+            except FulfillmentError as exc:
+                self._fail(fulfillment_order, exc, results)
+                continue
+            normalized.append((fulfillment_order, order))
+
+        # Un índice de item maps por vendedor para todos sus pedidos.
+        codes: Dict[Tuple[str, str], set] = {}
+        for _, order in normalized:
+            codes.setdefault((order.source, order.seller_company), set()).update(
+                line.source_item_code for line in order.lines
+            )
+        indexes = {
+            (source, seller): get_item_map_index(self.organization.id, source, seller, seller_codes)
+            for (source, seller), seller_codes in codes.items()
+        }
+
+        prepared: List[_PreparedOrder] = []
+        for fulfillment_order, order in normalized:
+            try:
+                lines, snapshot = self.line_mapper.map_lines(order, indexes[(order.source, order.seller_company)])
+            except FulfillmentError as exc:
+                self._fail(fulfillment_order, exc, results)
+                continue
+            prepared.append(
+                _PreparedOrder(
+                    fulfillment_order=fulfillment_order,
+                    order=order,
+                    lines=lines,
+                    snapshot=snapshot,
+                    required=self.stock.required_quantities(lines),
+                    ledger=ReservationLedger.for_order(
+                        self.organization.id, self.distributor_company, fulfillment_order.id
+                    ),
+                    resumed=fulfillment_order.reached(FulfillmentOrder.STEP_STOCK),
+                )
+            )
+        return prepared
+
+    # ------------------------------------------------------------------
+    # Stock
+    # ------------------------------------------------------------------
+    def _allocate(self, prepared: List[_PreparedOrder], results) -> List[_PreparedOrder]:
+        total: Dict[Key, Decimal] = {}
+        for item in prepared:
+            for key, qty in item.required.items():
+                total[key] = total.get(key, Decimal("0")) + qty
+        read_at = timezone.now()
+        available = self.stock.available_for(total) if total else {}
+        remaining = {key: Decimal(str(available.get(key) or 0)) for key in total}
+
+        admitted: List[_PreparedOrder] = []
+        for item in sorted(prepared, key=lambda item: self.priority(item.fulfillment_order)):
+            fulfillment_order = item.fulfillment_order
+            if fulfillment_order.sales_order_name or fulfillment_order.delivery_note_name:
+                # Con SO o DN ya creadas el stock quedó comprometido en ERPNext.
+                admitted.append(item)
+                continue
+            if item.ledger is not None:
+                # El ledger descuenta las reservas de otros pedidos, incluidas las de este lote.
+                short = item.ledger.reserve(item.required, available, read_at=read_at)
+            else:
+                short = [key for key, qty in item.required.items() if remaining.get(key, 0) < qty]
+            if short:
+                self._backorder(item, short, results)
+                continue
+            for key, qty in item.required.items():
+                remaining[key] = remaining.get(key, Decimal("0")) - qty
+            admitted.append(item)
+        return admitted
+
+    def _backorder(self, item: _PreparedOrder, short: List[Key], results) -> None:
+        message = f"No hay stock suficiente para: {', '.join(sorted({item_code for item_code, _ in short}))}"
+        fulfillment_order = item.fulfillment_order
+        with transaction.atomic(), fulfillment_order.deferred_writes():
+            fulfillment_order.fulfillment_payload = item.snapshot
+            fulfillment_order.save(update_fields=["normalized_order", "fulfillment_payload", "updated_at"])
+            fulfillment_order.mark_waiting_stock(
+                error_message=message,
+                delay_seconds=self.settings.backorder_retry_seconds,
+            )
+            # wake_backorders busca pedidos en waiting_stock: el estado se escribe antes que el índice.
+            fulfillment_order.flush_writes()
+            index_backorder(fulfillment_order, {key: item.required[key] for key in short})
+        results[fulfillment_order.pk] = self._result(
+            fulfillment_order, FulfillmentOrder.STATUS_WAITING_STOCK, error_code="waiting_stock", error_message=message
+        )
+
+    # ------------------------------------------------------------------
+    # Documentos
+    # ------------------------------------------------------------------
+    def _store_admitted(self, admitted: List[_PreparedOrder]) -> None:
+        """Normalized order and mapping snapshot of the batch in one UPDATE, durable before any document is created."""
+        now = timezone.now()
+        for item in admitted:
+            fulfillment_order = item.fulfillment_order
+            fulfillment_order.fulfillment_payload = item.snapshot
+            fulfillment_order.updated_at = now
+            if not fulfillment_order.reached(FulfillmentOrder.STEP_STOCK):
+                fulfillment_order.checkpoint = FulfillmentOrder.STEP_STOCK
+                fulfillment_order.checkpoint_at = now
+        FulfillmentOrder.objects.bulk_update(
+            [item.fulfillment_order for item in admitted],
+            ["normalized_order", "fulfillment_payload", "checkpoint", "checkpoint_at", "updated_at"],
+        )
+
+    def _create_documents(self, admitted: List[_PreparedOrder]) -> Dict[Any, Any]:
+        # Los hilos solo hablan con ERPNext; cada paso se registra en este hilo antes del siguiente.
+        steps = DocumentSteps(self.documents, max_concurrency=self.max_concurrency)
+        return steps.run(
+            [DocumentJob(item.fulfillment_order, item.order, item.lines, resumed=item.resumed) for item in admitted]
+        )
+
+    def _record(self, admitted: List[_PreparedOrder], outcomes: Dict[Any, Any], results) -> None:
+        delivered: Dict[Key, Decimal] = {}
+        committed: List[ReservationLedger] = []
+        for item in admitted:
+            fulfillment_order = item.fulfillment_order
+            outcome = outcomes.get(fulfillment_order.pk)
+            if not isinstance(outcome, FulfillmentResult):
+                if item.ledger is not None:
+                    item.ledger.release()
+                self._fail(fulfillment_order, outcome, results)
+                continue
+
+            if item.ledger is not None:
+                committed.append(item.ledger)
+            for key, qty in item.required.items():
+                delivered[key] = delivered.get(key, Decimal("0")) + qty
+            with transaction.atomic(), fulfillment_order.deferred_writes():
+                fulfillment_order.record_fulfillment(
+                    delivery_note=outcome.delivery_note,
+                    serials=outcome.serials,
+                    sales_order=outcome.sales_order,
+                    result_payload={
+                        "delivery_note": outcome.delivery_note,
+                        "sales_order": outcome.sales_order,
+                        "serials": outcome.serials,
+                        "line_serials": outcome.line_serials,
+                    },
+                )
+                propagate_fulfillment_status(fulfillment_order, item.order, outcome.delivery_note)
+            results[fulfillment_order.pk] = self._result(
+                fulfillment_order,
+                FulfillmentOrder.STATUS_FULFILLED,
+                delivery_note=outcome.delivery_note,
+                sales_order=outcome.sales_order,
+            )
+        # Primero el espejo, después las reservas (ver FulfillmentExecutor.finish_delivery).
+        if self.inventory is not None and delivered:
+            self.inventory.consume(delivered)
+        for ledger in committed:
+            ledger.commit()
+
+    # ------------------------------------------------------------------
+    def _fail(self, fulfillment_order: FulfillmentOrder, exc, results) -> None:
+        if isinstance(exc, FulfillmentError):
+            error_code = exc.error_code
+        elif isinstance(exc, ERPNextClientError):
+            error_code = "erpnext_error"
+        else:
+            error_code = "unexpected_error"
+        logger.warning("[FULFILLMENT] Bulk: pedido %s falló (%s): %s", fulfillment_order.order_id, error_code, exc)
+        fulfillment_order.mark_status(
+            FulfillmentOrder.STATUS_FAILED,
+            error_code=error_code,
+            error_message=str(exc),
+            next_attempt_at=None,
+        )
+        results[fulfillment_order.pk] = self._result(
+            fulfillment_order, FulfillmentOrder.STATUS_FAILED, error_code=error_code, error_message=str(exc)
+        )
+
+    @staticmethod
+    def _result(fulfillment_order: FulfillmentOrder, status: str, **kwargs) -> BulkOrderResult:
+        return BulkOrderResult(
+            fulfillment_order_id=str(fulfillment_order.pk),
+            order_id=fulfillment_order.order_id,
+            status=status,
+            **kwargs,
+        )
@@ -0,0 +1,155 @@
+"""Checkpointed creation of the ERPNext documents of a fulfillment (SO, DN insert, DN submit)."""
+
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from django.db import transaction
+
+from apps.integrations.models import FulfillmentOrder
+
+from .dto import MappedOrderLineDTO, OrderDTO
+from .executor import FulfillmentExecutor, FulfillmentResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DocumentJob:
+    fulfillment_order: FulfillmentOrder
+    order: OrderDTO
+    lines: List[MappedOrderLineDTO]
+    # Un intento anterior llegó a ERPNext: antes de crear se busca lo que haya dejado.
+    resumed: bool = False
+    submitted: bool = False
+
+
+class DocumentSteps:
+    """Run the SO, DN-insert and DN-submit steps for one or many orders.
+
+    The ERPNext calls of a step run for every job (up to ``max_concurrency``
+    at once); then, in the calling thread, each job records the document name
+    and advances its checkpoint in one write before the next step starts.
+    A retry therefore skips finished steps, and a resumed job probes by
+    ``custom_order_ref`` before creating a document whose name was never
+    recorded. Returns a ``FulfillmentResult`` or the exception per order pk.
+    """
+
+    def __init__(self, executor: FulfillmentExecutor, *, max_concurrency: int = 1) -> None:
+        self.executor = executor
+        self.max_concurrency = max(1, max_concurrency)
+
+    def run(self, jobs: List[DocumentJob]) -> Dict[Any, Any]:
+        outcomes: Dict[Any, Any] = {}
+
+        def active() -> List[DocumentJob]:
+            return [job for job in jobs if job.fulfillment_order.pk not in outcomes]
+
+        sales_orders = [job for job in jobs if not job.fulfillment_order.reached(FulfillmentOrder.STEP_SALES_ORDER)]
+        names = self._step(sales_orders, self._sales_order, outcomes)
+        self._record(sales_orders, names, FulfillmentOrder.STEP_SALES_ORDER, "sales_order_name")
+
+        delivery_notes = active()
+        names = self._step(delivery_notes, self._delivery_note, outcomes)
+        self._record(delivery_notes, names, FulfillmentOrder.STEP_DELIVERY_NOTE, "delivery_note_name")
+
+        self._step([job for job in active() if not job.submitted], self._submit, outcomes)
+        done = active()
+        for job in done:
+            fulfillment_order = job.fulfillment_order
+            # Sin prisa por escribirlo: un reintento consulta el docstatus de la DN registrada.
+            fulfillment_order.reach(FulfillmentOrder.STEP_SUBMIT)
+            outcomes[fulfillment_order.pk] = FulfillmentResult(
+                delivery_note=fulfillment_order.delivery_note_name,
+                serials=[],
+                line_serials=[],
+                sales_order=fulfillment_order.sales_order_name or None,
+            )
+        return outcomes
+
+    # ------------------------------------------------------------------
+    # Pasos (solo ERPNext; corren en los hilos del pool)
+    # ------------------------------------------------------------------
+    def _sales_order(self, job: DocumentJob) -> Optional[str]:
+        if job.resumed and self.executor.settings.create_sales_order:
+            existing = self._probe("Sales Order", job.order)
+            if existing:
+                return existing["name"]
+        return self.executor.create_sales_order(job.order, job.lines) or ""
+
+    def _delivery_note(self, job: DocumentJob) -> Optional[str]:
+        fulfillment_order = job.fulfillment_order
+        if fulfillment_order.reached(FulfillmentOrder.STEP_DELIVERY_NOTE):
+            # El intento anterior pudo enviarla sin llegar a registrarlo.
+            job.submitted = fulfillment_order.reached(FulfillmentOrder.STEP_SUBMIT) or (
+                self.executor.delivery_note_submitted(fulfillment_order.delivery_note_name)
+            )
+            return None
+        existing = self._probe("Delivery Note", job.order) if job.resumed else None
+        if not existing:
+            existing = self.executor.insert_delivery_note(job.order, job.lines, fulfillment_order.sales_order_name or None)
+        job.submitted = existing.get("docstatus") == 1
+        return existing["name"]
+
+    def _submit(self, job: DocumentJob) -> None:
+        self.executor.submit_delivery_note(job.fulfillment_order.delivery_note_name)
+
+    def _probe(self, doctype: str, order: OrderDTO) -> Optional[Dict[str, Any]]:
+        existing = self.executor.find_order_document(doctype, order)
+        if existing:
+            logger.info(
+                "[FULFILLMENT] Order %s: reusing %s %s left by a previous attempt",
+                order.order_id,
+                doctype,
+                existing.get("name"),
+            )
+        return existing
+
+    # ------------------------------------------------------------------
+    def _step(self, jobs: List[DocumentJob], call: Callable[[DocumentJob], Any], outcomes) -> Dict[Any, Any]:
+        """``call`` for every job; failures go to ``outcomes``, the values of the rest are returned."""
+        values: Dict[Any, Any] = {}
+        if not jobs:
+            return values
+        if self.max_concurrency == 1 or len(jobs) == 1:
+            results = [self._attempt(call, job) for job in jobs]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_concurrency, len(jobs)), thread_name_prefix="erpnext-documents"
+            ) as pool:
+                results = list(pool.map(lambda job: self._attempt(call, job), jobs))
+        for job, (value, error) in zip(jobs, results):
+            if error is not None:
+                outcomes[job.fulfillment_order.pk] = error
+            else:
+                values[job.fulfillment_order.pk] = value
+        return values
+
+    @staticmethod
+    def _attempt(call, job):
+        try:
+            return call(job), None
+        except Exception as exc:
+            return None, exc
+
+    @staticmethod
+    def _record(jobs: List[DocumentJob], values: Dict[Any, Any], step: str, field_name: Optional[str] = None) -> None:
+        """Persist the step of every job that got through it, one UPDATE per order, before going on."""
+        done = [job.fulfillment_order for job in jobs if job.fulfillment_order.pk in values]
+        if not done:
+            return
+        # Un solo pedido (el servicio) no necesita la transacción que agrupa las escrituras de un lote.
+        with transaction.atomic() if len(done) > 1 else nullcontext():
+            for fulfillment_order in done:
+                value = values[fulfillment_order.pk]
+                with fulfillment_order.deferred_writes():
+                    if field_name and value is not None:
+                        setattr(fulfillment_order, field_name, value)
+                        fulfillment_order.save(update_fields=[field_name, "updated_at"])
+                    fulfillment_order.reach(step)
+                    # Dentro de la unidad de trabajo del servicio el bloque no escribe al salir.
+                    fulfillment_order.flush_writes()
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
 
 from django.utils import timezone
 
 from apps.erpnext.services.client import ERPNextClient
+from apps.erpnext.services.inventory import InventoryMirror
+from apps.erpnext.services.reservations import ReservationLedger
 from apps.integrations.exceptions import BackorderPending, FulfillmentError
 
 from .dto import MappedOrderLineDTO, OrderDTO
@@ -26,45 +29,89 @@ class FulfillmentResult:
 class FulfillmentExecutor:
     """Create ERPNext documents (SO/DN) with serial assignments."""
 
-    def __init__(self, client: ERPNextClient, settings: GatewaySettings):
+    # Item codes per Bin query; keeps the GET URL far below proxy/server limits.
+    STOCK_CHECK_CHUNK = 50
+
+    def __init__(
+        self,
+        client: ERPNextClient,
+        settings: GatewaySettings,
+        inventory: Optional[InventoryMirror] = None,
+        reservations: Optional[ReservationLedger] = None,
+    ):
         self.client = client
         self.settings = settings
+        self.inventory = inventory
+        self.reservations = reservations
 
     def assign_serials(self, lines: List[MappedOrderLineDTO]) -> None:
-        insufficient: List[str] = []
-        for line in lines:
-            required = line.quantity
-            if not required or required <= 0:
-                continue
-
-            print(
-                f"--- EXECUTOR: VERIFICANDO STOCK EN ERPNEXT ---\n"
-                f"Item Code: {line.target_item_code}\n"
-                f"Warehouse: {line.warehouse}\n"
-                f"Cantidad Requerida: {required}"
+        required = self.required_quantities(lines)
+        if not required:
+            return
+
+        read_at = timezone.now()
+        available = self.available_for(required)
+        if self.reservations is not None:
+            short = self.reservations.reserve(required, available, read_at=read_at)
+        else:
+            short = [key for key, qty in required.items() if available.get(key, 0) < qty]
+        insufficient = [item_code for item_code, _ in short]
+        if insufficient:
+            raise BackorderPending(
+                f"No hay stock suficiente para: {', '.join(sorted(set(insufficient)))}",
+                shortages={key: required[key] for key in short},
             )
 
-            stock_levels = self.client.get_stock_levels(
+    def available_for(
+        self, required: Dict[Tuple[str, Optional[str]], Decimal]
+    ) -> Dict[Tuple[str, Optional[str]], float]:
+        """Stock per (item, warehouse): local mirror when fresh, ERPNext otherwise."""
+        available = self.inventory.available(required) if self.inventory is not None else None
+        print(
+            f"--- EXECUTOR: VERIFICANDO STOCK EN {'ESPEJO LOCAL' if available is not None else 'ERPNEXT'} ---\n"
+            f"Pares item/almacén: {len(required)}"
+        )
+        if available is None:
+            available = self._available_quantities(list(required))
+        else:
+            # El espejo puede ir atrasado con las entradas de stock: confirmar en vivo antes del backorder.
+            short = [key for key, qty in required.items() if available.get(key, 0) < qty]
+            if short:
+                live = self._available_quantities(short)
+                available.update({key: live.get(key, 0) for key in short})
+        return available
+
+    @staticmethod
+    def required_quantities(lines: List[MappedOrderLineDTO]) -> Dict[Tuple[str, Optional[str]], Decimal]:
+        required: Dict[Tuple[str, Optional[str]], Decimal] = {}
+        for line in lines:
+            if not line.quantity or line.quantity <= 0:
+                continue
+            key = (line.target_item_code, line.warehouse)
+            required[key] = required.get(key, Decimal("0")) + line.quantity
+        return required
+
+    def _available_quantities(self, keys: List[Tuple[str, Optional[str]]]) -> Dict[Tuple[str, Optional[str]], float]:
+        """``actual_qty`` per (item, warehouse) with one Bin query per chunk of item codes."""
+        item_codes = sorted({item_code for item_code, _ in keys})
+        available: Dict[Tuple[str, Optional[str]], float] = {}
+        for start in range(0, len(item_codes), self.STOCK_CHECK_CHUNK):
+            chunk = set(item_codes[start : start + self.STOCK_CHECK_CHUNK])
+            warehouses = sorted({warehouse for item_code, warehouse in keys if item_code in chunk and warehouse})
+            if not warehouses:
+                continue
+            rows = self.client.get_stock_levels(
                 filters=[
-                    ["item_code", "=", line.target_item_code],
-                    ["warehouse", "=", line.warehouse],
+                    ["item_code", "in", sorted(chunk)],
+                    ["warehouse", "in", warehouses],
                 ],
-                fields=["actual_qty"],
-                limit=1,
-            )
-
-            actual_qty = 0
-            if stock_levels and stock_levels[0].get("actual_qty") is not None:
-                actual_qty = stock_levels[0]["actual_qty"]
-
-            if actual_qty < required:
-                insufficient.append(line.target_item_code)
-            # No longer setting line.serial_numbers as ERPNext will handle it
-
-        if insufficient:
-            raise BackorderPending(
-                f"No hay stock suficiente para: {', '.join(sorted(set(insufficient)))}"
+                fields=["item_code", "warehouse", "actual_qty"],
+                limit=len(chunk) * len(warehouses),
             )
+            for row in rows or []:
+                key = (row.get("item_code"), row.get("warehouse"))
+                available[key] = available.get(key, 0) + (row.get("actual_qty") or 0)
+        return available
 
     def create_sales_order(self, order: OrderDTO, mapped_lines: List[MappedOrderLineDTO]) -> Optional[str]:
         if not self.settings.create_sales_order:
@@ -101,15 +148,44 @@ class FulfillmentExecutor:
             return reference
         return reference.date().isoformat()
 
+    def find_order_document(self, doctype: str, order: OrderDTO) -> Optional[Dict[str, object]]:
+        """Document (``name``, ``docstatus``) a previous attempt created for ``order``, if any."""
+        return self.client.find_existing(
+            doctype,
+            [
+                ["custom_order_ref", "=", order.order_id],
+                ["customer", "=", order.seller_company],
+                ["docstatus", "<", 2],
+            ],
+        )
+
     def create_delivery_note(
         self,
         order: OrderDTO,
         mapped_lines: List[MappedOrderLineDTO],
         sales_order_name: Optional[str],
     ) -> FulfillmentResult:
+        response = self.insert_delivery_note(order, mapped_lines, sales_order_name)
+        if response.get("docstatus") != 1:
+            raise FulfillmentError("No fue posible enviar la Delivery Note.", error_code="delivery_note_submit")
+        self.finish_delivery(mapped_lines)
+
+        # serials and line_serials will now always be empty as our app doesn't assign serials
+        return FulfillmentResult(
+            delivery_note=response["name"],
+            serials=[],
+            line_serials=[],
+            sales_order=sales_order_name,
+        )
+
+    def insert_delivery_note(
+        self,
+        order: OrderDTO,
+        mapped_lines: List[MappedOrderLineDTO],
+        sales_order_name: Optional[str],
+    ) -> Dict[str, object]:
+        """Insert the DN, submitted when the site allows it; returns ``name`` and ``docstatus``."""
         items_payload = []
-        # line_serials will now always be empty as our app doesn't assign serials
-        line_serials: List[Dict[str, List[str]]] = []
         for line in mapped_lines:
             item_entry = {
                 "item_code": line.target_item_code,
@@ -129,22 +205,29 @@ class FulfillmentExecutor:
             "custom_order_ref": order.order_id,
             "items": items_payload,
         }
-        response = self.client.insert_doc("Delivery Note", payload)
-        delivery_note_name = response.get("name") if isinstance(response, dict) else None
+        # Insert + submit en un solo round trip (fallback a dos si el sitio no lo permite).
+        submit_response = self.client.insert_and_submit("Delivery Note", payload)
+        delivery_note_name = submit_response.get("name") if isinstance(submit_response, dict) else None
         if not delivery_note_name:
             raise FulfillmentError("No se pudo crear la Delivery Note en ERPNext.", error_code="delivery_note_creation")
+        return {"name": delivery_note_name, "docstatus": submit_response.get("docstatus")}
 
-        submit_response = self.client.submit_doc("Delivery Note", delivery_note_name)
-        if isinstance(submit_response, dict) and submit_response.get("docstatus") != 1:
+    def delivery_note_submitted(self, name: str) -> bool:
+        current = self.client.get_doc("Delivery Note", name, cache=False)
+        return isinstance(current, dict) and current.get("docstatus") == 1
+
+    def submit_delivery_note(self, name: str) -> None:
+        response = self.client.submit_doc("Delivery Note", name)
+        if not isinstance(response, dict) or response.get("docstatus") != 1:
             raise FulfillmentError("No fue posible enviar la Delivery Note.", error_code="delivery_note_submit")
 
-        # serials and line_serials will now always be empty as our app doesn't assign serials
-        return FulfillmentResult(
-            delivery_note=delivery_note_name,
-            serials=[],
-            line_serials=[],
-            sales_order=sales_order_name,
-        )
+    def finish_delivery(self, mapped_lines: List[MappedOrderLineDTO]) -> None:
+        """The DN is submitted: update the local mirror, then drop the stock hold."""
+        # En este orden nunca hay un momento en que ni el espejo ni la reserva descuenten la entrega.
+        if self.inventory is not None:
+            self.inventory.consume(self.required_quantities(mapped_lines))
+        if self.reservations is not None:
+            self.reservations.commit()
 
     def _posting_date(self, order: OrderDTO) -> Optional[str]:
         if order.created_at:
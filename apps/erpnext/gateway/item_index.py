@@ -0,0 +1,196 @@
+"""Compiled, versioned FulfillmentItemMap lookups per (organization, source, seller company)."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.functions import Upper
+from django.dispatch import receiver
+
+from apps.integrations.models import FulfillmentItemMap, fulfillment_item_map_changed
+
+logger = logging.getLogger(__name__)
+
+SHARED_BACKOFF_SECONDS = 30.0
+INDEX_TTL_SECONDS = 24 * 3600
+
+Scope = Tuple[str, str, str]
+
+
+class ItemMapEntry(NamedTuple):
+    target_company: str
+    target_item_code: str
+    warehouse: Optional[str]
+
+
+def _entry(item_map: FulfillmentItemMap) -> ItemMapEntry:
+    metadata = item_map.metadata if isinstance(item_map.metadata, dict) else {}
+    return ItemMapEntry(item_map.target_company, item_map.target_item_code, item_map.warehouse or metadata.get("warehouse"))
+
+
+@dataclass(frozen=True)
+class ItemMapIndex:
+    """Exact and case-folded SKU lookups; built from plain tuples, no model instances kept."""
+
+    version: int
+    exact: Dict[str, ItemMapEntry]
+    folded: Dict[str, ItemMapEntry]
+
+    @classmethod
+    def build(cls, version: int, rows: Iterable[Tuple[str, ItemMapEntry]]) -> "ItemMapIndex":
+        exact: Dict[str, ItemMapEntry] = {}
+        folded: Dict[str, ItemMapEntry] = {}
+        for code, entry in rows:
+            entry = ItemMapEntry(*entry)
+            exact[code] = entry
+            # Ante colisiones de mayúsculas gana el primero en orden; la coincidencia exacta siempre prevalece.
+            folded.setdefault(code.upper(), entry)
+        return cls(version, exact, folded)
+
+    def lookup(self, code: str) -> Optional[ItemMapEntry]:
+        return self.exact.get(code) or self.folded.get(code.upper())
+
+
+class ItemMapIndexCache:
+    """Per-process compiled indexes validated against a version counter kept in Redis.
+
+    Each lookup reads the scope's version (one Redis GET); the compiled index
+    is reused while it matches and is otherwise loaded from Redis or rebuilt
+    from the database. Without Redis nothing can tell this process that
+    another one changed the maps, so ``get`` returns ``None`` and callers query
+    only the SKUs of the order.
+    """
+
+    def __init__(self, alias: Optional[str] = None) -> None:
+        self.alias = alias
+        self._local: Dict[Scope, ItemMapIndex] = {}
+        self._lock = threading.Lock()
+        self._shared_down_until = 0.0
+        self.builds = 0
+
+    @property
+    def shared(self):
+        return caches[self.alias or getattr(settings, "ERPNEXT_CACHE_ALIAS", "default") or "default"]
+
+    def get(self, organization_id, source: str, company: str) -> Optional[ItemMapIndex]:
+        scope = _scope(organization_id, source, company)
+        version = self._version(scope)
+        if version is None:
+            return None
+        with self._lock:
+            index = self._local.get(scope)
+        if index is not None and index.version == version:
+            return index
+
+        index = self._load_shared(scope, version)
+        if index is None:
+            index = self._build(scope, version)
+        with self._lock:
+            self._local[scope] = index
+        return index
+
+    def bump(self, scope: Scope) -> None:
+        with self._lock:
+            self._local.pop(scope, None)
+        # Siempre se intenta, aun en backoff: perder una invalidación deja índices viejos en otros procesos.
+        key = self._version_key(scope)
+        try:
+            self.shared.add(key, time.time_ns(), timeout=None)
+            self.shared.incr(key)
+        except Exception as exc:
+            self._shared_error(exc)
+
+    # ------------------------------------------------------------------
+    def _version(self, scope: Scope) -> Optional[int]:
+        if not self._shared_available():
+            return None
+        key = self._version_key(scope)
+        try:
+            version = self.shared.get(key)
+            if version is None:
+                # Semilla por reloj: si Redis pierde el contador no vuelve a un número ya visto.
+                self.shared.add(key, time.time_ns(), timeout=None)
+                version = self.shared.get(key)
+            return int(version) if version is not None else None
+        except Exception as exc:
+            self._shared_error(exc)
+            return None
+
+    def _load_shared(self, scope: Scope, version: int) -> Optional[ItemMapIndex]:
+        try:
+            rows = self.shared.get(self._index_key(scope, version))
+        except Exception as exc:
+            self._shared_error(exc)
+            return None
+        return ItemMapIndex.build(version, rows) if rows is not None else None
+
+    def _build(self, scope: Scope, version: int) -> ItemMapIndex:
+        organization_id, source, company = scope
+        rows = [
+            (item_map.source_item_code, tuple(_entry(item_map)))
+            for item_map in FulfillmentItemMap.objects.for_source(
+                organization_id=organization_id, source=source, source_company=company
+            )
+            .only("source_item_code", "target_company", "target_item_code", "warehouse", "metadata")
+            .order_by("source_item_code")
+        ]
+        self.builds += 1
+        try:
+            self.shared.set(self._index_key(scope, version), rows, timeout=INDEX_TTL_SECONDS)
+        except Exception as exc:
+            self._shared_error(exc)
+        return ItemMapIndex.build(version, rows)
+
+    def _shared_available(self) -> bool:
+        return time.monotonic() >= self._shared_down_until
+
+    def _shared_error(self, exc: Exception) -> None:
+        self._shared_down_until = time.monotonic() + SHARED_BACKOFF_SECONDS
+        logger.warning("Índice de item maps sin Redis, consultando solo los SKUs del pedido: %s", exc)
+
+    @staticmethod
+    def _version_key(scope: Scope) -> str:
+        return "fmap:version:{}:{}:{}".format(*scope)
+
+    @staticmethod
+    def _index_key(scope: Scope, version: int) -> str:
+        return "fmap:index:{}:{}:{}:{}".format(*scope, version)
+
+
+def _scope(organization_id, source: str, company: str) -> Scope:
+    return (str(organization_id), str(source), str(company))
+
+
+def index_for_codes(organization_id, source: str, company: str, codes: Iterable[str]) -> ItemMapIndex:
+    """Fallback: compile only the entries for ``codes`` (exact or case-insensitive match)."""
+    codes = {str(code) for code in codes}
+    item_maps = (
+        FulfillmentItemMap.objects.for_source(organization_id=organization_id, source=source, source_company=company)
+        .annotate(code_upper=Upper("source_item_code"))
+        .filter(code_upper__in={code.upper() for code in codes})
+        .order_by("source_item_code")
+    )
+    return ItemMapIndex.build(0, ((item_map.source_item_code, _entry(item_map)) for item_map in item_maps))
+
+
+_cache = ItemMapIndexCache()
+
+
+def get_item_map_index(organization_id, source: str, company: str, codes: Iterable[str]) -> ItemMapIndex:
+    if getattr(settings, "FULFILLMENT_ITEM_INDEX_ENABLED", True):
+        index = _cache.get(organization_id, source, company)
+        if index is not None:
+            return index
+    return index_for_codes(organization_id, source, company, codes)
+
+
+@receiver(fulfillment_item_map_changed, dispatch_uid="erpnext_item_map_index_bump")
+def _bump_on_change(sender, scopes, **kwargs) -> None:
+    for organization_id, source, company in scopes:
+        _cache.bump(_scope(organization_id, source, company))
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
 from dataclasses import asdict
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from apps.integrations.exceptions import FulfillmentError
-from apps.integrations.models import FulfillmentItemMap
 
 from .dto import MappedOrderLineDTO, OrderDTO
+from .item_index import ItemMapIndex, get_item_map_index
 from .settings import GatewaySettings
 
 
@@ -17,13 +17,16 @@ class LineMapper:
         self.organization_id = organization_id
         self.settings = settings
 
-    def map_lines(self, order: OrderDTO) -> Tuple[List[MappedOrderLineDTO], Dict[str, List[Dict[str, str]]]]:
-        item_maps = FulfillmentItemMap.objects.for_source(
-            organization_id=self.organization_id,
-            source=order.source,
-            source_company=order.seller_company,
-        )
-        map_index = {entry.source_item_code: entry for entry in item_maps}
+    def map_lines(
+        self, order: OrderDTO, map_index: Optional[ItemMapIndex] = None
+    ) -> Tuple[List[MappedOrderLineDTO], Dict[str, List[Dict[str, str]]]]:
+        if map_index is None:
+            map_index = get_item_map_index(
+                self.organization_id,
+                order.source,
+                order.seller_company,
+                [line.source_item_code for line in order.lines],
+            )
 
         mapped_lines: List[MappedOrderLineDTO] = []
         target_companies = set()
@@ -46,14 +49,14 @@ class LineMapper:
         self,
         source_code: str,
         line,
-        map_index: Dict[str, FulfillmentItemMap],
+        map_index: ItemMapIndex,
         order: OrderDTO,
     ) -> MappedOrderLineDTO:
-        entry = map_index.get(source_code)
+        entry = map_index.lookup(source_code)
         if entry:
             target_company = entry.target_company or order.distributor_company
             target_item_code = entry.target_item_code
-            warehouse = entry.warehouse or entry.metadata.get("warehouse") if isinstance(entry.metadata, dict) else None
+            warehouse = entry.warehouse
         else:
             meta_entry = self.settings.metadata_item_mapping(
                 source=order.source,
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import hashlib
+import json
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
 
 from apps.integrations.exceptions import FulfillmentError
 from apps.integrations.models import FulfillmentItemMap
@@ -10,6 +13,14 @@ from .dto import OrderDTO, OrderLineDTO
 from .settings import GatewaySettings
 from .utils import parse_dt, to_decimal
 
+# Subir cuando cambie la salida de OrderNormalizer: invalida lo guardado en ``normalized_order``.
+NORMALIZED_ORDER_VERSION = 1
+
+_LINE_KEYS = {
+    FulfillmentItemMap.SOURCE_SHOPIFY: "line_items",
+    FulfillmentItemMap.SOURCE_ERPNEXT: "items",
+}
+
 
 class OrderNormalizer:
     """Normalize inbound payloads (Shopify / ERPNext) to OrderDTO."""
@@ -32,6 +43,33 @@ class OrderNormalizer:
             return self._normalize_erpnext(payload, seller_company, distributor_company)
         raise FulfillmentError(f"Fuente {source} no soportada.", error_code="unsupported_source")
 
+    def normalize_stored(self, fulfillment_order) -> Tuple[OrderDTO, bool]:
+        """Normalized order of ``fulfillment_order`` and whether it was reused.
+
+        The stored ``normalized_order`` is loaded directly when it was built
+        from the same payload and companies by the current version; otherwise
+        the payload is normalized and the compact form is set on
+        ``fulfillment_order.normalized_order`` for the caller to save.
+        """
+        payload = fulfillment_order.payload or {}
+        key = order_key(
+            fulfillment_order.source,
+            payload,
+            fulfillment_order.seller_company,
+            fulfillment_order.distributor_company,
+        )
+        order = load_order(fulfillment_order.normalized_order, self.organization_id, payload, key)
+        if order is not None:
+            return order, True
+        order = self.normalize(
+            source=fulfillment_order.source,
+            payload=payload,
+            seller_company=fulfillment_order.seller_company,
+            distributor_company=fulfillment_order.distributor_company,
+        )
+        fulfillment_order.normalized_order = dump_order(order, key)
+        return order, False
+
 
     def _normalize_shopify(
         self,
@@ -173,3 +211,83 @@ class OrderNormalizer:
                 return str(value)
         return ""
 
+
+def order_key(source: str, payload: Dict[str, Any], seller_company: str, distributor_company: str) -> str:
+    """Content hash of everything the normalizer reads."""
+    encoded = json.dumps(
+        [source, seller_company, distributor_company, payload],
+        sort_keys=True,
+        default=str,
+        separators=(",", ":"),
+    )
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def dump_order(order: OrderDTO, key: str) -> Dict[str, Any]:
+    """Compact form for ``FulfillmentOrder.normalized_order``.
+
+    Lines are ``[code, qty, price, description, index]`` where ``index``
+    points into the payload's item list, so raw lines are not copied.
+    """
+    items = order.raw.get(_LINE_KEYS.get(order.source, "")) or []
+    positions = {id(raw_line): index for index, raw_line in enumerate(items)}
+    return {
+        "v": NORMALIZED_ORDER_VERSION,
+        "key": key,
+        "order_id": order.order_id,
+        "source": order.source,
+        "seller_company": order.seller_company,
+        "distributor_company": order.distributor_company,
+        "customer_email": order.customer_email,
+        "currency": order.currency,
+        "totals": order.totals,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+        "paid_at": order.paid_at.isoformat() if order.paid_at else None,
+        "external_reference": order.external_reference,
+        "metadata": order.metadata,
+        "lines": [
+            [
+                line.source_item_code,
+                str(line.quantity),
+                str(line.unit_price),
+                line.description,
+                positions.get(id(line.raw)),
+            ]
+            for line in order.lines
+        ],
+    }
+
+
+def load_order(stored: Any, organization_id, payload: Dict[str, Any], key: str) -> Optional[OrderDTO]:
+    """OrderDTO from ``dump_order`` output; ``None`` when missing, stale or from another version."""
+    if not isinstance(stored, dict) or stored.get("v") != NORMALIZED_ORDER_VERSION or stored.get("key") != key:
+        return None
+    items = payload.get(_LINE_KEYS.get(stored["source"], "")) or []
+    lines = []
+    for code, quantity, unit_price, description, index in stored["lines"]:
+        raw_line = items[index] if index is not None and index < len(items) else {}
+        lines.append(
+            OrderLineDTO(
+                source_item_code=code,
+                quantity=Decimal(quantity),
+                unit_price=Decimal(unit_price),
+                description=description,
+                raw=raw_line,
+            )
+        )
+    return OrderDTO(
+        organization_id=organization_id,
+        source=stored["source"],
+        order_id=stored["order_id"],
+        seller_company=stored["seller_company"],
+        distributor_company=stored["distributor_company"],
+        customer_email=stored["customer_email"],
+        currency=stored["currency"],
+        totals=stored["totals"],
+        raw=payload,
+        created_at=datetime.fromisoformat(stored["created_at"]) if stored["created_at"] else None,
+        paid_at=datetime.fromisoformat(stored["paid_at"]) if stored["paid_at"] else None,
+        external_reference=stored["external_reference"],
+        lines=lines,
+        metadata=stored["metadata"],
+    )
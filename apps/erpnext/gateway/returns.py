@@ -9,7 +9,7 @@ from apps.integrations.exceptions import FulfillmentConfigurationError, Fulfillm
 from apps.integrations.models import FulfillmentOrder
 from apps.organizations.models import Organization
 from apps.erpnext.models import ERPNextCredential
-from apps.erpnext.services.client import ERPNextClient, ERPNextClientError
+from apps.erpnext.services.client import ERPNextClientError, get_client
 
 from .settings import GatewaySettings
 
@@ -22,16 +22,16 @@ class FulfillmentReturnService:
     def __init__(self, fulfillment_order: FulfillmentOrder) -> None:
         self.fulfillment_order = fulfillment_order
         self.organization = self._load_organization(fulfillment_order.organization_id)
-        self.settings = GatewaySettings(getattr(self.organization, "metadata", {}))
+        self.settings = GatewaySettings.for_organization(self.organization)
         self.credential = self._resolve_distributor_credential()
         if not self.credential:
             raise FulfillmentConfigurationError(
                 f"No hay credenciales de ERPNext para {fulfillment_order.distributor_company}."
             )
-        self.client = ERPNextClient(self.credential)
+        self.client = get_client(self.credential)
 
     def process(self, *, reason: str = "", warehouse: Optional[str] = None) -> Dict[str, Any]:
-        if not self.fulfillment_order.delivery_note_name:
+        if not self.fulfillment_order.delivery_note_name or not self.fulfillment_order.delivery_note_submitted_at:
             raise FulfillmentError(
                 "No se puede generar la devolución porque no existe Delivery Note previa.",
                 error_code="missing_delivery_note",
@@ -44,12 +44,11 @@ class FulfillmentReturnService:
             )
 
         payload = self._build_return_payload(line_serials, warehouse)
-        response = self.client.insert_doc("Delivery Note", payload)
-        return_dn = response.get("name") if isinstance(response, dict) else None
+        submit_response = self.client.insert_and_submit("Delivery Note", payload)
+        return_dn = submit_response.get("name") if isinstance(submit_response, dict) else None
         if not return_dn:
             raise FulfillmentError("No fue posible crear la Delivery Note de devolución.", error_code="return_creation")
 
-        submit_response = self.client.submit_doc("Delivery Note", return_dn)
         if isinstance(submit_response, dict) and submit_response.get("docstatus") != 1:
             raise FulfillmentError(
                 "La Delivery Note de devolución no pudo ser enviada.",
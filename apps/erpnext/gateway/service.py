@@ -1,8 +1,13 @@
 from __future__ import annotations
 
 import logging
+from datetime import timedelta
 from typing import Any, Dict, Optional
 
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
 from apps.integrations.exceptions import (
     BackorderPending,
     FulfillmentConfigurationError,
@@ -11,8 +16,14 @@ from apps.integrations.exceptions import (
 from apps.integrations.models import FulfillmentItemMap, FulfillmentOrder, IntegrationMessage
 from apps.organizations.models import Organization
 from apps.erpnext.models import ERPNextCredential
-from apps.erpnext.services.client import ERPNextClient, ERPNextClientError
+from apps.erpnext.services.backorders import clear_backorder_index, index_backorder
+from apps.erpnext.services.client import ERPNextClientError, get_client
+from apps.erpnext.services.inventory import InventoryMirror
+from apps.erpnext.services.propagation import enqueue_status_update
+from apps.erpnext.services.reservations import ReservationLedger
+from apps.erpnext.services.retry import collect_stats
 
+from .documents import DocumentJob, DocumentSteps
 from .dto import OrderDTO
 from .executor import FulfillmentExecutor, FulfillmentResult
 from .exceptions import GatewayConfigurationError
@@ -27,11 +38,17 @@ logger = logging.getLogger(__name__)
 class FulfillmentGatewayService:
     """High-level orchestrator for multi-company fulfillment in ERPNext."""
 
+    CLAIMABLE_STATUSES = (
+        FulfillmentOrder.STATUS_PENDING,
+        FulfillmentOrder.STATUS_WAITING_STOCK,
+        FulfillmentOrder.STATUS_FAILED,
+    )
+
     def __init__(self, message: IntegrationMessage) -> None:
         self.message = message
         self.organization = self._load_organization(message.organization_id)
         try:
-            self.settings = GatewaySettings(getattr(self.organization, "metadata", {}))
+            self.settings = GatewaySettings.for_organization(self.organization)
         except GatewayConfigurationError as exc:
             raise FulfillmentConfigurationError(str(exc)) from exc
         if not self.settings.distributor_company:
@@ -48,51 +65,120 @@ class FulfillmentGatewayService:
                 f"No hay credenciales activas para la compañía distribuidora "
                 f"{self.fulfillment_order.distributor_company}."
             )
-        self.distributor_client = ERPNextClient(self.distributor_credential)
+        self.distributor_client = get_client(self.distributor_credential)
 
         self.normalizer = OrderNormalizer(self.organization.id, self.settings)
         self.line_mapper = LineMapper(self.organization.id, self.settings)
-        self.executor = FulfillmentExecutor(self.distributor_client, self.settings)
+        self.executor = FulfillmentExecutor(
+            self.distributor_client,
+            self.settings,
+            inventory=InventoryMirror.for_company(self.organization.id, self.fulfillment_order.distributor_company),
+            reservations=ReservationLedger.for_order(
+                self.organization.id,
+                self.fulfillment_order.distributor_company,
+                self.fulfillment_order.id,
+            ),
+        )
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
     def process(self) -> Dict[str, Any]:
-        if self.fulfillment_order.status == FulfillmentOrder.STATUS_FULFILLED:
+        with collect_stats() as call_stats:
+            try:
+                result = self._process()
+            finally:
+                logger.info(
+                    "[FULFILLMENT] Order %s ERPNext calls: %s",
+                    self.fulfillment_order.order_id,
+                    call_stats.as_dict(),
+                )
+        result["erpnext_calls"] = call_stats.as_dict()
+        return result
+
+    def _process(self) -> Dict[str, Any]:
+        fulfillment_order = self.fulfillment_order
+        previous = None
+        if fulfillment_order.status != FulfillmentOrder.STATUS_FULFILLED:
+            previous = self._claim()
+            if previous is None:
+                # Lo tiene otra corrida (el motor bulk u otro mensaje del mismo pedido), o ya terminó.
+                fulfillment_order.refresh_from_db(
+                    fields=["status", "delivery_note_name", "sales_order_name", "serial_numbers"]
+                )
+
+        if fulfillment_order.status == FulfillmentOrder.STATUS_FULFILLED:
             logger.info(
                 "[FULFILLMENT] Order %s already fulfilled via DN %s",
-                self.fulfillment_order.order_id,
-                self.fulfillment_order.delivery_note_name,
+                fulfillment_order.order_id,
+                fulfillment_order.delivery_note_name,
             )
             return {
-                "delivery_note": self.fulfillment_order.delivery_note_name,
-                "sales_order": self.fulfillment_order.sales_order_name,
-                "serials": self.fulfillment_order.serial_numbers,
+                "delivery_note": fulfillment_order.delivery_note_name,
+                "sales_order": fulfillment_order.sales_order_name,
+                "serials": fulfillment_order.serial_numbers,
                 "status": "already_fulfilled",
             }
+        if previous is None:
+            logger.info(
+                "[FULFILLMENT] Order %s skipped: held by another run (%s)",
+                fulfillment_order.order_id,
+                fulfillment_order.status,
+            )
+            return {
+                "delivery_note": fulfillment_order.delivery_note_name,
+                "sales_order": fulfillment_order.sales_order_name,
+                "serials": fulfillment_order.serial_numbers,
+                "status": "already_claimed",
+            }
+        if previous == FulfillmentOrder.STATUS_WAITING_STOCK:
+            clear_backorder_index([fulfillment_order.pk])
 
-        self.fulfillment_order.mark_status(FulfillmentOrder.STATUS_PROCESSING)
+        # Unidad de trabajo: los cambios del pedido se acumulan y se escriben al
+        # llegar a ERPNext (ver _create_documents) y al terminar la corrida.
+        with self.fulfillment_order.deferred_writes():
+            return self._run()
+
+    def _run(self) -> Dict[str, Any]:
+        fulfillment_order = self.fulfillment_order
+        # Un intento anterior llegó a ERPNext: puede haber dejado documentos sin registrar.
+        resumed = fulfillment_order.reached(FulfillmentOrder.STEP_STOCK)
+        if resumed:
+            logger.info(
+                "[FULFILLMENT] Order %s resuming after step %s",
+                fulfillment_order.order_id,
+                fulfillment_order.checkpoint,
+            )
 
         try:
             order = self._normalize_order()
+            fulfillment_order.reach(FulfillmentOrder.STEP_NORMALIZE)
             mapped_lines, snapshot = self.line_mapper.map_lines(order)
             self._store_mapping_snapshot(snapshot)
+            fulfillment_order.reach(FulfillmentOrder.STEP_MAP)
 
-            self.executor.assign_serials(mapped_lines)
-            result = self._create_documents(order, mapped_lines)
-
-            self.fulfillment_order.record_fulfillment(
-                delivery_note=result.delivery_note,
-                serials=result.serials,
-                sales_order=result.sales_order,
-                result_payload={
-                    "delivery_note": result.delivery_note,
-                    "sales_order": result.sales_order,
-                    "serials": result.serials,
-                    "line_serials": result.line_serials,
-                },
-            )
-            self._propagate_status(order, result.delivery_note)
+            # Con SO o DN ya creadas el stock quedó comprometido en ERPNext.
+            if not (fulfillment_order.sales_order_name or fulfillment_order.delivery_note_name):
+                self.executor.assign_serials(mapped_lines)
+                fulfillment_order.reach(FulfillmentOrder.STEP_STOCK)
+            result = self._create_documents(order, mapped_lines, resumed=resumed)
+
+            # Estado final y registro del outbox en la misma transacción.
+            with transaction.atomic():
+                self.fulfillment_order.record_fulfillment(
+                    delivery_note=result.delivery_note,
+                    serials=result.serials,
+                    sales_order=result.sales_order,
+                    result_payload={
+                        "delivery_note": result.delivery_note,
+                        "sales_order": result.sales_order,
+                        "serials": result.serials,
+                        "line_serials": result.line_serials,
+                    },
+                )
+                self._propagate_status(order, result.delivery_note)
+                fulfillment_order.reach(FulfillmentOrder.STEP_PROPAGATE)
+                fulfillment_order.flush_writes()
             return {
                 "delivery_note": result.delivery_note,
                 "sales_order": result.sales_order,
@@ -109,9 +195,14 @@ class FulfillmentGatewayService:
                 error_message=str(exc),
                 delay_seconds=self.settings.backorder_retry_seconds,
             )
+            # El estado y el índice se ven juntos: una subida de stock entre ambos no se pierde.
+            with transaction.atomic():
+                self.fulfillment_order.flush_writes()
+                index_backorder(self.fulfillment_order, exc.shortages)
             raise
         except FulfillmentError as exc:
             logger.exception("[FULFILLMENT] Error processing order %s", self.fulfillment_order.order_id)
+            self._release_reservations()
             self.fulfillment_order.mark_status(
                 FulfillmentOrder.STATUS_FAILED,
                 error_code=exc.error_code,
@@ -121,6 +212,7 @@ class FulfillmentGatewayService:
             raise
         except ERPNextClientError as exc:
             logger.exception("[FULFILLMENT] ERPNext client error processing order %s", self.fulfillment_order.order_id)
+            self._release_reservations()
             self.fulfillment_order.mark_status(
                 FulfillmentOrder.STATUS_FAILED,
                 error_code="erpnext_error",
@@ -130,6 +222,7 @@ class FulfillmentGatewayService:
             raise FulfillmentError(str(exc), error_code="erpnext_error", retryable=True, status_code=502) from exc
         except Exception as exc:  # pragma: no cover - defensive fallback
             logger.exception("[FULFILLMENT] Unexpected error processing order %s", self.fulfillment_order.order_id)
+            self._release_reservations()
             self.fulfillment_order.mark_status(
                 FulfillmentOrder.STATUS_FAILED,
                 error_code="unexpected_error",
@@ -145,78 +238,72 @@ class FulfillmentGatewayService:
         """Generate a Delivery Note Return for the fulfilled order."""
         return FulfillmentReturnService(self.fulfillment_order).process(reason=reason, warehouse=warehouse)
 
+    def _claim(self) -> Optional[str]:
+        """Move the order to processing right away, outside the unit of work; returns its previous status.
+
+        ``None`` means another run holds it. The UPDATE only matches the row as
+        it was read (status and ``updated_at``), so a row another run touched in
+        between is reloaded before trying again. An order left in processing
+        longer than ``ERPNEXT_FULFILLMENT_CLAIM_LEASE_SECONDS`` belongs to a run
+        that died and can be claimed again.
+        """
+        fulfillment_order = self.fulfillment_order
+        lease = timedelta(seconds=getattr(settings, "ERPNEXT_FULFILLMENT_CLAIM_LEASE_SECONDS", 900))
+        for attempt in range(2):
+            if attempt:
+                fulfillment_order.refresh_from_db()
+            now = timezone.now()
+            previous = fulfillment_order.status
+            if previous not in self.CLAIMABLE_STATUSES and not (
+                previous == FulfillmentOrder.STATUS_PROCESSING and fulfillment_order.updated_at < now - lease
+            ):
+                return None
+            updates = {
+                "status": FulfillmentOrder.STATUS_PROCESSING,
+                "last_error_code": "",
+                "last_error_message": "",
+                "next_attempt_at": None,
+                "updated_at": now,
+            }
+            claimed = FulfillmentOrder.objects.filter(
+                pk=fulfillment_order.pk, status=previous, updated_at=fulfillment_order.updated_at
+            ).update(**updates)
+            if claimed:
+                for field, value in updates.items():
+                    setattr(fulfillment_order, field, value)
+                return previous
+        return None
+
     def _normalize_order(self) -> OrderDTO:
-        seller_company = self.fulfillment_order.seller_company
-        distributor_company = self.fulfillment_order.distributor_company
-        order = self.normalizer.normalize(
-            source=self.source,
-            payload=self.payload,
-            seller_company=seller_company,
-            distributor_company=distributor_company,
-        )
-        self.fulfillment_order.normalized_order = {
-            "order_id": order.order_id,
-            "source": order.source,
-            "seller_company": order.seller_company,
-            "distributor_company": order.distributor_company,
-            "customer_email": order.customer_email,
-            "totals": order.totals,
-        }
-        self.fulfillment_order.save(update_fields=["normalized_order", "updated_at"])
+        # Un reintento con el mismo payload reutiliza el pedido ya normalizado.
+        order, reused = self.normalizer.normalize_stored(self.fulfillment_order)
+        if not reused:
+            self.fulfillment_order.save(update_fields=["normalized_order", "updated_at"])
         return order
 
     def _store_mapping_snapshot(self, snapshot: Dict[str, Any]) -> None:
         self.fulfillment_order.fulfillment_payload = snapshot
         self.fulfillment_order.save(update_fields=["fulfillment_payload", "updated_at"])
 
-    def _create_documents(self, order: OrderDTO, mapped_lines) -> FulfillmentResult:
-        sales_order_name = self.executor.create_sales_order(order, mapped_lines)
-        result = self.executor.create_delivery_note(order, mapped_lines, sales_order_name)
-        return result
+    def _create_documents(self, order: OrderDTO, mapped_lines, *, resumed: bool = False) -> FulfillmentResult:
+        """SO, DN insert and DN submit, each checkpointed; a retry reuses what already exists (see ``DocumentSteps``)."""
+        fulfillment_order = self.fulfillment_order
+        # Normalizado y snapshot deben ser durables antes de crear documentos remotos.
+        fulfillment_order.flush_writes()
 
-    def _propagate_status(self, order: OrderDTO, delivery_note_name: str) -> None:
-        if order.source == FulfillmentItemMap.SOURCE_ERPNEXT:
-            self._update_erpnext_source(order, delivery_note_name)
-        elif order.source == FulfillmentItemMap.SOURCE_SHOPIFY:
-            self._record_shopify_feedback(delivery_note_name)
+        job = DocumentJob(fulfillment_order, order, mapped_lines, resumed=resumed)
+        outcome = DocumentSteps(self.executor).run([job])[fulfillment_order.pk]
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.executor.finish_delivery(mapped_lines)
+        return outcome
 
-    def _update_erpnext_source(self, order: OrderDTO, delivery_note_name: str) -> None:
-        credential = ERPNextCredential.objects.for_company(
-            organization_id=self.organization.id,
-            company=order.seller_company,
-        )
-        if not credential:
-            logger.warning(
-                "[FULFILLMENT] No ERPNext credential available for seller %s to propagate status.",
-                order.seller_company,
-            )
-            return
-        client = ERPNextClient(credential)
-        try:
-            client.update_doc(
-                "Sales Invoice",
-                order.order_id,
-                {
-                    "custom_fulfillment_status": "fulfilled",
-                    "custom_external_ref": delivery_note_name,
-                },
-            )
-        except ERPNextClientError as exc:
-            logger.warning(
-                "[FULFILLMENT] Failed to update Sales Invoice %s: %s",
-                order.order_id,
-                exc,
-            )
+    def _release_reservations(self) -> None:
+        if self.executor.reservations is not None:
+            self.executor.reservations.release()
 
-    def _record_shopify_feedback(self, delivery_note_name: str) -> None:
-        payload = self.fulfillment_order.result_payload or {}
-        payload["shopify_feedback"] = {
-            "status": "pending",
-            "delivery_note": delivery_note_name,
-            "note": "Pending Shopify fulfillment update (token not configurado).",
-        }
-        self.fulfillment_order.result_payload = payload
-        self.fulfillment_order.save(update_fields=["result_payload", "updated_at"])
+    def _propagate_status(self, order: OrderDTO, delivery_note_name: str) -> None:
+        propagate_fulfillment_status(self.fulfillment_order, order, delivery_note_name)
 
     # ------------------------------------------------------------------
     # Data loading/helpers
@@ -225,30 +312,14 @@ class FulfillmentGatewayService:
         seller_company = self.settings.resolve_seller_company(self.source, self.payload)
         distributor_company = self.settings.distributor_company
 
-        defaults = {
-            "seller_company": seller_company,
-            "distributor_company": distributor_company,
-            "payload": self.payload,
-            "status": FulfillmentOrder.STATUS_PENDING,
-        }
-        order, created = FulfillmentOrder.objects.get_or_create(
+        return FulfillmentOrder.objects.upsert_for_processing(
             organization_id=self.message.organization_id,
             source=self.source,
             order_id=self._resolve_order_id(),
-            defaults=defaults,
+            seller_company=seller_company,
+            distributor_company=distributor_company,
+            payload=self.payload,
         )
-        if created:
-            return order
-
-        updates = {
-            "payload": self.payload,
-            "seller_company": seller_company or order.seller_company,
-            "distributor_company": distributor_company or order.distributor_company,
-        }
-        for attr, value in updates.items():
-            setattr(order, attr, value)
-        order.save(update_fields=list(updates.keys()) + ["updated_at"])
-        return order
 
     def _resolve_distributor_credential(self) -> Optional[ERPNextCredential]:
         return ERPNextCredential.objects.for_company(
@@ -277,6 +348,39 @@ class FulfillmentGatewayService:
         return str(self.message.external_reference or self.message.id)
 
 
+def propagate_fulfillment_status(fulfillment_order: FulfillmentOrder, order: OrderDTO, delivery_note_name: str) -> None:
+    """Tell the seller side that ``order`` was fulfilled with ``delivery_note_name``."""
+    if order.source == FulfillmentItemMap.SOURCE_ERPNEXT:
+        _update_erpnext_source(fulfillment_order.organization_id, order, delivery_note_name)
+    elif order.source == FulfillmentItemMap.SOURCE_SHOPIFY:
+        _record_shopify_feedback(fulfillment_order, delivery_note_name)
+
+
+def _update_erpnext_source(organization_id, order: OrderDTO, delivery_note_name: str) -> None:
+    # Outbox: el consumidor (deliver_status_propagations_task) lo entrega agrupado por sitio del vendedor.
+    enqueue_status_update(
+        organization_id,
+        order.seller_company,
+        "Sales Invoice",
+        order.order_id,
+        {
+            "custom_fulfillment_status": "fulfilled",
+            "custom_external_ref": delivery_note_name,
+        },
+    )
+
+
+def _record_shopify_feedback(fulfillment_order: FulfillmentOrder, delivery_note_name: str) -> None:
+    payload = fulfillment_order.result_payload or {}
+    payload["shopify_feedback"] = {
+        "status": "pending",
+        "delivery_note": delivery_note_name,
+        "note": "Pending Shopify fulfillment update (token not configurado).",
+    }
+    fulfillment_order.result_payload = payload
+    fulfillment_order.save(update_fields=["result_payload", "updated_at"])
+
+
 def process_fulfillment_message(message: IntegrationMessage) -> Dict[str, Any]:
     service = FulfillmentGatewayService(message)
     return service.process()
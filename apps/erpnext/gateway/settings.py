@@ -1,60 +1,74 @@
 from __future__ import annotations
-from typing import Any, Dict, Optional
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
 
 from .exceptions import GatewayConfigurationError
 
+SNAPSHOT_CACHE_SIZE = 256
+
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
 
 class GatewaySettings:
-    """Wrapper around organization metadata for fulfillment gateway."""
+    """Wrapper around organization metadata for fulfillment gateway.
+
+    Everything is parsed once in ``__init__`` into read-only lookup tables;
+    use ``for_organization`` to share the compiled snapshot between messages
+    until the organization is saved again.
+    """
 
     def __init__(self, metadata: Dict[str, Any]):
-        self.raw = (metadata or {}).get("fulfillment_gateway") or {}
-        print(f"--- SETTINGS: RAW FULFILLMENT GATEWAY METADATA ---\n{self.raw}")
-        if not isinstance(self.raw, dict):
+        raw = (metadata or {}).get("fulfillment_gateway") or {}
+        print(f"--- SETTINGS: RAW FULFILLMENT GATEWAY METADATA ---\n{raw}")
+        if not isinstance(raw, dict):
             raise GatewayConfigurationError("metadata.fulfillment_gateway debe ser un objeto JSON.")
+        self._distributor_company = str(raw.get("distributor_company") or raw.get("distributor") or "").strip()
+        self._default_warehouse = self._compile_default_warehouse(raw)
+        self._create_sales_order = bool(raw.get("create_sales_order", True))
+        self._serial_status = str(raw.get("serial_status") or "Available")
+        self._backorder_retry_seconds = self._compile_backorder_retry(raw)
+        item_map = raw.get("item_map") or {}
+        self._item_map = MappingProxyType(item_map if isinstance(item_map, dict) else {})
+        self._item_tables = self._compile_item_tables(self._item_map)
+        self._sellers = self._compile_sellers(raw)
+
+    @classmethod
+    def for_organization(cls, organization) -> "GatewaySettings":
+        """Compiled snapshot shared per (organization id, ``updated_at``)."""
+        return _snapshots.get(organization)
 
     @property
     def distributor_company(self) -> str:
-        value = self.raw.get("distributor_company") or self.raw.get("distributor") or ""
-        return str(value).strip()
+        return self._distributor_company
 
     @property
     def default_warehouse(self) -> Optional[str]:
-        warehouse = self.raw.get("default_warehouse")
-        if warehouse:
-            return str(warehouse)
-        distributor = self.raw.get("distributor")
-        if isinstance(distributor, dict):
-            value = distributor.get("warehouse")
-            if value:
-                return str(value)
-        return None
+        return self._default_warehouse
 
     @property
     def create_sales_order(self) -> bool:
-        return bool(self.raw.get("create_sales_order", True))
+        return self._create_sales_order
 
     @property
     def serial_status(self) -> str:
-        return str(self.raw.get("serial_status") or "Available")
+        return self._serial_status
 
     @property
     def backorder_retry_seconds(self) -> int:
-        backorder = self.raw.get("backorder") or {}
-        try:
-            return int(backorder.get("retry_delay_seconds") or 900)
-        except (TypeError, ValueError):
-            return 900
+        return self._backorder_retry_seconds
 
     @property
-    def item_map(self) -> Dict[str, Any]:
-        mapping = self.raw.get("item_map") or {}
-        return mapping if isinstance(mapping, dict) else {}
+    def item_map(self) -> Mapping[str, Any]:
+        return self._item_map
 
-    def seller_config(self, source: str) -> Dict[str, Any]:
-        sellers = self.raw.get("sellers") or {}
-        config = sellers.get(source) if isinstance(sellers, dict) else {}
-        return config if isinstance(config, dict) else {}
+    def seller_config(self, source: str) -> Mapping[str, Any]:
+        seller = self._sellers.get(source)
+        return seller["config"] if seller else _EMPTY
 
     def metadata_item_mapping(
         self,
@@ -62,23 +76,14 @@ class GatewaySettings:
         source: str,
         seller_company: str,
         source_item_code: str,
-    ) -> Optional[Dict[str, Any]]:
-        mapping = self.item_map.get(source) if isinstance(self.item_map, dict) else {}
-        if not isinstance(mapping, dict):
+    ) -> Optional[Mapping[str, Any]]:
+        companies = self._item_tables.get(source)
+        if not companies:
             return None
-        company_map = (
-            mapping.get(seller_company)
-            or mapping.get(seller_company.upper())
-            or mapping.get("*")
-        )
-        if not isinstance(company_map, dict):
+        table = companies.get(seller_company) or companies.get(seller_company.upper()) or companies.get("*")
+        if not table:
             return None
-        entry = company_map.get(source_item_code) or company_map.get(source_item_code.upper())
-        if isinstance(entry, dict):
-            return entry
-        if isinstance(entry, str):
-            return {"target_item_code": entry}
-        return None
+        return table.get(source_item_code) or table.get(source_item_code.upper())
 
     def resolve_seller_company(self, source: str, payload: Dict[str, Any]) -> str:
         """Infer seller company from payload + metadata."""
@@ -86,15 +91,11 @@ class GatewaySettings:
         if explicit:
             return str(explicit).strip()
 
-        config = self.seller_config(source)
-        print(f"--- SETTINGS: SELLER CONFIG for source '{source}' ---\n{config}")
-        default_company = config.get("default_company") or self.raw.get("default_seller_company")
+        seller = self._sellers.get(source) or {}
+        default_company = seller.get("default_company") or self._sellers["*"]["default_company"]
 
         if source == "shopify":
-            selector = config.get("company_selector") or {}
-            print(f"--- SETTINGS: COMPANY SELECTOR ---\n{selector}")
-            company = self._resolve_shopify_company(selector, payload)
-            print(f"--- SETTINGS: RESOLVED SHOPIFY COMPANY ---\n{company}")
+            company = self._resolve_shopify_company(seller, payload)
             if company:
                 return company
 
@@ -103,14 +104,11 @@ class GatewaySettings:
             if invoice_company:
                 return str(invoice_company)
 
-        return str(default_company or "").strip()
+        return default_company
 
-    def _resolve_shopify_company(self, selector: Dict[str, Any], payload: Dict[str, Any]) -> str:
-        if not isinstance(selector, dict):
-            return ""
-        source = selector.get("source")
-        prefix = selector.get("prefix")
-        if source == "tags" and prefix:
+    def _resolve_shopify_company(self, seller: Mapping[str, Any], payload: Dict[str, Any]) -> str:
+        prefix = seller.get("tag_prefix")
+        if prefix:
             tags_raw = payload.get("tags")
             if isinstance(tags_raw, str):
                 for tag in (tag.strip() for tag in tags_raw.split(",")):
@@ -118,13 +116,126 @@ class GatewaySettings:
                         company = tag[len(prefix) :].strip()
                         if company:
                             return company
-        domain_map = selector.get("domain_map") or {}
-        if isinstance(domain_map, dict):
+        domain_map = seller.get("domain_map")
+        if domain_map:
             domain = payload.get("_shopify_domain") or payload.get("domain")
-            print(f"--- SETTINGS: DOMAIN FROM PAYLOAD ---\n{domain}")
             if domain:
-                mapped = domain_map.get(domain) or domain_map.get(str(domain).lower())
-                print(f"--- SETTINGS: MAPPED COMPANY FROM DOMAIN_MAP ---\n{mapped}")
-                if mapped:
-                    return str(mapped)
+                return domain_map.get(domain) or domain_map.get(str(domain).lower()) or ""
         return ""
+
+    # ------------------------------------------------------------------
+    # Compilación
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _compile_default_warehouse(raw: Dict[str, Any]) -> Optional[str]:
+        warehouse = raw.get("default_warehouse")
+        if warehouse:
+            return str(warehouse)
+        distributor = raw.get("distributor")
+        if isinstance(distributor, dict) and distributor.get("warehouse"):
+            return str(distributor["warehouse"])
+        return None
+
+    @staticmethod
+    def _compile_backorder_retry(raw: Dict[str, Any]) -> int:
+        backorder = raw.get("backorder") or {}
+        try:
+            return int(backorder.get("retry_delay_seconds") or 900)
+        except (TypeError, ValueError, AttributeError):
+            return 900
+
+    @staticmethod
+    def _compile_item_tables(item_map: Mapping[str, Any]):
+        """source -> company key -> SKU -> entry; entries in string form become dicts here."""
+        tables: Dict[str, Mapping[str, Mapping[str, Mapping[str, Any]]]] = {}
+        for source, companies in item_map.items():
+            if not isinstance(companies, dict):
+                continue
+            compiled: Dict[str, Mapping[str, Mapping[str, Any]]] = {}
+            for company, entries in companies.items():
+                if not isinstance(entries, dict):
+                    continue
+                table = {}
+                for code, entry in entries.items():
+                    if isinstance(entry, str) and entry:
+                        table[code] = MappingProxyType({"target_item_code": entry})
+                    elif isinstance(entry, dict) and entry:
+                        table[code] = MappingProxyType(dict(entry))
+                if table:
+                    compiled[company] = MappingProxyType(table)
+            tables[source] = MappingProxyType(compiled)
+        return MappingProxyType(tables)
+
+    @staticmethod
+    def _compile_sellers(raw: Dict[str, Any]):
+        """Per-source default company and Shopify selector (tag prefix, domain map)."""
+        sellers_raw = raw.get("sellers") or {}
+        sellers: Dict[str, Mapping[str, Any]] = {
+            "*": MappingProxyType({"default_company": str(raw.get("default_seller_company") or "").strip()})
+        }
+        if not isinstance(sellers_raw, dict):
+            return MappingProxyType(sellers)
+        for source, config in sellers_raw.items():
+            if not isinstance(config, dict):
+                continue
+            selector = config.get("company_selector") or {}
+            if not isinstance(selector, dict):
+                selector = {}
+            domain_map = selector.get("domain_map") or {}
+            sellers[source] = MappingProxyType(
+                {
+                    "config": MappingProxyType(dict(config)),
+                    "default_company": str(config.get("default_company") or "").strip(),
+                    "tag_prefix": selector.get("prefix") if selector.get("source") == "tags" else None,
+                    "domain_map": MappingProxyType(
+                        {domain: str(company) for domain, company in domain_map.items() if company}
+                        if isinstance(domain_map, dict)
+                        else {}
+                    ),
+                }
+            )
+        return MappingProxyType(sellers)
+
+
+class _SnapshotCache:
+    """Small LRU of compiled settings keyed by (organization id, ``updated_at``).
+
+    Saving the organization bumps ``updated_at`` and so yields a new snapshot
+    without re-reading the metadata per message. Objects without ``updated_at``
+    (unsaved or built by hand) fall back to a hash of their gateway metadata.
+    """
+
+    def __init__(self, maxsize: int = SNAPSHOT_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, str], GatewaySettings]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, organization) -> GatewaySettings:
+        metadata = getattr(organization, "metadata", None) or {}
+        version = getattr(organization, "updated_at", None)
+        if version is None:
+            version = _metadata_hash(metadata.get("fulfillment_gateway"))
+        key = (str(getattr(organization, "id", "")), str(version))
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+                return snapshot
+        snapshot = GatewaySettings(metadata)
+        with self._lock:
+            self._entries[key] = snapshot
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _metadata_hash(raw: Any) -> str:
+    encoded = json.dumps(raw, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+_snapshots = _SnapshotCache()
@@ -1,7 +1,8 @@
 import logging
 from typing import Any, Dict
 
-from events.events.erpnext_events import ERPNextFulfillmentRequested, ERPNextFulfillmentProcessRequested, ERPNextInvoiceSyncRequested
+from events.events.alegra_events import ERPNextInvoiceSyncRequested
+from events.events.erpnext_events import ERPNextFulfillmentRequested, ERPNextFulfillmentProcessRequested
 from events.events.integration_events import IntegrationMessageReceived
 from apps.erpnext.gateway import process_fulfillment_message
 from apps.integrations.models import IntegrationMessage
@@ -26,7 +27,6 @@ def handle_integration_message_received(event: IntegrationMessageReceived):
         logger.info("[ERPNEXT] Publishing ERPNextInvoiceSyncRequested event.")
         event = ERPNextInvoiceSyncRequested(
             event_id=str(message.id),
-            event_type="ERPNextInvoiceSyncRequested",
             message_id=message.id,
         )
         event_bus.publish(event)
@@ -35,7 +35,6 @@ def handle_integration_message_received(event: IntegrationMessageReceived):
         logger.info("[ERPNEXT] Publishing ERPNextFulfillmentRequested event.")
         event = ERPNextFulfillmentRequested(
             event_id=str(message.id),
-            event_type="ERPNextFulfillmentRequested",
             message_id=message.id,
         )
         event_bus.publish(event)
@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.erpnext.services.client import ERPNextClient
+from apps.erpnext.services.sessions import build_session
+from apps.integrations.fake_servers import FakeFrappeServer
+
+
+class Command(BaseCommand):
+    help = "Benchmarks ERPNextClient calls/sec with one-shot requests vs pooled keep-alive sessions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=500, help="Calls per scenario.")
+        parser.add_argument("--concurrency", type=int, default=1, help="Worker threads per scenario.")
+        parser.add_argument(
+            "--url",
+            type=str,
+            default="",
+            help="Existing ERPNext stand-in base URL; a local server is started when omitted.",
+        )
+
+    def handle(self, *args, **options):
+        server = None
+        base_url = options["url"]
+        if not base_url:
+            server = FakeFrappeServer()
+            for index in range(options["calls"]):
+                server.seed("Item", {"name": f"ITEM-{index}", "actual_qty": 5})
+            base_url = server.start().base_url
+
+        credential = SimpleNamespace(erpnext_url=base_url, api_key="bench", api_secret="bench")
+        calls = options["calls"]
+        concurrency = options["concurrency"]
+        timeout = getattr(settings, "REQUESTS_TIMEOUT", 15)
+
+        try:
+            one_shot = ERPNextClient(credential, session=build_session())
+            headers = one_shot._get_headers()
+
+            def before(index):
+                # Previous behaviour: module-level requests.request, new connection per call.
+                url = f"{one_shot.base_url}api/resource/Item/ITEM-{index}"
+                requests.request("GET", url, headers=headers, timeout=timeout).json()
+
+            pooled = ERPNextClient(credential, session=build_session())
+            pooled.rate_limiter = None  # measure the transport, not the per-site budget
+
+            def after(index):
+                pooled.get_doc("Item", f"ITEM-{index}", cache=False)
+
+            for label, fn in (("requests.request", before), ("pooled session", after)):
+                rate = self._measure(fn, calls, concurrency)
+                self.stdout.write(f"{label:<20} {rate:>10.1f} calls/s  ({calls} calls, concurrency={concurrency})")
+        finally:
+            if server:
+                server.stop()
+
+    @staticmethod
+    def _measure(fn, calls: int, concurrency: int) -> float:
+        started = time.perf_counter()
+        if concurrency <= 1:
+            for index in range(calls):
+                fn(index)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(fn, range(calls)))
+        elapsed = time.perf_counter() - started
+        return calls / elapsed if elapsed else 0.0
@@ -0,0 +1,78 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from apps.erpnext.gateway.dto import MappedOrderLineDTO, OrderDTO
+from apps.erpnext.gateway.executor import FulfillmentExecutor
+from apps.erpnext.gateway.settings import GatewaySettings
+from apps.erpnext.services.client import ERPNextClient
+from apps.erpnext.services.retry import collect_stats
+from apps.erpnext.services.sessions import build_session
+from apps.integrations.fake_servers import FakeFrappeServer, FaultProfile
+
+
+class Command(BaseCommand):
+    help = "Measures ERPNext round trips and latency per fulfilled order with and without submit-on-insert."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=50, help="Orders per scenario.")
+        parser.add_argument("--latency-ms", type=float, default=40.0, help="Simulated round-trip time per request.")
+        parser.add_argument("--lines", type=int, default=3, help="Lines per order.")
+
+    def handle(self, *args, **options):
+        server = FakeFrappeServer(faults=FaultProfile.parse(f"fixed:{options['latency_ms']}"))
+        for n in range(options["lines"]):
+            server.seed_stock(f"ITEM-{n}", "Stores", 1_000_000)
+        server.start()
+        credential = server.credential()
+        settings = GatewaySettings({"fulfillment_gateway": {"create_sales_order": True}})
+
+        try:
+            for label, submit_on_insert in (("insert + submit", False), ("submit-on-insert", None)):
+                client = ERPNextClient(credential, session=build_session())
+                client._submit_on_insert = submit_on_insert
+                client.rate_limiter = None
+                executor = FulfillmentExecutor(client, settings)
+                started = time.perf_counter()
+                with collect_stats() as stats:
+                    for index in range(options["orders"]):
+                        order, lines = self._order(index, options["lines"])
+                        executor.assign_serials(lines)
+                        so_name = executor.create_sales_order(order, lines)
+                        executor.create_delivery_note(order, lines, so_name)
+                elapsed = time.perf_counter() - started
+                per_order_ms = elapsed / options["orders"] * 1000
+                self.stdout.write(
+                    f"{label:<18} {per_order_ms:>8.1f} ms/order  "
+                    f"{stats.calls / options['orders']:.1f} calls/order  "
+                    f"(latency={options['latency_ms']}ms, lines={options['lines']})"
+                )
+        finally:
+            server.stop()
+
+    @staticmethod
+    def _order(index: int, line_count: int):
+        order = OrderDTO(
+            organization_id=uuid.uuid4(),
+            source="bench",
+            order_id=f"BENCH-{index}",
+            seller_company="Seller",
+            distributor_company="Distributor",
+            customer_email="bench@example.com",
+            currency="COP",
+            totals={},
+            raw={"posting_date": "2024-01-01"},
+        )
+        lines = [
+            MappedOrderLineDTO(
+                source_item_code=f"SKU-{n}",
+                quantity=Decimal("1"),
+                unit_price=Decimal("10"),
+                target_item_code=f"ITEM-{n}",
+                warehouse="Stores",
+            )
+            for n in range(line_count)
+        ]
+        return order, lines
@@ -2,7 +2,7 @@ import json
 from django.core.management.base import BaseCommand, CommandError
 
 from apps.erpnext.models import ERPNextCredential
-from apps.erpnext.services.client import ERPNextClient, ERPNextClientError
+from apps.erpnext.services.client import ERPNextClientError, get_client
 from apps.organizations.models import Organization
 
 
@@ -64,7 +64,7 @@ class Command(BaseCommand):
             self.stdout.write(f"Usando la credencial de ERPNext: {credential.api_key[:5]}...\n")
 
             # 3. Crear cliente
-            client = ERPNextClient(credential)
+            client = get_client(credential)
 
             # 4. MÉTODO CORRECTO: Buscar seriales según documentación oficial
             self.stdout.write("Consultando API de ERPNext...\n")
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erpnext", "0002_add_company_to_credential"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryLevel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("organization_id", models.UUIDField(verbose_name="Organization ID")),
+                ("company", models.CharField(max_length=140, verbose_name="Company")),
+                ("item_code", models.CharField(max_length=140)),
+                ("warehouse", models.CharField(max_length=140)),
+                (
+                    "actual_qty",
+                    models.DecimalField(decimal_places=6, default=0, max_digits=18),
+                ),
+                (
+                    "reserved_qty",
+                    models.DecimalField(decimal_places=6, default=0, max_digits=18),
+                ),
+                (
+                    "modified",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Bin.modified as sent by ERPNext (site-local timestamp).",
+                        max_length=32,
+                    ),
+                ),
+                ("synced_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Inventory Level",
+                "verbose_name_plural": "Inventory Levels",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("organization_id", "company", "item_code", "warehouse"),
+                        name="uniq_inventory_level_bin",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="InventorySyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("organization_id", models.UUIDField(verbose_name="Organization ID")),
+                ("company", models.CharField(max_length=140, verbose_name="Company")),
+                ("cursor", models.CharField(blank=True, default="", max_length=32)),
+                ("last_synced_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True, default="")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Inventory Sync State",
+                "verbose_name_plural": "Inventory Sync States",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("organization_id", "company"),
+                        name="uniq_inventory_sync_company",
+                    )
+                ],
+            },
+        ),
+    ]
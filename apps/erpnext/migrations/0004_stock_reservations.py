@@ -0,0 +1,106 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erpnext", "0003_inventory_mirror"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockReservationBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("organization_id", models.UUIDField(verbose_name="Organization ID")),
+                ("company", models.CharField(max_length=140, verbose_name="Company")),
+                ("item_code", models.CharField(max_length=140)),
+                ("warehouse", models.CharField(max_length=140)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Stock Reservation Bucket",
+                "verbose_name_plural": "Stock Reservation Buckets",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("organization_id", "company", "item_code", "warehouse"),
+                        name="uniq_reservation_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "reference",
+                    models.CharField(
+                        help_text="FulfillmentOrder id holding the stock.",
+                        max_length=64,
+                    ),
+                ),
+                ("quantity", models.DecimalField(decimal_places=6, max_digits=18)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("active", "Active"),
+                            ("committed", "Committed"),
+                            ("released", "Released"),
+                        ],
+                        default="active",
+                        max_length=16,
+                    ),
+                ),
+                ("expires_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "bucket",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="erpnext.stockreservationbucket",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Stock Reservation",
+                "verbose_name_plural": "Stock Reservations",
+                "indexes": [
+                    models.Index(
+                        fields=["reference", "status"],
+                        name="idx_reservation_ref_status",
+                    ),
+                    models.Index(
+                        fields=["status", "expires_at"], name="idx_reservation_expiry"
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("bucket", "reference"),
+                        name="uniq_reservation_per_order",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erpnext", "0004_stock_reservations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatusPropagation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("organization_id", models.UUIDField(verbose_name="Organization ID")),
+                (
+                    "company",
+                    models.CharField(
+                        help_text="Seller company that owns the document.",
+                        max_length=140,
+                        verbose_name="Company",
+                    ),
+                ),
+                ("doctype", models.CharField(max_length=140)),
+                ("docname", models.CharField(max_length=140)),
+                ("payload", models.JSONField(blank=True, default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("sent", "Sent"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("enqueued_at", models.DateTimeField()),
+                ("next_attempt_at", models.DateTimeField()),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Status Propagation",
+                "verbose_name_plural": "Status Propagations",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt_at"], name="idx_propagation_due"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("organization_id", "company", "doctype", "docname"),
+                        name="uniq_status_propagation",
+                    )
+                ],
+            },
+        ),
+    ]
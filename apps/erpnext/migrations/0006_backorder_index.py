@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erpnext", "0005_status_propagation_outbox"),
+        ("integrations", "0006_fulfillment_checkpoints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BackorderLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("organization_id", models.UUIDField(verbose_name="Organization ID")),
+                (
+                    "company",
+                    models.CharField(
+                        help_text="Distributor company.",
+                        max_length=140,
+                        verbose_name="Company",
+                    ),
+                ),
+                ("item_code", models.CharField(max_length=140)),
+                ("warehouse", models.CharField(max_length=140)),
+                (
+                    "quantity",
+                    models.DecimalField(
+                        decimal_places=6,
+                        help_text="Quantity the order requires.",
+                        max_digits=18,
+                    ),
+                ),
+                (
+                    "waiting_since",
+                    models.DateTimeField(
+                        help_text="Order creation time; wake-ups go oldest first."
+                    ),
+                ),
+                (
+                    "fulfillment_order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="backorder_lines",
+                        to="integrations.fulfillmentorder",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Backorder Line",
+                "verbose_name_plural": "Backorder Lines",
+                "indexes": [
+                    models.Index(
+                        fields=[
+                            "organization_id",
+                            "company",
+                            "item_code",
+                            "warehouse",
+                            "waiting_since",
+                        ],
+                        name="idx_backorder_bin",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("fulfillment_order", "item_code", "warehouse"),
+                        name="uniq_backorder_line",
+                    )
+                ],
+            },
+        ),
+    ]
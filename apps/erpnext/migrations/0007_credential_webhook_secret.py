@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erpnext", "0006_backorder_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="erpnextcredential",
+            name="webhook_secret",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Secret of the ERPNext Bin webhook for this site and company; leave blank to reject webhooks.",
+                max_length=255,
+                verbose_name="Webhook Secret",
+            ),
+        ),
+    ]
@@ -48,6 +48,13 @@ class ERPNextCredential(models.Model):
         max_length=255,
         verbose_name=_("API Secret"),
     )
+    webhook_secret = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        verbose_name=_("Webhook Secret"),
+        help_text=_("Secret of the ERPNext Bin webhook for this site and company; leave blank to reject webhooks."),
+    )
     is_active = models.BooleanField(
         default=True,
         verbose_name=_("Active"),
@@ -70,3 +77,190 @@ class ERPNextCredential(models.Model):
     def __str__(self) -> str:
         company = f" · {self.company}" if self.company else ""
         return f"{self.organization_id}{company} - {self.erpnext_url}"
+
+
+class InventoryLevel(models.Model):
+    """Local mirror of an ERPNext Bin for a distributor company."""
+
+    organization_id = models.UUIDField(verbose_name=_("Organization ID"))
+    company = models.CharField(max_length=140, verbose_name=_("Company"))
+    item_code = models.CharField(max_length=140)
+    warehouse = models.CharField(max_length=140)
+    actual_qty = models.DecimalField(max_digits=18, decimal_places=6, default=0)
+    reserved_qty = models.DecimalField(max_digits=18, decimal_places=6, default=0)
+    modified = models.CharField(
+        max_length=32,
+        blank=True,
+        default="",
+        help_text=_("Bin.modified as sent by ERPNext (site-local timestamp)."),
+    )
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Inventory Level")
+        verbose_name_plural = _("Inventory Levels")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("organization_id", "company", "item_code", "warehouse"),
+                name="uniq_inventory_level_bin",
+            ),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - debug aid
+        return f"{self.company} · {self.item_code}@{self.warehouse}: {self.actual_qty}"
+
+
+class InventorySyncState(models.Model):
+    """Delta-sync cursor of the inventory mirror per distributor company."""
+
+    organization_id = models.UUIDField(verbose_name=_("Organization ID"))
+    company = models.CharField(max_length=140, verbose_name=_("Company"))
+    cursor = models.CharField(max_length=32, blank=True, default="")
+    last_synced_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Inventory Sync State")
+        verbose_name_plural = _("Inventory Sync States")
+        constraints = [
+            models.UniqueConstraint(fields=("organization_id", "company"), name="uniq_inventory_sync_company"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - debug aid
+        return f"{self.organization_id} · {self.company} @ {self.cursor or '-'}"
+
+
+class StockReservationBucket(models.Model):
+    """Lock row per (company, item, warehouse); reservations for the key are taken under its row lock."""
+
+    organization_id = models.UUIDField(verbose_name=_("Organization ID"))
+    company = models.CharField(max_length=140, verbose_name=_("Company"))
+    item_code = models.CharField(max_length=140)
+    warehouse = models.CharField(max_length=140)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Stock Reservation Bucket")
+        verbose_name_plural = _("Stock Reservation Buckets")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("organization_id", "company", "item_code", "warehouse"),
+                name="uniq_reservation_bucket",
+            ),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - debug aid
+        return f"{self.company} · {self.item_code}@{self.warehouse}"
+
+
+class StockReservation(models.Model):
+    """Stock held by one fulfillment order between the availability check and the DN submit."""
+
+    STATUS_ACTIVE = "active"
+    STATUS_COMMITTED = "committed"
+    STATUS_RELEASED = "released"
+    STATUS_CHOICES = (
+        (STATUS_ACTIVE, "Active"),
+        (STATUS_COMMITTED, "Committed"),
+        (STATUS_RELEASED, "Released"),
+    )
+
+    bucket = models.ForeignKey(StockReservationBucket, related_name="reservations", on_delete=models.CASCADE)
+    reference = models.CharField(max_length=64, help_text=_("FulfillmentOrder id holding the stock."))
+    quantity = models.DecimalField(max_digits=18, decimal_places=6)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Stock Reservation")
+        verbose_name_plural = _("Stock Reservations")
+        constraints = [
+            models.UniqueConstraint(fields=("bucket", "reference"), name="uniq_reservation_per_order"),
+        ]
+        indexes = [
+            models.Index(fields=("reference", "status"), name="idx_reservation_ref_status"),
+            models.Index(fields=("status", "expires_at"), name="idx_reservation_expiry"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - debug aid
+        return f"{self.reference} · {self.quantity} ({self.status})"
+
+
+class StatusPropagation(models.Model):
+    """Outbox row: a field update owed to a seller's ERPNext document, delivered by a separate consumer."""
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    organization_id = models.UUIDField(verbose_name=_("Organization ID"))
+    company = models.CharField(max_length=140, verbose_name=_("Company"), help_text=_("Seller company that owns the document."))
+    doctype = models.CharField(max_length=140)
+    docname = models.CharField(max_length=140)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    enqueued_at = models.DateTimeField()
+    next_attempt_at = models.DateTimeField()
+    sent_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Status Propagation")
+        verbose_name_plural = _("Status Propagations")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("organization_id", "company", "doctype", "docname"),
+                name="uniq_status_propagation",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=("status", "next_attempt_at"), name="idx_propagation_due"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - debug aid
+        return f"{self.company} · {self.doctype} {self.docname} ({self.status})"
+
+
+class BackorderLine(models.Model):
+    """Reverse index of waiting_stock orders: which (company, item, warehouse) each one is waiting for."""
+
+    fulfillment_order = models.ForeignKey(
+        "integrations.FulfillmentOrder",
+        related_name="backorder_lines",
+        on_delete=models.CASCADE,
+    )
+    organization_id = models.UUIDField(verbose_name=_("Organization ID"))
+    company = models.CharField(max_length=140, verbose_name=_("Company"), help_text=_("Distributor company."))
+    item_code = models.CharField(max_length=140)
+    warehouse = models.CharField(max_length=140)
+    quantity = models.DecimalField(max_digits=18, decimal_places=6, help_text=_("Quantity the order requires."))
+    waiting_since = models.DateTimeField(help_text=_("Order creation time; wake-ups go oldest first."))
+
+    class Meta:
+        verbose_name = _("Backorder Line")
+        verbose_name_plural = _("Backorder Lines")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("fulfillment_order", "item_code", "warehouse"),
+                name="uniq_backorder_line",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=("organization_id", "company", "item_code", "warehouse", "waiting_since"),
+                name="idx_backorder_bin",
+            ),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - debug aid
+        return f"{self.company} · {self.item_code}@{self.warehouse}: {self.quantity} ({self.fulfillment_order_id})"
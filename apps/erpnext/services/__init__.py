@@ -1,4 +1,5 @@
 """Service layer for the ERPNext app."""
-from .client import ERPNextClient, ERPNextClientError
+from .async_client import AsyncERPNextClient
+from .client import ERPNextClient, ERPNextClientError, get_client
 
-__all__ = ["ERPNextClient", "ERPNextClientError"]
+__all__ = ["AsyncERPNextClient", "ERPNextClient", "ERPNextClientError", "get_client"]
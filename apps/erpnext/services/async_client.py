@@ -0,0 +1,365 @@
+"""Asyncio counterpart of ERPNextClient built on httpx."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import logging
+import time
+from urllib.parse import urljoin
+
+import httpx
+from django.conf import settings
+
+from apps.integrations.concurrency import downstream_semaphore, http2_available
+
+from .cache import ResourceCache, get_resource_cache
+from .client import STOCK_DOCTYPES, ERPNextClient, ERPNextClientError
+from .ratelimit import AdaptiveRateLimiter, RateLimitExceeded, get_rate_limiter
+from .retry import RAISE, RETRY, RETURN, RetryPolicy, RetryState
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncERPNextClient:
+    """Non-blocking ERPNext client with pooled connections and bounded concurrency.
+
+    Use it as ``async with AsyncERPNextClient(credential) as client`` and
+    ``asyncio.gather`` independent calls; at most ``max_concurrency`` requests
+    per ERPNext site are in flight at once. The rate limiter and the resource
+    cache are the same ones the sync client uses for the site.
+    """
+
+    def __init__(
+        self,
+        credential,
+        *,
+        http2: bool | None = None,
+        max_concurrency: int | None = None,
+        client: httpx.AsyncClient | None = None,
+        retry_policy: RetryPolicy | None = None,
+        resource_cache: ResourceCache | None = None,
+        rate_limiter: AdaptiveRateLimiter | None = None,
+    ):
+        self.base_url = str(credential.erpnext_url).rstrip("/") + "/"
+        self.api_key = str(credential.api_key)
+        self.api_secret = str(credential.api_secret)
+        self.max_concurrency = max_concurrency or getattr(settings, "ERPNEXT_MAX_CONCURRENCY", 10)
+        self.retry_policy = retry_policy or RetryPolicy.from_settings()
+        if resource_cache is None and getattr(settings, "ERPNEXT_CACHE_ENABLED", True):
+            resource_cache = get_resource_cache()
+        self.cache = resource_cache
+        if rate_limiter is None and getattr(settings, "ERPNEXT_RATE_LIMIT_ENABLED", True):
+            rate_limiter = get_rate_limiter(self.base_url)
+        self.rate_limiter = rate_limiter
+        self._submit_on_insert: bool | None = None
+        if http2 is None:
+            http2 = getattr(settings, "ERPNEXT_HTTP2", False)
+        if http2 and not http2_available():
+            logger.warning("HTTP/2 solicitado para ERPNext pero el paquete h2 no está instalado; usando HTTP/1.1.")
+            http2 = False
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=getattr(settings, "ERPNEXT_HTTP_POOL_MAXSIZE", 20),
+                max_keepalive_connections=getattr(settings, "ERPNEXT_HTTP_POOL_MAXSIZE", 20),
+            ),
+            timeout=getattr(settings, "REQUESTS_TIMEOUT", 15),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+
+    async def __aenter__(self) -> "AsyncERPNextClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
+
+    def _get_headers(self) -> dict:
+        return {
+            "Authorization": f"token {self.api_key}:{self.api_secret}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+
+    async def request(
+        self,
+        method: str,
+        endpoint: str,
+        *,
+        idempotent: bool | None = None,
+        idempotency_probe=None,
+        **kwargs,
+    ):
+        """Same retry semantics as ``ERPNextClient.request``; ``idempotency_probe`` is a coroutine function."""
+        method = method.upper()
+        full_url = urljoin(self.base_url, endpoint.lstrip("/"))
+        headers = self._get_headers()
+        semaphore = downstream_semaphore(self.base_url, self.max_concurrency)
+        state = RetryState(
+            self.retry_policy, method, endpoint, idempotent=idempotent, throttled=self.rate_limiter is not None
+        )
+        stats = state.stats
+        try:
+            while True:
+                state.begin()
+                if self.rate_limiter is not None:
+                    try:
+                        stats.throttle_wait_s += await self.rate_limiter.acquire_async()
+                    except RateLimitExceeded as e:
+                        raise ERPNextClientError(str(e), status_code=429, retryable=True, attempts=stats.attempts) from e
+                sent_at = time.monotonic()
+                try:
+                    async with semaphore:
+                        resp = await self.client.request(method, full_url, headers=headers, **kwargs)
+                except httpx.TransportError as e:
+                    await self._limiter_feedback(None, sent_at)
+                    outcome = state.transport_error(connect=isinstance(e, httpx.ConnectError | httpx.ConnectTimeout))
+                    error = ERPNextClientError(str(e) or e.__class__.__name__, retryable=True, attempts=stats.attempts)
+                    cause = e
+                except httpx.HTTPError as e:
+                    logger.error("ERPNext request error: %s", e)
+                    raise ERPNextClientError(str(e), attempts=stats.attempts) from e
+                else:
+                    outcome = state.response(resp.status_code, resp.headers)
+                    await self._limiter_feedback(resp.status_code, sent_at, outcome.retry_after)
+                    if outcome.action == RETURN:
+                        try:
+                            return resp.json()
+                        except ValueError as e:
+                            raise ERPNextClientError(
+                                f"Invalid JSON from ERPNext: {e}",
+                                status_code=resp.status_code,
+                                attempts=stats.attempts,
+                            ) from e
+                    error = ERPNextClientError.from_response(
+                        resp.status_code, resp.text, retryable=outcome.action == RETRY, attempts=stats.attempts
+                    )
+                    cause = None
+                    if outcome.action == RAISE:
+                        logger.error("ERPNext HTTP %s: %s", resp.status_code, resp.text)
+                        raise error
+
+                if state.must_probe(outcome, error, cause, can_probe=idempotency_probe is not None):
+                    existing = await idempotency_probe()
+                    if existing is not None:
+                        logger.info("ERPNext %s %s already applied; reusing existing document.", method, endpoint)
+                        stats.reused_existing = True
+                        return existing
+                await asyncio.sleep(state.next_delay(error, cause))
+        finally:
+            state.finish()
+
+    async def _limiter_feedback(self, status_code: int | None, sent_at: float, retry_after: float | None = None) -> None:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.feedback_async(
+                status_code=status_code,
+                latency=time.monotonic() - sent_at,
+                retry_after=retry_after,
+            )
+
+    # ---------- CACHÉ DE LECTURAS ----------
+    async def cached_get(self, doctype: str, endpoint: str, params: dict | None = None):
+        """GET through the shared resource cache (see ``ResourceCache.aget_or_fetch``)."""
+        fetch = functools.partial(self.request, "GET", endpoint, params=params)
+        if self.cache is None:
+            return await fetch()
+        key = ResourceCache.request_key(endpoint, params, self.api_key)
+        return await self.cache.aget_or_fetch(self.base_url, doctype, key, fetch)
+
+    def invalidate_cache(self, doctype: str) -> None:
+        if self.cache is not None:
+            self.cache.invalidate(self.base_url, doctype)
+
+    def _after_write(self, doctype: str, *, submitted: bool = False) -> None:
+        self.invalidate_cache(doctype)
+        if submitted and doctype in STOCK_DOCTYPES:
+            self.invalidate_cache("Bin")
+
+    # ---------- LISTADOS ----------
+    async def list_sales_orders(self, filters=None, fields=None, limit=50, offset=0) -> list:
+        params = {"limit_page_length": limit, "limit_start": offset}
+        if fields:
+            params["fields"] = json.dumps(fields)
+        if filters:
+            params["filters"] = json.dumps(filters)
+        data = await self.request("GET", "/api/resource/Sales Order", params=params)
+        if isinstance(data, dict) and "data" in data:
+            return data["data"]
+        raise ERPNextClientError("Invalid response format for list_sales_orders")
+
+    async def get_item(self, item_code: str, *, cache: bool = True) -> dict:
+        endpoint = f"/api/resource/Item/{item_code}"
+        response = await (self.cached_get("Item", endpoint) if cache else self.request("GET", endpoint))
+        if isinstance(response, dict) and "data" in response:
+            return response["data"]
+        raise ERPNextClientError("Invalid response format for get_item")
+
+    async def get_stock_levels(
+        self,
+        filters: list | None = None,
+        fields: list | None = None,
+        limit: int = 100,
+        offset: int = 0,
+        *,
+        cache: bool = False,
+    ) -> list:
+        endpoint = "/api/resource/Bin"
+        params = {"limit_page_length": limit, "limit_start": offset}
+        if fields:
+            params["fields"] = json.dumps(fields)
+        if filters:
+            params["filters"] = json.dumps(filters)
+        if cache:
+            response = await self.cached_get("Bin", endpoint, params)
+        else:
+            response = await self.request("GET", endpoint, params=params)
+        if isinstance(response, dict) and "data" in response:
+            return response["data"]
+        raise ERPNextClientError("Invalid response format for get_stock_levels")
+
+    async def get_doc(self, doctype: str, name: str, *, cache: bool = True) -> dict:
+        endpoint = f"/api/resource/{doctype.replace(' ', '%20')}/{name}"
+        response = await (self.cached_get(doctype, endpoint) if cache else self.request("GET", endpoint))
+        if isinstance(response, dict) and "data" in response:
+            return response["data"]
+        return response if isinstance(response, dict) else {"data": response}
+
+    async def update_doc(self, doctype: str, name: str, payload: dict) -> dict:
+        response = await self.request("PUT", f"/api/resource/{doctype.replace(' ', '%20')}/{name}", json=payload)
+        self._after_write(doctype, submitted=payload.get("docstatus") == 1)
+        if isinstance(response, dict):
+            return response.get("data") or response.get("message") or response
+        return response
+
+    async def list_serial_numbers(
+        self,
+        *,
+        item_code: str,
+        warehouse: str | None = None,
+        status: str = "Available",
+        limit: int = 100,
+        offset: int = 0,
+    ) -> list:
+        filters = [["item_code", "=", item_code]]
+        if status:
+            filters.append(["status", "=", status])
+        if warehouse:
+            filters.append(["warehouse", "=", warehouse])
+        params = {
+            "filters": json.dumps(filters),
+            "fields": json.dumps(["name", "serial_no", "warehouse", "status"]),
+            "limit_page_length": limit,
+            "limit_start": offset,
+        }
+        response = await self.request("GET", "/api/resource/Serial No", params=params)
+        if isinstance(response, dict) and "data" in response:
+            return response["data"]
+        raise ERPNextClientError("Invalid response format for list_serial_numbers")
+
+    # ---------- MAPPER SO -> SI ----------
+    async def map_sales_order_to_invoice(self, sales_order_name: str) -> dict:
+        endpoint = "/api/method/erpnext.selling.doctype.sales_order.sales_order.make_sales_invoice"
+        data = await self.request("POST", endpoint, json={"source_name": sales_order_name}, idempotent=True)
+        doc = data.get("message") or data.get("data")
+        if not isinstance(doc, dict):
+            raise ERPNextClientError("Mapper returned unexpected payload")
+        return doc
+
+    # ---------- INSERT / SUBMIT ----------
+    async def insert_doc(self, doctype: str, doc: dict, *, idempotency_filters: list | None = None) -> dict:
+        endpoint = f"/api/resource/{doctype.replace(' ', '%20')}"
+        if idempotency_filters is None:
+            idempotency_filters = ERPNextClient._default_idempotency_filters(doc)
+        probe = functools.partial(self._find_existing, doctype, idempotency_filters) if idempotency_filters else None
+        data = await self.request("POST", endpoint, json=doc, idempotency_probe=probe)
+        self._after_write(doctype, submitted=doc.get("docstatus") == 1)
+        return data.get("data") or data.get("message") or data
+
+    async def _find_existing(self, doctype: str, filters: list) -> dict | None:
+        params = {
+            "filters": json.dumps(filters),
+            "fields": json.dumps(["name", "docstatus"]),
+            "limit_page_length": 1,
+        }
+        data = await self.request("GET", f"/api/resource/{doctype.replace(' ', '%20')}", params=params)
+        rows = data.get("data") if isinstance(data, dict) else None
+        if rows:
+            return {"data": rows[0]}
+        return None
+
+    async def submit_doc(self, doctype: str, name: str) -> dict:
+        endpoint = f"/api/resource/{doctype.replace(' ', '%20')}/{name}"
+        try:
+            data = await self.request("PUT", endpoint, json={"docstatus": 1})
+        except ERPNextClientError as exc:
+            if exc.attempts > 1:
+                current = await self.get_doc(doctype, name, cache=False)
+                if isinstance(current, dict) and current.get("docstatus") == 1:
+                    self._after_write(doctype, submitted=True)
+                    return current
+            raise
+        self._after_write(doctype, submitted=True)
+        return data.get("data") or data.get("message") or data
+
+    async def delete_doc(self, doctype: str, name: str) -> None:
+        await self.request("DELETE", f"/api/resource/{doctype.replace(' ', '%20')}/{name}")
+        self._after_write(doctype)
+
+    async def insert_and_submit(self, doctype: str, doc: dict, *, idempotency_filters: list | None = None) -> dict:
+        """See ``ERPNextClient.insert_and_submit``."""
+        rejected = None
+        if self._submit_on_insert is not False:
+            try:
+                inserted = await self.insert_doc(doctype, {**doc, "docstatus": 1}, idempotency_filters=idempotency_filters)
+            except ERPNextClientError as exc:
+                if exc.status_code != 403 and not (exc.status_code == 417 and self._submit_on_insert is None):
+                    raise
+                rejected = exc.status_code
+                if rejected == 403:
+                    self._submit_on_insert = False
+            else:
+                self._submit_on_insert = True
+                if inserted.get("docstatus") == 1:
+                    return inserted
+                return await self._submit_or_discard(doctype, inserted.get("name"))
+
+        inserted = await self.insert_doc(doctype, doc, idempotency_filters=idempotency_filters)
+        if inserted.get("docstatus") == 1:
+            return inserted
+        submitted = await self._submit_or_discard(doctype, inserted.get("name"))
+        if rejected == 417:
+            self._submit_on_insert = False
+        return submitted
+
+    async def _submit_or_discard(self, doctype: str, name: str) -> dict:
+        try:
+            return await self.submit_doc(doctype, name)
+        except ERPNextClientError:
+            try:
+                await self.delete_doc(doctype, name)
+            except ERPNextClientError as exc:
+                logger.warning("No se pudo eliminar el borrador %s %s: %s", doctype, name, exc)
+            raise
+
+    async def create_and_submit_invoice_from_order(
+        self,
+        so_name: str,
+        *,
+        update_stock=False,
+        posting_date=None,
+        due_date=None,
+    ) -> dict:
+        si_doc = await self.map_sales_order_to_invoice(so_name)
+        si_doc.setdefault("update_stock", 1 if update_stock else 0)
+        if posting_date:
+            si_doc["set_posting_time"] = 1
+            si_doc["posting_date"] = posting_date
+        if due_date:
+            si_doc["due_date"] = due_date
+        return await self.insert_and_submit("Sales Invoice", si_doc)
@@ -0,0 +1,273 @@
+"""Reverse index of waiting_stock orders and their stock-driven wake-up."""
+
+from __future__ import annotations
+
+import logging
+import operator
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.erpnext.models import BackorderLine, InventoryLevel
+from apps.integrations.exceptions import FulfillmentConfigurationError, FulfillmentError
+from apps.integrations.models import FulfillmentOrder
+from apps.organizations.models import Organization
+
+from .client import ERPNextClientError
+from .inventory import stock_increased
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, Optional[str]]
+
+
+def _enabled() -> bool:
+    return getattr(settings, "ERPNEXT_BACKORDER_WAKEUP_ENABLED", True)
+
+
+def index_backorder(fulfillment_order: FulfillmentOrder, shortages: Dict[Key, Decimal]) -> None:
+    """Replace the index rows of ``fulfillment_order`` with the (item, warehouse) lines it waits for."""
+    if not _enabled():
+        return
+    lines = [
+        BackorderLine(
+            fulfillment_order=fulfillment_order,
+            organization_id=fulfillment_order.organization_id,
+            company=fulfillment_order.distributor_company,
+            item_code=item_code,
+            warehouse=warehouse,
+            quantity=quantity,
+            waiting_since=fulfillment_order.created_at or timezone.now(),
+        )
+        for (item_code, warehouse), quantity in shortages.items()
+        # Sin almacén no hay Bin que avise: esas líneas quedan para el reintento periódico.
+        if item_code and warehouse
+    ]
+    with transaction.atomic():
+        BackorderLine.objects.filter(fulfillment_order=fulfillment_order).delete()
+        BackorderLine.objects.bulk_create(lines)
+
+
+def clear_backorder_index(fulfillment_order_ids: Iterable) -> int:
+    """The orders left waiting_stock: drop their index rows."""
+    ids = list(fulfillment_order_ids)
+    if not ids:
+        return 0
+    return BackorderLine.objects.filter(fulfillment_order_id__in=ids).delete()[0]
+
+
+def wake_backorders(organization_id, company: str, levels: Dict[Key, Decimal], *, now=None) -> List:
+    """Make due the waiting orders the new stock can cover, oldest first; returns their ids.
+
+    ``levels`` holds the new ``actual_qty`` of the Bins that went up. Only
+    orders indexed on one of those Bins are considered; each is woken when all
+    of its lines fit in what is left after the older orders woken before it.
+    """
+    keys = [key for key, qty in levels.items() if key[1] and qty > 0]
+    if not keys:
+        return []
+    waiting = BackorderLine.objects.filter(
+        organization_id=organization_id,
+        company=company,
+        fulfillment_order__status=FulfillmentOrder.STATUS_WAITING_STOCK,
+    )
+    candidates = set(
+        waiting.filter(reduce(operator.or_, (Q(item_code=item, warehouse=warehouse) for item, warehouse in keys)))
+        .values_list("fulfillment_order_id", flat=True)
+    )
+    if not candidates:
+        return []
+    lines = list(
+        waiting.filter(fulfillment_order_id__in=candidates).order_by("waiting_since", "fulfillment_order_id")
+    )
+
+    budget: Dict[Key, Decimal] = {key: Decimal(str(levels[key])) for key in keys}
+    # Las demás líneas de esos pedidos están en Bins que no cambiaron: su nivel sale del espejo.
+    unchanged = {(line.item_code, line.warehouse) for line in lines} - set(budget)
+    if unchanged:
+        for level in InventoryLevel.objects.filter(
+            organization_id=organization_id,
+            company=company,
+            item_code__in={item for item, _ in unchanged},
+            warehouse__in={warehouse for _, warehouse in unchanged},
+        ):
+            key = (level.item_code, level.warehouse)
+            if key in unchanged:
+                budget[key] = level.actual_qty
+
+    per_order = _lines_by_order(lines)
+    woken = _admit(per_order, budget)
+    if woken:
+        now = now or timezone.now()
+        # En vuelo: el barrido no los toma salvo que la corrida encolada no llegue a procesarlos.
+        FulfillmentOrder.objects.filter(pk__in=woken, status=FulfillmentOrder.STATUS_WAITING_STOCK).update(
+            next_attempt_at=_lease(now), updated_at=now
+        )
+        logger.info(
+            "Backorders %s/%s: %s de %s pedidos despertados por entrada de stock",
+            organization_id,
+            company,
+            len(woken),
+            len(per_order),
+        )
+    return woken
+
+
+def sweep_backorders(*, limit: int = 500, now=None) -> Dict[str, int]:
+    """Periodic retry of due waiting_stock orders with one stock query per distributor.
+
+    Due orders are claimed in a batch, their indexed (item, warehouse) lines
+    are deduplicated per distributor and checked together; the orders that now
+    fit (oldest first) go to ``bulk_fulfill_distributor_task`` and the rest
+    are pushed forward by the organization's backorder retry delay.
+    """
+    now = now or timezone.now()
+    batch = _claim(limit, now)
+    stats = {"claimed": len(batch), "requeued": 0, "deferred": 0, "stock_queries": 0}
+    if not batch:
+        return stats
+
+    by_distributor: Dict[Tuple, List[FulfillmentOrder]] = {}
+    for fulfillment_order in batch:
+        by_distributor.setdefault(
+            (fulfillment_order.organization_id, fulfillment_order.distributor_company), []
+        ).append(fulfillment_order)
+    lines = BackorderLine.objects.filter(fulfillment_order_id__in=[order.pk for order in batch]).order_by(
+        "waiting_since", "fulfillment_order_id"
+    )
+    per_order = _lines_by_order(lines)
+
+    for (organization_id, company), orders in by_distributor.items():
+        ready, deferred = _sweep_distributor(organization_id, company, orders, per_order, stats)
+        if ready:
+            _requeue(organization_id, company, ready)
+        if deferred:
+            _defer(organization_id, deferred, now)
+        stats["requeued"] += len(ready)
+        stats["deferred"] += len(deferred)
+
+    logger.info(
+        "Barrido de backorders: %s reclamados, %s reencolados, %s pospuestos, %s consultas de stock",
+        stats["claimed"],
+        stats["requeued"],
+        stats["deferred"],
+        stats["stock_queries"],
+    )
+    return stats
+
+
+@receiver(stock_increased, dispatch_uid="erpnext_backorder_wakeup")
+def _wake_on_stock_increase(sender, organization_id, company, levels, **kwargs) -> None:
+    if not _enabled():
+        return
+    woken = wake_backorders(organization_id, company, levels)
+    if not woken:
+        return
+    from apps.erpnext.tasks import bulk_fulfill_distributor_task
+
+    try:
+        bulk_fulfill_distributor_task.delay(str(organization_id), company, order_ids=[str(pk) for pk in woken])
+    except Exception as exc:  # pragma: no cover - broker caído
+        # Vencido el lease, el barrido los vuelve a tomar.
+        logger.warning("No fue posible encolar los backorders despertados de %s: %s", company, exc)
+
+
+# ----------------------------------------------------------------------
+def _lines_by_order(lines: Iterable[BackorderLine]) -> Dict[object, List[BackorderLine]]:
+    """Index lines grouped per order, keeping the order of ``lines`` (oldest first)."""
+    per_order: Dict[object, List[BackorderLine]] = {}
+    for line in lines:
+        per_order.setdefault(line.fulfillment_order_id, []).append(line)
+    return per_order
+
+
+def _admit(per_order: Dict[object, List[BackorderLine]], budget: Dict[Key, Decimal]) -> List:
+    """Orders whose lines all fit in ``budget``, oldest first; ``budget`` is consumed."""
+    admitted = []
+    for order_id, order_lines in per_order.items():
+        if any(budget.get((line.item_code, line.warehouse), 0) < line.quantity for line in order_lines):
+            continue
+        for line in order_lines:
+            budget[(line.item_code, line.warehouse)] -= line.quantity
+        admitted.append(order_id)
+    return admitted
+
+
+def _lease(now):
+    return now + timedelta(seconds=getattr(settings, "ERPNEXT_BACKORDER_SWEEP_INTERVAL", 60) * 5)
+
+
+def _claim(limit: int, now) -> List[FulfillmentOrder]:
+    with transaction.atomic():
+        batch = list(
+            FulfillmentOrder.objects.needing_retry()
+            .select_for_update(skip_locked=True)
+            .order_by("next_attempt_at", "created_at")[:limit]
+        )
+        if batch:
+            # Otro barrido no los vuelve a tomar mientras se evalúan o procesan.
+            FulfillmentOrder.objects.filter(pk__in=[order.pk for order in batch]).update(next_attempt_at=_lease(now))
+    return batch
+
+
+def _sweep_distributor(organization_id, company, orders, per_order, stats) -> Tuple[List, List]:
+    """Split ``orders`` of one distributor into (ready, deferred) after one stock query."""
+    from apps.erpnext.gateway.bulk import BulkFulfillmentEngine
+
+    indexed = {order.pk: per_order[order.pk] for order in orders if order.pk in per_order}
+    # Sin líneas indexadas (p. ej. sin almacén) no hay nada que consultar: que el motor decida.
+    unknown = [order.pk for order in orders if order.pk not in indexed]
+    if not indexed:
+        return unknown, []
+
+    required: Dict[Key, Decimal] = {}
+    for order_lines in indexed.values():
+        for line in order_lines:
+            key = (line.item_code, line.warehouse)
+            required[key] = required.get(key, Decimal("0")) + line.quantity
+
+    organization = Organization.objects.filter(id=organization_id).first()
+    try:
+        if organization is None:
+            raise FulfillmentConfigurationError(f"Organización {organization_id} no encontrada.")
+        engine = BulkFulfillmentEngine(organization, company)
+        available = engine.stock.available_for(required)
+    except (FulfillmentError, ERPNextClientError) as exc:
+        logger.warning("Barrido de backorders %s/%s sin consulta de stock: %s", organization_id, company, exc)
+        return [], [order.pk for order in orders]
+    stats["stock_queries"] += 1
+
+    budget = {key: Decimal(str(available.get(key) or 0)) for key in required}
+    ready = _admit(indexed, budget)
+    deferred = [pk for pk in indexed if pk not in set(ready)]
+    return ready + unknown, deferred
+
+
+def _requeue(organization_id, company: str, order_ids: List) -> None:
+    # Conservan el lease del claim: si la tarea no llega a correr, vuelven a vencer.
+    from apps.erpnext.tasks import bulk_fulfill_distributor_task
+
+    bulk_fulfill_distributor_task.delay(str(organization_id), company, order_ids=[str(pk) for pk in order_ids])
+
+
+def _defer(organization_id, order_ids: List, now) -> None:
+    from apps.erpnext.gateway.exceptions import GatewayConfigurationError
+    from apps.erpnext.gateway.settings import GatewaySettings
+
+    organization = Organization.objects.filter(id=organization_id).first()
+    delay = 900
+    if organization is not None:
+        try:
+            delay = GatewaySettings.for_organization(organization).backorder_retry_seconds
+        except GatewayConfigurationError:
+            pass
+    FulfillmentOrder.objects.filter(pk__in=order_ids, status=FulfillmentOrder.STATUS_WAITING_STOCK).update(
+        next_attempt_at=now + timedelta(seconds=delay), updated_at=now
+    )
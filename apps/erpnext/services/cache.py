@@ -0,0 +1,318 @@
+"""Two-tier (in-process LRU + Redis) cache for ERPNext GET resources."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Master data changes rarely; Bin is stock and must stay short-lived.
+DEFAULT_TTLS = {
+    "Item": 3600,
+    "Item Price": 600,
+    "Warehouse": 3600,
+    "Customer": 600,
+    "Bin": 10,
+}
+# Stock is never served past its TTL: a stale Bin is exactly the read that oversells.
+NO_STALE_DOCTYPES = frozenset({"Bin"})
+SHARED_BACKOFF_SECONDS = 30.0
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    stored_at: float
+    modified: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {"value": self.value, "stored_at": self.stored_at, "modified": self.modified}
+
+
+class ResourceCache:
+    """Per-doctype TTL cache with stale-while-revalidate.
+
+    Lookups go local LRU -> Redis -> ERPNext. An entry older than its TTL but
+    within ``stale_seconds`` (never for Bin) is served as-is while a background refresh runs;
+    documents carrying ``modified`` are revalidated with a one-field query and
+    only re-downloaded when that timestamp changed. ``invalidate(doctype)``
+    bumps a per-site generation so every cached read of the doctype misses.
+    """
+
+    def __init__(
+        self,
+        *,
+        shared=None,
+        ttls: Optional[Dict[str, int]] = None,
+        stale_seconds: int = 300,
+        max_entries: int = 2048,
+        generation_ttl: float = 2.0,
+    ) -> None:
+        self.shared = shared
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.generation_ttl = generation_ttl
+        self._local: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._generations: Dict[str, tuple] = {}
+        self._refreshing: set = set()
+        self._shared_down_until = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="erpnext-cache")
+        self.counters = {
+            "local_hits": 0,
+            "shared_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "revalidated_unchanged": 0,
+            "refreshed": 0,
+            "invalidations": 0,
+            "shared_errors": 0,
+        }
+
+    @classmethod
+    def from_settings(cls) -> "ResourceCache":
+        shared = None
+        alias = getattr(settings, "ERPNEXT_CACHE_ALIAS", "default")
+        if alias:
+            from django.core.cache import caches
+
+            shared = caches[alias]
+        return cls(
+            shared=shared,
+            ttls=getattr(settings, "ERPNEXT_CACHE_TTLS", None),
+            stale_seconds=getattr(settings, "ERPNEXT_CACHE_STALE_SECONDS", 300),
+            max_entries=getattr(settings, "ERPNEXT_CACHE_MAX_ENTRIES", 2048),
+        )
+
+    # ------------------------------------------------------------------
+    def ttl_for(self, doctype: str) -> int:
+        return int(self.ttls.get(doctype, self.ttls.get("*", 0)) or 0)
+
+    def stale_for(self, doctype: str) -> int:
+        return 0 if doctype in NO_STALE_DOCTYPES else self.stale_seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            counters["local_entries"] = len(self._local)
+        lookups = counters["local_hits"] + counters["shared_hits"] + counters["stale_hits"] + counters["misses"]
+        counters["hit_ratio"] = round((lookups - counters["misses"]) / lookups, 3) if lookups else 0.0
+        return counters
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def site_key(base_url: str) -> str:
+        return hashlib.sha1(base_url.rstrip("/").lower().encode()).hexdigest()[:12]
+
+    @staticmethod
+    def request_key(endpoint: str, params: Optional[dict] = None, api_key: str = "") -> str:
+        """Normalised endpoint + params (order-independent); the API key is part of it, as in ``flight_key``."""
+        normalized = json.dumps(params or {}, sort_keys=True, default=str)
+        return hashlib.sha1(f"{api_key}|{endpoint}?{normalized}".encode()).hexdigest()
+
+    # ------------------------------------------------------------------
+    def get_or_fetch(
+        self,
+        base_url: str,
+        doctype: str,
+        key: str,
+        fetch: Callable[[], Any],
+        *,
+        current_modified: Optional[Callable[[], Optional[str]]] = None,
+    ) -> Any:
+        ttl = self.ttl_for(doctype)
+        if ttl <= 0:
+            return fetch()
+
+        full_key = self._full_key(base_url, doctype, key)
+        entry, tier = self._lookup(full_key)
+        if entry is not None:
+            age = time.time() - entry.stored_at
+            if age < ttl:
+                self._count(f"{tier}_hits")
+                return entry.value
+            if age < ttl + self.stale_for(doctype):
+                self._count("stale_hits")
+                self._schedule_refresh(full_key, entry, ttl + self.stale_for(doctype), fetch, current_modified)
+                return entry.value
+
+        self._count("misses")
+        value = fetch()
+        self._store(full_key, CacheEntry(value, time.time(), _modified_of(value)), ttl + self.stale_for(doctype))
+        return value
+
+    async def aget_or_fetch(self, base_url: str, doctype: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """``get_or_fetch`` for the async client; tier lookups run off the loop.
+
+        There is no background revalidation here: an expired entry is fetched
+        again in line.
+        """
+        ttl = self.ttl_for(doctype)
+        if ttl <= 0:
+            return await fetch()
+
+        full_key = await asyncio.to_thread(self._full_key, base_url, doctype, key)
+        entry, tier = await asyncio.to_thread(self._lookup, full_key)
+        if entry is not None and time.time() - entry.stored_at < ttl:
+            self._count(f"{tier}_hits")
+            return entry.value
+
+        self._count("misses")
+        value = await fetch()
+        entry = CacheEntry(value, time.time(), _modified_of(value))
+        await asyncio.to_thread(self._store, full_key, entry, ttl + self.stale_for(doctype))
+        return value
+
+    def invalidate(self, base_url: str, doctype: str) -> None:
+        """Drop every cached read of ``doctype`` for the site (all processes within ``generation_ttl``)."""
+        gen_key = self._generation_key(base_url, doctype)
+        generation = time.time_ns()
+        if self.shared is not None:
+            try:
+                self.shared.set(gen_key, generation, timeout=None)
+            except Exception as exc:  # Redis caído: el tier local sigue funcionando
+                self._shared_error(exc)
+        with self._lock:
+            self._generations[gen_key] = (generation, time.monotonic())
+            prefix = f"erpnext:{self.site_key(base_url)}:{doctype}:"
+            for stale_key in [k for k in self._local if k.startswith(prefix)]:
+                del self._local[stale_key]
+            self.counters["invalidations"] += 1
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+            self._generations.clear()
+
+    # ------------------------------------------------------------------
+    def _generation_key(self, base_url: str, doctype: str) -> str:
+        return f"erpnext:{self.site_key(base_url)}:gen:{doctype}"
+
+    def _generation(self, base_url: str, doctype: str):
+        gen_key = self._generation_key(base_url, doctype)
+        with self._lock:
+            cached = self._generations.get(gen_key)
+        if cached and time.monotonic() - cached[1] < self.generation_ttl:
+            return cached[0]
+        generation = cached[0] if cached else 0
+        if self._shared_available():
+            try:
+                generation = self.shared.get(gen_key) or 0
+            except Exception as exc:
+                self._shared_error(exc)
+        with self._lock:
+            self._generations[gen_key] = (generation, time.monotonic())
+        return generation
+
+    def _full_key(self, base_url: str, doctype: str, key: str) -> str:
+        generation = self._generation(base_url, doctype)
+        return f"erpnext:{self.site_key(base_url)}:{doctype}:{generation}:{key}"
+
+    def _lookup(self, full_key: str):
+        with self._lock:
+            entry = self._local.get(full_key)
+            if entry is not None:
+                self._local.move_to_end(full_key)
+                return entry, "local"
+        if not self._shared_available():
+            return None, None
+        try:
+            raw = self.shared.get(full_key)
+        except Exception as exc:
+            self._shared_error(exc)
+            return None, None
+        if not raw:
+            return None, None
+        entry = CacheEntry(**raw)
+        self._store_local(full_key, entry)
+        return entry, "shared"
+
+    def _store(self, full_key: str, entry: CacheEntry, timeout: int) -> None:
+        self._store_local(full_key, entry)
+        if not self._shared_available():
+            return
+        try:
+            self.shared.set(full_key, entry.as_dict(), timeout=timeout)
+        except Exception as exc:
+            self._shared_error(exc)
+
+    def _store_local(self, full_key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._local[full_key] = entry
+            self._local.move_to_end(full_key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _schedule_refresh(self, full_key, entry, timeout, fetch, current_modified) -> None:
+        with self._lock:
+            if full_key in self._refreshing:
+                return
+            self._refreshing.add(full_key)
+
+        def refresh():
+            try:
+                if entry.modified and current_modified is not None and current_modified() == entry.modified:
+                    self._store(full_key, CacheEntry(entry.value, time.time(), entry.modified), timeout)
+                    self._count("revalidated_unchanged")
+                    return
+                value = fetch()
+                self._store(full_key, CacheEntry(value, time.time(), _modified_of(value)), timeout)
+                self._count("refreshed")
+            except Exception:
+                logger.warning("Revalidación de caché ERPNext fallida para %s", full_key, exc_info=True)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(full_key)
+
+        self._executor.submit(refresh)
+
+    def _shared_available(self) -> bool:
+        return self.shared is not None and time.monotonic() >= self._shared_down_until
+
+    def _shared_error(self, exc: Exception) -> None:
+        # Sin Redis se sigue con el tier local; se reintenta pasado SHARED_BACKOFF_SECONDS.
+        self._shared_down_until = time.monotonic() + SHARED_BACKOFF_SECONDS
+        self._count("shared_errors")
+        logger.warning("Tier Redis de caché ERPNext no disponible: %s", exc)
+
+
+def _modified_of(value: Any) -> Optional[str]:
+    if isinstance(value, dict) and isinstance(value.get("data"), dict):
+        value = value["data"]
+    if isinstance(value, dict) and value.get("modified"):
+        return str(value["modified"])
+    return None
+
+
+_default_cache: Optional[ResourceCache] = None
+_default_lock = threading.Lock()
+
+
+def get_resource_cache() -> ResourceCache:
+    """Process-wide cache shared by every ERPNextClient."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = ResourceCache.from_settings()
+    return _default_cache
+
+
+def invalidate_resource(erpnext_url: str, doctype: str) -> None:
+    """Invalidation hook for webhooks/handlers that learn a doctype changed in ERPNext."""
+    get_resource_cache().invalidate(str(erpnext_url).rstrip("/") + "/", doctype)
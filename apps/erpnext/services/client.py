@@ -1,21 +1,71 @@
 # services.py (o donde tengas ERPNextClient)
+import hashlib
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 from urllib.parse import urljoin
 import requests
 from django.conf import settings
 
+from .cache import ResourceCache, get_resource_cache
+from .ratelimit import AdaptiveRateLimiter, RateLimitExceeded, get_rate_limiter
+from .retry import RAISE, RETRY, RETURN, RetryPolicy, RetryState
+from .sessions import get_session
+from .singleflight import flight_key, get_single_flight
+
 logger = logging.getLogger(__name__)
 
+# Submitting these moves stock, so cached Bin reads are dropped.
+STOCK_DOCTYPES = frozenset({"Delivery Note", "Stock Entry", "Purchase Receipt", "Sales Invoice", "Stock Reconciliation"})
+
 class ERPNextClientError(Exception):
-    pass
+    def __init__(
+        self,
+        message: str,
+        *,
+        status_code: int | None = None,
+        retryable: bool = False,
+        attempts: int = 1,
+    ) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.attempts = attempts
+
+    @classmethod
+    def from_response(cls, status_code: int, text: str, *, retryable: bool, attempts: int) -> "ERPNextClientError":
+        return cls(f"HTTP {status_code}: {text}", status_code=status_code, retryable=retryable, attempts=attempts)
 
 class ERPNextClient:
-    def __init__(self, credential):
+    def __init__(
+        self,
+        credential,
+        session: requests.Session | None = None,
+        retry_policy: RetryPolicy | None = None,
+        resource_cache: ResourceCache | None = None,
+        rate_limiter: AdaptiveRateLimiter | None = None,
+    ):
         # ... igual que el tuyo ...
         self.base_url = str(credential.erpnext_url).rstrip("/") + "/"
         self.api_key = str(credential.api_key)
         self.api_secret = str(credential.api_secret)
+        # Keep-alive session shared by every client pointing at the same site.
+        self.session = session or get_session(self.base_url)
+        self.retry_policy = retry_policy or RetryPolicy.from_settings()
+        if resource_cache is None and getattr(settings, "ERPNEXT_CACHE_ENABLED", True):
+            resource_cache = get_resource_cache()
+        self.cache = resource_cache
+        self.coalesce_reads = getattr(settings, "ERPNEXT_SINGLEFLIGHT_ENABLED", True)
+        if rate_limiter is None and getattr(settings, "ERPNEXT_RATE_LIMIT_ENABLED", True):
+            rate_limiter = get_rate_limiter(self.base_url)
+        self.rate_limiter = rate_limiter
+        # Capabilities learnt from the site (None = not probed yet).
+        self._submit_on_insert: bool | None = None
+        self._bulk_update: bool | None = None
 
     def _get_headers(self) -> dict:
         return {
@@ -24,25 +74,107 @@ class ERPNextClient:
             "Accept": "application/json",
         }
 
-    def request(self, method: str, endpoint: str, **kwargs):
+    def request(
+        self,
+        method: str,
+        endpoint: str,
+        *,
+        idempotent: bool | None = None,
+        idempotency_probe=None,
+        **kwargs,
+    ):
+        """Perform a request; identical concurrent GETs share one HTTP call (see ``singleflight``)."""
+        if method.upper() == "GET" and self.coalesce_reads:
+            key = flight_key(self.base_url, self.api_key, endpoint, kwargs.get("params"))
+            return get_single_flight().do(key, lambda: self._send(method, endpoint, idempotent=idempotent, **kwargs))
+        return self._send(method, endpoint, idempotent=idempotent, idempotency_probe=idempotency_probe, **kwargs)
+
+    def _send(
+        self,
+        method: str,
+        endpoint: str,
+        *,
+        idempotent: bool | None = None,
+        idempotency_probe=None,
+        **kwargs,
+    ):
+        """Perform a request, retrying transient failures (429/5xx, resets).
+
+        GET/PUT/DELETE are retried automatically. Other methods are retried only
+        when ``idempotent=True`` or, for failures the server may have processed,
+        after ``idempotency_probe()`` confirms nothing was created; a probe that
+        returns a response short-circuits the retry and that response is used.
+        """
+        method = method.upper()
         full_url = urljoin(self.base_url, endpoint.lstrip("/"))
         headers = self._get_headers()
+        state = RetryState(
+            self.retry_policy, method, endpoint, idempotent=idempotent, throttled=self.rate_limiter is not None
+        )
+        stats = state.stats
         try:
-            resp = requests.request(
-                method,
-                full_url,
-                headers=headers,
-                timeout=getattr(settings, "REQUESTS_TIMEOUT", 15),
-                **kwargs,
+            while True:
+                state.begin()
+                if self.rate_limiter is not None:
+                    try:
+                        stats.throttle_wait_s += self.rate_limiter.acquire()
+                    except RateLimitExceeded as e:
+                        # Cola demasiado larga: que el llamador reprograme en vez de insistir.
+                        raise ERPNextClientError(str(e), status_code=429, retryable=True, attempts=stats.attempts) from e
+                sent_at = time.monotonic()
+                try:
+                    resp = self.session.request(
+                        method,
+                        full_url,
+                        headers=headers,
+                        timeout=getattr(settings, "REQUESTS_TIMEOUT", 15),
+                        **kwargs,
+                    )
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    self._limiter_feedback(None, sent_at)
+                    outcome = state.transport_error(connect=isinstance(e, requests.exceptions.ConnectTimeout))
+                    error = ERPNextClientError(str(e), retryable=True, attempts=stats.attempts)
+                    cause = e
+                except requests.exceptions.RequestException as e:
+                    logger.error("ERPNext request error: %s", e)
+                    raise ERPNextClientError(str(e), attempts=stats.attempts) from e
+                else:
+                    outcome = state.response(resp.status_code, resp.headers)
+                    self._limiter_feedback(resp.status_code, sent_at, outcome.retry_after)
+                    if outcome.action == RETURN:
+                        try:
+                            return resp.json()
+                        except ValueError as e:
+                            raise ERPNextClientError(
+                                f"Invalid JSON from ERPNext: {e}",
+                                status_code=resp.status_code,
+                                attempts=stats.attempts,
+                            ) from e
+                    error = ERPNextClientError.from_response(
+                        resp.status_code, resp.text, retryable=outcome.action == RETRY, attempts=stats.attempts
+                    )
+                    cause = None
+                    if outcome.action == RAISE:
+                        logger.error("ERPNext HTTP %s: %s", resp.status_code, resp.text)
+                        raise error
+
+                if state.must_probe(outcome, error, cause, can_probe=idempotency_probe is not None):
+                    existing = idempotency_probe()
+                    if existing is not None:
+                        logger.info("ERPNext %s %s already applied; reusing existing document.", method, endpoint)
+                        stats.reused_existing = True
+                        return existing
+                time.sleep(state.next_delay(error, cause))
+        finally:
+            state.finish()
+
+    def _limiter_feedback(self, status_code: int | None, sent_at: float, retry_after: float | None = None) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.feedback(
+                status_code=status_code,
+                latency=time.monotonic() - sent_at,
+                retry_after=retry_after,
             )
-            resp.raise_for_status()
-            return resp.json()
-        except requests.exceptions.HTTPError as e:
-            logger.error("ERPNext HTTP %s: %s", e.response.status_code, e.response.text)
-            raise ERPNextClientError(f"HTTP {e.response.status_code}: {e.response.text}") from e
-        except requests.exceptions.RequestException as e:
-            logger.error("ERPNext request error: %s", e)
-            raise ERPNextClientError(str(e)) from e
 
     # ---------- LISTADOS ----------
     def list_sales_orders(self, filters=None, fields=None, limit=50, offset=0) -> list:
@@ -60,16 +192,122 @@ class ERPNextClient:
             return data["data"]
         raise ERPNextClientError("Invalid response format for list_sales_orders")
 
-    def get_item(self, item_code: str) -> dict:
+    def iter_resource(
+        self,
+        doctype: str,
+        filters: list | None = None,
+        fields: list | None = None,
+        page_size: int = 100,
+        *,
+        prefetch: bool = False,
+    ) -> Iterator[dict]:
+        """Yield every row of ``doctype`` paging by the (modified, name) keyset instead of limit_start.
+
+        Rows are ordered by ``modified asc, name asc``; each page asks for rows strictly after the
+        last one seen, so ERPNext never scans skipped offsets and rows that leave the result set
+        mid-read do not shift later pages. With ``prefetch=True`` the next page is requested in a
+        background thread while the caller consumes the current one.
+        """
+        endpoint = f"/api/resource/{doctype.replace(' ', '%20')}"
+        fields = list(fields or ["name"])
+        for key in ("name", "modified"):
+            if key not in fields:
+                fields.append(key)
+        base_params = {
+            "fields": json.dumps(fields),
+            "order_by": "modified asc, name asc",
+            "limit_page_length": page_size,
+        }
+
+        def fetch(cursor):
+            params = dict(base_params)
+            page_filters = list(filters or [])
+            if cursor is not None:
+                modified, name = cursor
+                # modified >= m AND (modified > m OR name > n)  ==  (modified, name) > (m, n)
+                page_filters.append(["modified", ">=", modified])
+                params["or_filters"] = json.dumps([["modified", ">", modified], ["name", ">", name]])
+            if page_filters:
+                params["filters"] = json.dumps(page_filters)
+            data = self.request("GET", endpoint, params=params)
+            if isinstance(data, dict) and "data" in data:
+                return data["data"]
+            raise ERPNextClientError(f"Invalid response format for iter_resource({doctype})")
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="erpnext-prefetch") if prefetch else None
+        try:
+            page = fetch(None)
+            while page:
+                pending = None
+                if len(page) >= page_size:
+                    cursor = (page[-1]["modified"], page[-1]["name"])
+                    if executor:
+                        pending = executor.submit(fetch, cursor)
+                yield from page
+                if len(page) < page_size:
+                    break
+                page = pending.result() if pending else fetch(cursor)
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    # ---------- CACHÉ DE LECTURAS ----------
+    def cached_get(self, doctype: str, endpoint: str, params: dict | None = None, *, name: str | None = None):
+        """GET through the resource cache (per-doctype TTL, stale-while-revalidate).
+
+        ``name`` identifies a single document so stale entries are revalidated
+        by comparing its ``modified`` timestamp before re-downloading it.
+        """
+        fetch = lambda: self.request("GET", endpoint, params=params)  # noqa: E731
+        if self.cache is None:
+            return fetch()
+        current_modified = None
+        if name:
+            current_modified = lambda: self._current_modified(doctype, name)  # noqa: E731
+        key = ResourceCache.request_key(endpoint, params, self.api_key)
+        return self.cache.get_or_fetch(self.base_url, doctype, key, fetch, current_modified=current_modified)
+
+    def _current_modified(self, doctype: str, name: str) -> str | None:
+        params = {
+            "filters": json.dumps([["name", "=", name]]),
+            "fields": json.dumps(["modified"]),
+            "limit_page_length": 1,
+        }
+        data = self.request("GET", f"/api/resource/{doctype.replace(' ', '%20')}", params=params)
+        rows = data.get("data") if isinstance(data, dict) else None
+        return str(rows[0].get("modified")) if rows else None
+
+    def invalidate_cache(self, doctype: str) -> None:
+        """Explicit invalidation hook: drop every cached read of ``doctype`` for this site."""
+        if self.cache is not None:
+            self.cache.invalidate(self.base_url, doctype)
+
+    def _after_write(self, doctype: str, *, submitted: bool = False) -> None:
+        self.invalidate_cache(doctype)
+        if submitted and doctype in STOCK_DOCTYPES:
+            self.invalidate_cache("Bin")
+
+    def get_item(self, item_code: str, *, cache: bool = True) -> dict:
         """Fetches a single Item document from ERPNext."""
         endpoint = f"/api/resource/Item/{item_code}"
-        response = self.request("GET", endpoint)
+        if cache:
+            response = self.cached_get("Item", endpoint, name=item_code)
+        else:
+            response = self.request("GET", endpoint)
         if isinstance(response, dict) and "data" in response:
             return response["data"]
         raise ERPNextClientError("Invalid response format for get_item")
 
-    def get_stock_levels(self, filters: list | None = None, fields: list | None = None, limit: int = 100, offset: int = 0) -> list:
-        """Fetches stock level data from the Bin doctype."""
+    def get_stock_levels(
+        self,
+        filters: list | None = None,
+        fields: list | None = None,
+        limit: int = 100,
+        offset: int = 0,
+        *,
+        cache: bool = False,
+    ) -> list:
+        """Fetches stock level data from the Bin doctype (uncached unless ``cache=True``)."""
         endpoint = "/api/resource/Bin"
         params = {
             "limit_page_length": limit,
@@ -80,15 +318,21 @@ class ERPNextClient:
         if filters:
             params["filters"] = json.dumps(filters)
 
-        response = self.request("GET", endpoint, params=params)
+        if cache:
+            response = self.cached_get("Bin", endpoint, params)
+        else:
+            response = self.request("GET", endpoint, params=params)
         if isinstance(response, dict) and "data" in response:
             return response["data"]
             raise ERPNextClientError("Invalid response format for get_stock_levels")
 
-    def get_doc(self, doctype: str, name: str) -> dict:
-        """Fetch a single document by doctype/name."""
+    def get_doc(self, doctype: str, name: str, *, cache: bool = True) -> dict:
+        """Fetch a single document by doctype/name (cached only for doctypes with a TTL)."""
         endpoint = f"/api/resource/{doctype.replace(' ', '%20')}/{name}"
-        response = self.request("GET", endpoint)
+        if cache:
+            response = self.cached_get(doctype, endpoint, name=name)
+        else:
+            response = self.request("GET", endpoint)
         if isinstance(response, dict) and "data" in response:
             return response["data"]
         return response if isinstance(response, dict) else {"data": response}
@@ -97,10 +341,49 @@ class ERPNextClient:
         """Update an existing document."""
         endpoint = f"/api/resource/{doctype.replace(' ', '%20')}/{name}"
         response = self.request("PUT", endpoint, json=payload)
+        self._after_write(doctype, submitted=payload.get("docstatus") == 1)
         if isinstance(response, dict):
             return response.get("data") or response.get("message") or response
         return response
 
+    def update_many(self, updates: list[dict]) -> list[tuple[str, str]]:
+        """Apply several updates with one ``frappe.client.bulk_update`` call; returns the (doctype, name) that failed.
+
+        Each update is ``{"doctype": ..., "docname": ..., <fields>}``. Falls back
+        to one ``update_doc`` per document when the method is unavailable.
+        """
+        if not updates:
+            return []
+        if self._bulk_update is not False:
+            try:
+                data = self.request(
+                    "POST", "/api/method/frappe.client.bulk_update", json={"docs": json.dumps(updates)}, idempotent=True
+                )
+            except ERPNextClientError as exc:
+                if exc.status_code not in (403, 404):
+                    raise
+                self._bulk_update = False
+                logger.info("frappe.client.bulk_update no disponible (%s); actualizando uno a uno.", exc.status_code)
+            else:
+                self._bulk_update = True
+                for doctype in {update["doctype"] for update in updates}:
+                    self._after_write(doctype)
+                message = data.get("message") if isinstance(data, dict) else None
+                failed_docs = (message or {}).get("failed_docs") if isinstance(message, dict) else None
+                return [
+                    (str((failed.get("doc") or {}).get("doctype")), str((failed.get("doc") or {}).get("docname")))
+                    for failed in failed_docs or []
+                ]
+        failed = []
+        for update in updates:
+            fields = {k: v for k, v in update.items() if k not in ("doctype", "docname")}
+            try:
+                self.update_doc(update["doctype"], update["docname"], fields)
+            except ERPNextClientError as exc:
+                logger.warning("No se pudo actualizar %s %s: %s", update["doctype"], update["docname"], exc)
+                failed.append((update["doctype"], update["docname"]))
+        return failed
+
     def list_serial_numbers(
         self,
         *,
@@ -133,7 +416,8 @@ class ERPNextClient:
         """Devuelve el doc de Sales Invoice (AÚN no guardado) mapeado desde una Sales Order."""
         endpoint = "/api/method/erpnext.selling.doctype.sales_order.sales_order.make_sales_invoice"
         payload = {"source_name": sales_order_name}
-        data = self.request("POST", endpoint, json=payload)
+        # The mapper only builds an unsaved document, so resending it is harmless.
+        data = self.request("POST", endpoint, json=payload, idempotent=True)
         # Respuesta típica: {"message": {...doc...}} ó {"data": {...}} según versión
         doc = data.get("message") or data.get("data")
         if not isinstance(doc, dict):
@@ -141,19 +425,117 @@ class ERPNextClient:
         return doc
 
     # ---------- INSERT / SUBMIT ----------
-    def insert_doc(self, doctype: str, doc: dict) -> dict:
-        """Inserta un documento (docstatus=0)."""
+    def insert_doc(self, doctype: str, doc: dict, *, idempotency_filters: list | None = None) -> dict:
+        """Inserta un documento (docstatus=0).
+
+        The POST is only retried after ``idempotency_filters`` (by default
+        ``custom_order_ref`` or ``name`` from ``doc``) find no document created by
+        the failed attempt; an existing match is returned instead.
+        """
         endpoint = f"/api/resource/{doctype.replace(' ', '%20')}"
-        data = self.request("POST", endpoint, json=doc)
+        if idempotency_filters is None:
+            idempotency_filters = self._default_idempotency_filters(doc)
+        probe = None
+        if idempotency_filters:
+            probe = lambda: self._find_existing(doctype, idempotency_filters)  # noqa: E731
+        data = self.request("POST", endpoint, json=doc, idempotency_probe=probe)
+        self._after_write(doctype, submitted=doc.get("docstatus") == 1)
         return data.get("data") or data.get("message") or data
 
+    @staticmethod
+    def _default_idempotency_filters(doc: dict) -> list | None:
+        if doc.get("custom_order_ref"):
+            return [["custom_order_ref", "=", doc["custom_order_ref"]], ["docstatus", "<", 2]]
+        if doc.get("name"):
+            return [["name", "=", doc["name"]]]
+        return None
+
+    def find_existing(self, doctype: str, filters: list) -> dict | None:
+        """First document matching ``filters`` as ``{"name", "docstatus"}``; ``None`` if there is none."""
+        found = self._find_existing(doctype, filters)
+        return found["data"] if found else None
+
+    def _find_existing(self, doctype: str, filters: list) -> dict | None:
+        endpoint = f"/api/resource/{doctype.replace(' ', '%20')}"
+        params = {
+            "filters": json.dumps(filters),
+            "fields": json.dumps(["name", "docstatus"]),
+            "limit_page_length": 1,
+        }
+        data = self.request("GET", endpoint, params=params)
+        rows = data.get("data") if isinstance(data, dict) else None
+        if rows:
+            return {"data": rows[0]}
+        return None
+
     def submit_doc(self, doctype: str, name: str) -> dict:
         """Submit de un documento existente (docstatus=1)."""
         endpoint = f"/api/resource/{doctype.replace(' ', '%20')}/{name}"
         payload = {"docstatus": 1}
-        data = self.request("PUT", endpoint, json=payload)
+        try:
+            data = self.request("PUT", endpoint, json=payload)
+        except ERPNextClientError as exc:
+            # A retried submit fails if the lost first attempt already went through.
+            if exc.attempts > 1:
+                current = self.get_doc(doctype, name, cache=False)
+                if isinstance(current, dict) and current.get("docstatus") == 1:
+                    self._after_write(doctype, submitted=True)
+                    return current
+            raise
+        self._after_write(doctype, submitted=True)
         return data.get("data") or data.get("message") or data
 
+    def delete_doc(self, doctype: str, name: str) -> None:
+        """Delete a document (ERPNext only deletes drafts and cancelled documents)."""
+        self.request("DELETE", f"/api/resource/{doctype.replace(' ', '%20')}/{name}")
+        self._after_write(doctype)
+
+    # ---------- COMPUESTAS: menos round trips ----------
+    def insert_and_submit(self, doctype: str, doc: dict, *, idempotency_filters: list | None = None) -> dict:
+        """Insert ``doc`` already submitted (``docstatus: 1``) in a single round trip.
+
+        Falls back to insert + submit when the site rejects submit-on-insert with a
+        403, or with a 417 while that capability is still unknown; once learnt, a 417
+        is a real validation error and is raised as is. If the fallback submit
+        fails, the draft it leaves behind is deleted.
+        """
+        rejected = None
+        if self._submit_on_insert is not False:
+            try:
+                inserted = self.insert_doc(doctype, {**doc, "docstatus": 1}, idempotency_filters=idempotency_filters)
+            except ERPNextClientError as exc:
+                if exc.status_code != 403 and not (exc.status_code == 417 and self._submit_on_insert is None):
+                    raise
+                rejected = exc.status_code
+                if rejected == 403:
+                    self._submit_on_insert = False
+                logger.info("Submit-on-insert de %s rechazado (%s); usando insert + submit.", doctype, exc.status_code)
+            else:
+                self._submit_on_insert = True
+                if inserted.get("docstatus") == 1:
+                    return inserted
+                return self._submit_or_discard(doctype, inserted.get("name"))
+
+        inserted = self.insert_doc(doctype, doc, idempotency_filters=idempotency_filters)
+        if inserted.get("docstatus") == 1:
+            return inserted
+        submitted = self._submit_or_discard(doctype, inserted.get("name"))
+        if rejected == 417:
+            # insert + submit pasó donde submit-on-insert dio 417: el sitio no lo admite.
+            self._submit_on_insert = False
+        return submitted
+
+    def _submit_or_discard(self, doctype: str, name: str) -> dict:
+        try:
+            return self.submit_doc(doctype, name)
+        except ERPNextClientError:
+            # Sin esto quedaría un borrador huérfano por cada intento fallido.
+            try:
+                self.delete_doc(doctype, name)
+            except ERPNextClientError as exc:
+                logger.warning("No se pudo eliminar el borrador %s %s: %s", doctype, name, exc)
+            raise
+
     # ---------- ATOMIC: crear y enviar SI desde SO ----------
     def create_and_submit_invoice_from_order(self, so_name: str, *, update_stock=False, posting_date=None, due_date=None) -> dict:
         # 1) Mapear
@@ -170,10 +552,32 @@ class ERPNextClient:
         # (opcional) asegurarte de no duplicar pagos automáticos del POS:
         # si_doc["is_pos"] = 0
 
-        # 3) Insertar (docstatus = 0)
-        inserted = self.insert_doc("Sales Invoice", si_doc)
-        name = inserted.get("name")
+        # 3) Insertar ya enviada (docstatus = 1); insert + submit si el sitio no lo permite
+        return self.insert_and_submit("Sales Invoice", si_doc)
 
-        # 4) Submit (docstatus = 1)
-        submitted = self.submit_doc("Sales Invoice", name)
-        return submitted
+
+_clients: "OrderedDict[tuple, ERPNextClient]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def get_client(credential) -> ERPNextClient:
+    """Return a cached ERPNextClient for ``credential``; edits to the credential (secret included) yield a new client."""
+    key = (
+        str(getattr(credential, "pk", "") or ""),
+        str(getattr(credential, "updated_at", "") or ""),
+        str(credential.erpnext_url),
+        str(credential.api_key),
+        # Un secreto rotado con queryset.update() no toca updated_at: el hash lo distingue.
+        hashlib.sha256(str(credential.api_secret).encode()).hexdigest(),
+    )
+    max_size = getattr(settings, "ERPNEXT_CLIENT_CACHE_SIZE", 256)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+        client = ERPNextClient(credential)
+        _clients[key] = client
+        while len(_clients) > max_size:
+            _clients.popitem(last=False)
+    return client
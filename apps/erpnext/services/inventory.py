@@ -0,0 +1,215 @@
+"""Local mirror of ERPNext Bins so fulfillment can check availability without a live call."""
+
+from __future__ import annotations
+
+import logging
+import operator
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.dispatch import Signal
+from django.utils import timezone
+
+from apps.erpnext.models import ERPNextCredential, InventoryLevel, InventorySyncState
+
+from .cache import invalidate_resource
+
+logger = logging.getLogger(__name__)
+
+BIN_FIELDS = ["name", "item_code", "warehouse", "actual_qty", "reserved_qty", "modified"]
+
+Key = Tuple[str, Optional[str]]
+
+# Sent after commit with ``organization_id``, ``company`` and ``levels``: (item, warehouse) -> new
+# actual_qty for the Bins whose stock went up.
+stock_increased = Signal()
+
+
+def _qty(value: Any) -> Decimal:
+    try:
+        return Decimal(str(value if value is not None else 0))
+    except (InvalidOperation, ValueError):
+        return Decimal("0")
+
+
+class InventoryMirror:
+    """Bins of one distributor company, kept current by ``sync`` and the Bin webhook.
+
+    ``available`` answers from the table while the last successful sync is
+    younger than ``max_age`` seconds and returns ``None`` otherwise, so callers
+    fall back to asking ERPNext.
+    """
+
+    def __init__(self, organization_id, company: str, *, max_age: Optional[int] = None) -> None:
+        self.organization_id = organization_id
+        self.company = company
+        self.max_age = max_age if max_age is not None else getattr(settings, "ERPNEXT_INVENTORY_MIRROR_MAX_AGE", 180)
+
+    @classmethod
+    def for_company(cls, organization_id, company: str) -> Optional["InventoryMirror"]:
+        if not company or not getattr(settings, "ERPNEXT_INVENTORY_MIRROR_ENABLED", True):
+            return None
+        return cls(organization_id, company)
+
+    # ------------------------------------------------------------------
+    # Lecturas
+    # ------------------------------------------------------------------
+    def is_fresh(self) -> bool:
+        synced_at = (
+            InventorySyncState.objects.filter(organization_id=self.organization_id, company=self.company)
+            .values_list("last_synced_at", flat=True)
+            .first()
+        )
+        return bool(synced_at) and timezone.now() - synced_at <= timedelta(seconds=self.max_age)
+
+    def available(self, keys: Iterable[Key]) -> Optional[Dict[Key, Decimal]]:
+        """``actual_qty`` per (item, warehouse); ``None`` when the mirror is stale."""
+        keys = list(keys)
+        if not self.is_fresh():
+            return None
+        rows = self._levels().filter(
+            item_code__in={item_code for item_code, _ in keys},
+            warehouse__in={warehouse for _, warehouse in keys if warehouse},
+        )
+        return {(row.item_code, row.warehouse): row.actual_qty for row in rows}
+
+    # ------------------------------------------------------------------
+    # Escrituras
+    # ------------------------------------------------------------------
+    def apply_bins(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Upsert Bin rows; a row never overwrites a newer ``modified`` already stored.
+
+        When something changed, cached Bin reads of the distributor's site are
+        invalidated after commit so they don't contradict the mirror.
+        """
+        incoming: Dict[Key, Dict[str, Any]] = {}
+        for row in rows:
+            if not row.get("item_code") or not row.get("warehouse"):
+                continue
+            key = (str(row["item_code"]), str(row["warehouse"]))
+            current = incoming.get(key)
+            if current is None or str(row.get("modified") or "") >= current["modified"]:
+                incoming[key] = {
+                    "actual_qty": _qty(row.get("actual_qty")),
+                    "reserved_qty": _qty(row.get("reserved_qty")),
+                    "modified": str(row.get("modified") or ""),
+                }
+        if not incoming:
+            return 0
+
+        with transaction.atomic():
+            existing = {
+                (level.item_code, level.warehouse): level
+                for level in self._levels()
+                .select_for_update()
+                .filter(
+                    item_code__in={item_code for item_code, _ in incoming},
+                    warehouse__in={warehouse for _, warehouse in incoming},
+                )
+            }
+            to_create: List[InventoryLevel] = []
+            to_update: List[InventoryLevel] = []
+            increased: Dict[Key, Decimal] = {}
+            for (item_code, warehouse), values in incoming.items():
+                level = existing.get((item_code, warehouse))
+                previous = level.actual_qty if level is not None else Decimal("0")
+                if values["actual_qty"] > previous and (level is None or values["modified"] >= level.modified):
+                    increased[(item_code, warehouse)] = values["actual_qty"]
+                if level is None:
+                    to_create.append(
+                        InventoryLevel(
+                            organization_id=self.organization_id,
+                            company=self.company,
+                            item_code=item_code,
+                            warehouse=warehouse,
+                            **values,
+                        )
+                    )
+                elif values["modified"] >= level.modified:
+                    for attr, value in values.items():
+                        setattr(level, attr, value)
+                    level.synced_at = timezone.now()
+                    to_update.append(level)
+            InventoryLevel.objects.bulk_create(to_create, ignore_conflicts=True)
+            if to_update:
+                InventoryLevel.objects.bulk_update(
+                    to_update, ["actual_qty", "reserved_qty", "modified", "synced_at"]
+                )
+            if to_create or to_update:
+                transaction.on_commit(self._invalidate_cached_bins)
+            if increased:
+                transaction.on_commit(
+                    lambda: stock_increased.send(
+                        sender=InventoryMirror,
+                        organization_id=self.organization_id,
+                        company=self.company,
+                        levels=increased,
+                    )
+                )
+        return len(to_create) + len(to_update)
+
+    def consume(self, quantities: Dict[Key, Decimal]) -> None:
+        """Subtract delivered quantities until the next sync brings ERPNext's figure."""
+        whens = [
+            When(item_code=item_code, warehouse=warehouse, then=F("actual_qty") - qty)
+            for (item_code, warehouse), qty in quantities.items()
+            if warehouse and qty
+        ]
+        if whens:
+            # Un solo UPDATE para todas las líneas.
+            self._levels().filter(reduce(operator.or_, (when.condition for when in whens))).update(
+                actual_qty=Case(*whens, default=F("actual_qty"))
+            )
+
+    def sync(self, client, *, full: bool = False, batch_size: int = 500) -> int:
+        """Pull Bins modified since the stored cursor (all of them with ``full``)."""
+        state, _ = InventorySyncState.objects.get_or_create(
+            organization_id=self.organization_id, company=self.company
+        )
+        cursor = "" if full else state.cursor
+        filters = [["modified", ">=", cursor]] if cursor else None
+        applied = 0
+        batch: List[Dict[str, Any]] = []
+        try:
+            for row in client.iter_resource("Bin", filters=filters, fields=BIN_FIELDS, page_size=batch_size):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    applied += self._flush(state, batch)
+                    batch = []
+            if batch:
+                applied += self._flush(state, batch)
+        except Exception as exc:
+            state.last_error = str(exc)
+            state.save(update_fields=["last_error", "updated_at"])
+            logger.warning("Sync de inventario %s/%s falló: %s", self.organization_id, self.company, exc)
+            raise
+        state.last_synced_at = timezone.now()
+        state.last_error = ""
+        state.save(update_fields=["last_synced_at", "last_error", "updated_at"])
+        logger.info("Inventario %s/%s sincronizado: %s bins", self.organization_id, self.company, applied)
+        return applied
+
+    # ------------------------------------------------------------------
+    def _flush(self, state: InventorySyncState, rows: List[Dict[str, Any]]) -> int:
+        applied = self.apply_bins(rows)
+        # Checkpoint por lote: una sync interrumpida se retoma desde aquí.
+        state.cursor = max(str(row.get("modified") or "") for row in rows)
+        state.save(update_fields=["cursor", "updated_at"])
+        return applied
+
+    def _invalidate_cached_bins(self) -> None:
+        urls = set(
+            ERPNextCredential.objects.active()
+            .filter(organization_id=self.organization_id, company=self.company)
+            .values_list("erpnext_url", flat=True)
+        )
+        for url in urls:
+            invalidate_resource(url, "Bin")
+
+    def _levels(self):
+        return InventoryLevel.objects.filter(organization_id=self.organization_id, company=self.company)
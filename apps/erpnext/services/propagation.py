@@ -0,0 +1,182 @@
+"""Outbox for status updates owed to seller ERPNext sites after a fulfillment."""
+
+from __future__ import annotations
+
+import logging
+import operator
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.erpnext.models import ERPNextCredential, StatusPropagation
+
+from .client import ERPNextClientError, get_client
+
+logger = logging.getLogger(__name__)
+
+# Mientras un consumidor entrega un lote, nadie más lo toma; si muere, el lote vuelve tras el lease.
+CLAIM_LEASE_SECONDS = 300
+BULK_UPDATE_CHUNK = 100
+
+
+def enqueue_status_update(organization_id, company: str, doctype: str, docname: str, payload: Dict[str, Any]) -> None:
+    """Record (or replace) the pending update of one seller document; one INSERT ... ON CONFLICT."""
+    now = timezone.now()
+    StatusPropagation.objects.bulk_create(
+        [
+            StatusPropagation(
+                organization_id=organization_id,
+                company=company,
+                doctype=doctype,
+                docname=docname,
+                payload=payload,
+                status=StatusPropagation.STATUS_PENDING,
+                attempts=0,
+                last_error="",
+                enqueued_at=now,
+                next_attempt_at=now,
+                updated_at=now,
+            )
+        ],
+        update_conflicts=True,
+        unique_fields=["organization_id", "company", "doctype", "docname"],
+        update_fields=["payload", "status", "attempts", "last_error", "enqueued_at", "next_attempt_at", "updated_at"],
+    )
+
+
+def deliver_status_propagations(*, limit: int = 500, now=None) -> Dict[str, Any]:
+    """Deliver due outbox rows, one ``bulk_update`` per seller site; returns counts and lag."""
+    now = now or timezone.now()
+    batch = _claim(limit, now)
+    stats: Dict[str, Any] = {"claimed": len(batch), "sent": 0, "retried": 0, "failed": 0, "lag_seconds": {}}
+    if not batch:
+        return stats
+
+    by_company: Dict[tuple, List[StatusPropagation]] = defaultdict(list)
+    for row in batch:
+        by_company[(row.organization_id, row.company)].append(row)
+
+    # Varias compañías pueden vivir en el mismo sitio: un cliente (sesión en pool) y una llamada por sitio.
+    by_site: Dict[tuple, Dict[str, Any]] = {}
+    for (organization_id, company), rows in by_company.items():
+        credential = ERPNextCredential.objects.for_company(organization_id=organization_id, company=company)
+        if not credential:
+            # La credencial puede darse de alta o reactivarse: se reintenta con backoff como cualquier fallo.
+            _retry(rows, f"Sin credencial ERPNext activa para {company}.", stats)
+            continue
+        site = by_site.setdefault(
+            (str(credential.erpnext_url).rstrip("/"), str(credential.api_key)),
+            {"credential": credential, "rows": []},
+        )
+        site["rows"].extend(rows)
+
+    lags: List[float] = []
+    for site in by_site.values():
+        client = get_client(site["credential"])
+        rows = site["rows"]
+        for start in range(0, len(rows), BULK_UPDATE_CHUNK):
+            chunk = rows[start : start + BULK_UPDATE_CHUNK]
+            try:
+                failed = set(
+                    client.update_many(
+                        [{"doctype": row.doctype, "docname": row.docname, **(row.payload or {})} for row in chunk]
+                    )
+                )
+            except ERPNextClientError as exc:
+                _retry(chunk, str(exc), stats)
+                continue
+            sent = [row for row in chunk if (row.doctype, row.docname) not in failed]
+            _mark_sent(sent, stats, lags)
+            _retry(
+                [row for row in chunk if (row.doctype, row.docname) in failed],
+                "bulk_update rechazó el documento",
+                stats,
+            )
+
+    stats["lag_seconds"] = _summary(lags)
+    logger.info(
+        "Propagación de estado: %s enviados, %s reintentos, %s fallidos, lag %s",
+        stats["sent"],
+        stats["retried"],
+        stats["failed"],
+        stats["lag_seconds"],
+    )
+    return stats
+
+
+def propagation_lag(now=None) -> Optional[float]:
+    """Age in seconds of the oldest undelivered update (``None`` when the outbox is empty)."""
+    oldest = (
+        StatusPropagation.objects.filter(status=StatusPropagation.STATUS_PENDING)
+        .order_by("enqueued_at")
+        .values_list("enqueued_at", flat=True)
+        .first()
+    )
+    if oldest is None:
+        return None
+    return max(0.0, ((now or timezone.now()) - oldest).total_seconds())
+
+
+# ----------------------------------------------------------------------
+def _claim(limit: int, now) -> List[StatusPropagation]:
+    with transaction.atomic():
+        batch = list(
+            StatusPropagation.objects.select_for_update(skip_locked=True)
+            .filter(status=StatusPropagation.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:limit]
+        )
+        if batch:
+            StatusPropagation.objects.filter(pk__in=[row.pk for row in batch]).update(
+                next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS)
+            )
+    return batch
+
+
+def _mark_sent(rows: List[StatusPropagation], stats: Dict[str, Any], lags: List[float]) -> None:
+    if not rows:
+        return
+    now = timezone.now()
+    # Solo si nadie reencoló una versión más nueva del mismo documento mientras se enviaba.
+    unchanged = reduce(operator.or_, (Q(pk=row.pk, enqueued_at=row.enqueued_at) for row in rows))
+    StatusPropagation.objects.filter(unchanged).update(
+        status=StatusPropagation.STATUS_SENT, sent_at=now, attempts=F("attempts") + 1, last_error="", updated_at=now
+    )
+    lags.extend((now - row.enqueued_at).total_seconds() for row in rows)
+    stats["sent"] += len(rows)
+
+
+def _retry(rows: List[StatusPropagation], error: str, stats: Dict[str, Any]) -> None:
+    max_attempts = getattr(settings, "ERPNEXT_PROPAGATION_MAX_ATTEMPTS", 10)
+    now = timezone.now()
+    for row in rows:
+        attempts = row.attempts + 1
+        if attempts >= max_attempts:
+            status, next_attempt_at = StatusPropagation.STATUS_FAILED, now
+            stats["failed"] += 1
+        else:
+            status, next_attempt_at = StatusPropagation.STATUS_PENDING, now + timedelta(seconds=_backoff(attempts))
+            stats["retried"] += 1
+        StatusPropagation.objects.filter(pk=row.pk, enqueued_at=row.enqueued_at).update(
+            status=status, attempts=attempts, last_error=error, next_attempt_at=next_attempt_at, updated_at=now
+        )
+        logger.warning("Propagación de %s %s a %s falló (%s): %s", row.doctype, row.docname, row.company, attempts, error)
+
+
+def _backoff(attempts: int) -> int:
+    return min(5 * (2 ** min(attempts, 6)), 3600)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        "p50": round(ordered[len(ordered) // 2], 3),
+        "max": round(ordered[-1], 3),
+    }
@@ -0,0 +1,260 @@
+"""Adaptive (AIMD) token-bucket limiter per ERPNext site, shared through Redis."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Reserve one token. Tokens may go negative: the caller sleeps ``wait`` and then
+# proceeds, so waiting callers are served in arrival order without re-polling.
+_ACQUIRE = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local default_rate = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local state = redis.call('HMGET', key, 'tokens', 'ts', 'rate')
+local rate = tonumber(state[3]) or default_rate
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) / 1000 * rate)
+local wait = 0
+if tokens < 1 then
+  wait = (1 - tokens) / rate * 1000
+end
+if wait <= max_wait then
+  tokens = tokens - 1
+end
+redis.call('HSET', key, 'tokens', tokens, 'ts', now, 'rate', rate)
+redis.call('PEXPIRE', key, 600000)
+return {tostring(wait), tostring(rate)}
+"""
+
+_FEEDBACK = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local outcome = ARGV[2]
+local default_rate = tonumber(ARGV[3])
+local min_rate = tonumber(ARGV[4])
+local max_rate = tonumber(ARGV[5])
+local increase = tonumber(ARGV[6])
+local factor = tonumber(ARGV[7])
+local cooldown = tonumber(ARGV[8])
+local pause = tonumber(ARGV[9])
+local state = redis.call('HMGET', key, 'rate', 'last_decrease', 'tokens')
+local rate = tonumber(state[1]) or default_rate
+local last_decrease = tonumber(state[2]) or 0
+if outcome == 'ok' then
+  rate = math.min(max_rate, rate + increase)
+elseif now - last_decrease >= cooldown then
+  rate = math.max(min_rate, rate * factor)
+  redis.call('HSET', key, 'last_decrease', now)
+end
+redis.call('HSET', key, 'rate', rate)
+if pause > 0 then
+  local tokens = tonumber(state[3]) or 0
+  redis.call('HSET', key, 'tokens', math.min(tokens, -pause / 1000 * rate), 'ts', now)
+end
+redis.call('PEXPIRE', key, 600000)
+return tostring(rate)
+"""
+
+
+class RateLimitExceeded(Exception):
+    """The local queue would exceed ``max_wait``; callers should reschedule instead of hammering ERPNext."""
+
+    def __init__(self, wait: float) -> None:
+        super().__init__(f"Cola de rate limit ERPNext excedida ({wait:.1f}s)")
+        self.wait = wait
+
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    rate: float = 10.0
+    min_rate: float = 1.0
+    max_rate: float = 50.0
+    burst: float = 20.0
+    max_wait: float = 10.0
+    increase: float = 0.2
+    decrease_factor: float = 0.5
+    slow_factor: float = 0.9
+    target_latency: float = 2.0
+    cooldown: float = 1.0
+
+    @classmethod
+    def from_settings(cls) -> "RateLimitConfig":
+        return cls(
+            rate=getattr(settings, "ERPNEXT_RATE_LIMIT_RATE", 10.0),
+            min_rate=getattr(settings, "ERPNEXT_RATE_LIMIT_MIN_RATE", 1.0),
+            max_rate=getattr(settings, "ERPNEXT_RATE_LIMIT_MAX_RATE", 50.0),
+            burst=getattr(settings, "ERPNEXT_RATE_LIMIT_BURST", 20.0),
+            max_wait=getattr(settings, "ERPNEXT_RATE_LIMIT_MAX_WAIT", 10.0),
+            target_latency=getattr(settings, "ERPNEXT_RATE_LIMIT_TARGET_LATENCY", 2.0),
+        )
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate grows additively on success and shrinks multiplicatively
+    on 429/503 or when latency exceeds ``target_latency``.
+
+    State lives in one Redis hash per ``erpnext_url`` so every worker shares the
+    budget; if Redis is unreachable the same algorithm runs in-process.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        config: Optional[RateLimitConfig] = None,
+        connection=None,
+        *,
+        use_redis: bool = True,
+    ) -> None:
+        self.base_url = base_url
+        self.config = config or RateLimitConfig.from_settings()
+        self.key = "erpnext:ratelimit:" + hashlib.sha1(base_url.rstrip("/").lower().encode()).hexdigest()[:16]
+        self._connection = connection
+        self._scripts = None
+        self._redis_down_until = 0.0 if use_redis else float("inf")
+        self._lock = threading.Lock()
+        self._local = {"tokens": self.config.burst, "ts": None, "rate": self.config.rate, "last_decrease": 0.0}
+        self.rate = self.config.rate
+
+    # ------------------------------------------------------------------
+    def acquire(self) -> float:
+        """Wait for a token and return the seconds spent queued; raises RateLimitExceeded."""
+        wait, self.rate = self._reserve()
+        if wait > self.config.max_wait:
+            raise RateLimitExceeded(wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """``acquire`` for the async client: the Redis round trip runs off the loop and the wait is awaited."""
+        wait, self.rate = await asyncio.to_thread(self._reserve)
+        if wait > self.config.max_wait:
+            raise RateLimitExceeded(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    async def feedback_async(self, **kwargs) -> None:
+        await asyncio.to_thread(self.feedback, **kwargs)
+
+    def feedback(self, *, status_code: Optional[int], latency: float, retry_after: Optional[float] = None) -> None:
+        if status_code in (429, 503):
+            outcome, factor = "throttled", self.config.decrease_factor
+        elif latency > self.config.target_latency:
+            outcome, factor = "slow", self.config.slow_factor
+        elif self.rate >= self.config.max_rate:
+            return
+        else:
+            outcome, factor = "ok", 1.0
+        pause = retry_after or 0.0
+        self.rate = self._adjust(outcome, factor, pause)
+        if outcome != "ok":
+            logger.info("Rate limit ERPNext %s -> %.2f req/s (%s)", self.base_url, self.rate, outcome)
+
+    # ------------------------------------------------------------------
+    def _redis(self):
+        if time.monotonic() < self._redis_down_until:
+            return None
+        if self._scripts is None:
+            try:
+                if self._connection is None:
+                    from django_redis import get_redis_connection
+
+                    alias = getattr(settings, "ERPNEXT_CACHE_ALIAS", "default") or "default"
+                    self._connection = get_redis_connection(alias)
+                self._scripts = (
+                    self._connection.register_script(_ACQUIRE),
+                    self._connection.register_script(_FEEDBACK),
+                )
+            except Exception as exc:
+                self._redis_failed(exc)
+                return None
+        return self._scripts
+
+    def _redis_failed(self, exc: Exception) -> None:
+        self._redis_down_until = time.monotonic() + 30.0
+        logger.warning("Rate limiter ERPNext sin Redis, usando bucket local: %s", exc)
+
+    def _reserve(self):
+        cfg = self.config
+        scripts = self._redis()
+        if scripts is not None:
+            try:
+                wait_ms, rate = scripts[0](
+                    keys=[self.key], args=[time.time() * 1000, cfg.rate, cfg.burst, cfg.max_wait * 1000]
+                )
+                return float(wait_ms) / 1000, float(rate)
+            except Exception as exc:
+                self._redis_failed(exc)
+        with self._lock:
+            state = self._local
+            now = time.monotonic()
+            elapsed = now - state["ts"] if state["ts"] is not None else 0.0
+            tokens = min(cfg.burst, state["tokens"] + elapsed * state["rate"])
+            wait = (1 - tokens) / state["rate"] if tokens < 1 else 0.0
+            if wait <= cfg.max_wait:
+                tokens -= 1
+            state["tokens"], state["ts"] = tokens, now
+            return wait, state["rate"]
+
+    def _adjust(self, outcome: str, factor: float, pause: float) -> float:
+        cfg = self.config
+        scripts = self._redis()
+        if scripts is not None:
+            try:
+                rate = scripts[1](
+                    keys=[self.key],
+                    args=[
+                        time.time() * 1000,
+                        outcome,
+                        cfg.rate,
+                        cfg.min_rate,
+                        cfg.max_rate,
+                        cfg.increase,
+                        factor,
+                        cfg.cooldown * 1000,
+                        pause * 1000,
+                    ],
+                )
+                return float(rate)
+            except Exception as exc:
+                self._redis_failed(exc)
+        with self._lock:
+            state = self._local
+            now = time.monotonic()
+            if outcome == "ok":
+                state["rate"] = min(cfg.max_rate, state["rate"] + cfg.increase)
+            elif now - state["last_decrease"] >= cfg.cooldown:
+                state["rate"] = max(cfg.min_rate, state["rate"] * factor)
+                state["last_decrease"] = now
+            if pause > 0:
+                state["tokens"] = min(state["tokens"], -pause * state["rate"])
+                state["ts"] = now
+            return state["rate"]
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(base_url: str) -> AdaptiveRateLimiter:
+    """One limiter per ERPNext site and process; the bucket itself is shared through Redis."""
+    key = base_url.rstrip("/").lower()
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveRateLimiter(base_url)
+    return limiter
@@ -0,0 +1,171 @@
+"""Stock reservation ledger: admit concurrent orders against the same Bin without overselling."""
+
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from apps.erpnext.models import StockReservation, StockReservationBucket
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, Optional[str]]
+
+
+def _decimal(value) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value or 0))
+
+
+class ReservationLedger:
+    """Reservations of one fulfillment order (``reference``) against a distributor's stock.
+
+    ``reserve`` runs under row locks of the (company, item, warehouse) buckets,
+    taken in key order, so two orders for the same SKU are admitted one after
+    the other against ``actual_qty`` minus the unexpired active holds of other
+    orders. Holds expire after ``ttl`` seconds even if nobody releases them.
+    A hold committed after ``available`` was read still counts: that snapshot
+    does not reflect the delivery yet.
+    """
+
+    def __init__(self, organization_id, company: str, reference: str, *, ttl: Optional[int] = None) -> None:
+        self.organization_id = organization_id
+        self.company = company
+        self.reference = str(reference)
+        self.ttl = ttl if ttl is not None else getattr(settings, "ERPNEXT_RESERVATION_TTL", 900)
+
+    @classmethod
+    def for_order(cls, organization_id, company: str, reference) -> Optional["ReservationLedger"]:
+        if not company or not getattr(settings, "ERPNEXT_RESERVATIONS_ENABLED", True):
+            return None
+        return cls(organization_id, company, str(reference))
+
+    def reserve(self, required: Dict[Key, Decimal], available: Dict[Key, object], *, read_at=None) -> List[Key]:
+        """Hold every line or none; returns the keys that do not fit (empty when reserved).
+
+        ``read_at`` is when ``available`` was read (taken just before the read);
+        ``None`` means it was read under the bucket locks.
+        """
+        keys = sorted(key for key in required if key[1])
+        now = timezone.now()
+        counted = Q(status=StockReservation.STATUS_ACTIVE, expires_at__gt=now)
+        if read_at is not None:
+            counted |= Q(status=StockReservation.STATUS_COMMITTED, updated_at__gt=read_at)
+        with transaction.atomic():
+            buckets = self._lock_buckets(keys)
+            held_by_others = dict(
+                StockReservation.objects.filter(counted, bucket__in=buckets.values())
+                .exclude(reference=self.reference)
+                .values("bucket")
+                .annotate(total=Sum("quantity"))
+                .values_list("bucket", "total")
+            )
+            short = []
+            for key, qty in required.items():
+                bucket = buckets.get(key)
+                held = held_by_others.get(bucket.pk, 0) if bucket else 0
+                if _decimal(available.get(key, 0)) - held < qty:
+                    short.append(key)
+            if short:
+                # Un pedido en backorder no retiene stock parcial.
+                self._close(StockReservation.STATUS_RELEASED)
+                return short
+
+            expires_at = now + timedelta(seconds=self.ttl)
+            own = {
+                reservation.bucket_id: reservation
+                for reservation in StockReservation.objects.filter(
+                    bucket__in=buckets.values(), reference=self.reference
+                )
+            }
+            to_create: List[StockReservation] = []
+            to_update: List[StockReservation] = []
+            for key in keys:
+                reservation = own.get(buckets[key].pk)
+                if reservation is None:
+                    to_create.append(
+                        StockReservation(
+                            bucket=buckets[key],
+                            reference=self.reference,
+                            quantity=required[key],
+                            expires_at=expires_at,
+                        )
+                    )
+                    continue
+                reservation.quantity = required[key]
+                reservation.status = StockReservation.STATUS_ACTIVE
+                reservation.expires_at = expires_at
+                reservation.updated_at = now
+                to_update.append(reservation)
+            StockReservation.objects.bulk_create(to_create)
+            if to_update:
+                StockReservation.objects.bulk_update(to_update, ["quantity", "status", "expires_at", "updated_at"])
+        return []
+
+    def commit(self) -> int:
+        """The DN was submitted and the mirror consumed: drop the hold.
+
+        It keeps counting for stock snapshots read before this moment (see ``reserve``).
+        """
+        return self._close(StockReservation.STATUS_COMMITTED)
+
+    def release(self) -> int:
+        return self._close(StockReservation.STATUS_RELEASED)
+
+    # ------------------------------------------------------------------
+    def _lock_buckets(self, keys: List[Key]) -> Dict[Key, StockReservationBucket]:
+        if not keys:
+            return {}
+        StockReservationBucket.objects.bulk_create(
+            [
+                StockReservationBucket(
+                    organization_id=self.organization_id,
+                    company=self.company,
+                    item_code=item_code,
+                    warehouse=warehouse,
+                )
+                for item_code, warehouse in keys
+            ],
+            ignore_conflicts=True,
+        )
+        locked = (
+            StockReservationBucket.objects.select_for_update()
+            .filter(
+                organization_id=self.organization_id,
+                company=self.company,
+                item_code__in={item_code for item_code, _ in keys},
+                warehouse__in={warehouse for _, warehouse in keys},
+            )
+            .order_by("item_code", "warehouse")
+        )
+        wanted = set(keys)
+        return {
+            (bucket.item_code, bucket.warehouse): bucket
+            for bucket in locked
+            if (bucket.item_code, bucket.warehouse) in wanted
+        }
+
+    def _close(self, status: str) -> int:
+        return StockReservation.objects.filter(
+            bucket__organization_id=self.organization_id,
+            bucket__company=self.company,
+            reference=self.reference,
+            status=StockReservation.STATUS_ACTIVE,
+        ).update(status=status, updated_at=timezone.now())
+
+
+def release_expired_reservations(now=None) -> int:
+    """Housekeeping: expired holds no longer count, this only marks them released."""
+    released = StockReservation.objects.filter(
+        status=StockReservation.STATUS_ACTIVE,
+        expires_at__lte=now or timezone.now(),
+    ).update(status=StockReservation.STATUS_RELEASED, updated_at=timezone.now())
+    if released:
+        logger.info("Reservas de stock expiradas liberadas: %s", released)
+    return released
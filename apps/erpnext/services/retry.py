@@ -0,0 +1,237 @@
+"""Request-level retry policy and call accounting for the ERPNext clients."""
+
+from __future__ import annotations
+
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import FrozenSet, Iterator, List, Mapping, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Respuestas cuyo Retry-After también pausa el rate limiter compartido.
+THROTTLE_STATUSES = frozenset({429, 503})
+
+RETURN = "return"
+RETRY = "retry"
+RAISE = "raise"
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 10.0
+    budget_seconds: float = 30.0
+    retry_statuses: FrozenSet[int] = RETRY_STATUSES
+    idempotent_methods: FrozenSet[str] = IDEMPOTENT_METHODS
+
+    @classmethod
+    def from_settings(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=getattr(settings, "ERPNEXT_RETRY_MAX_ATTEMPTS", 3),
+            backoff_base=getattr(settings, "ERPNEXT_RETRY_BACKOFF_BASE", 0.5),
+            backoff_max=getattr(settings, "ERPNEXT_RETRY_BACKOFF_MAX", 10.0),
+            budget_seconds=getattr(settings, "ERPNEXT_RETRY_BUDGET_SECONDS", 30.0),
+        )
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff; ``Retry-After`` wins when the server sends it."""
+        if retry_after is not None:
+            return min(max(retry_after, 0.0), self.backoff_max)
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+@dataclass(frozen=True)
+class Outcome:
+    """What one attempt means for the request.
+
+    ``retry_after`` is the server's Retry-After for the rate limiter feedback;
+    ``safe`` tells whether resending cannot apply the request twice.
+    """
+
+    action: str
+    safe: bool = True
+    retry_after: Optional[float] = None
+
+
+class RetryState:
+    """Retry decisions of one request, shared by ``ERPNextClient`` and ``AsyncERPNextClient``.
+
+    The clients do the I/O, the rate limiter calls and the sleeping; this
+    classifies each attempt, resolves Retry-After, computes the delay within
+    the policy's attempts and time budget, and keeps the request's stats.
+    """
+
+    def __init__(
+        self,
+        policy: RetryPolicy,
+        method: str,
+        endpoint: str,
+        *,
+        idempotent: Optional[bool] = None,
+        throttled: bool = False,
+    ) -> None:
+        self.policy = policy
+        self.idempotent = method in policy.idempotent_methods if idempotent is None else idempotent
+        # Con rate limiter el bucket compartido ya espera el Retry-After: el reintento no lo repite.
+        self.throttled = throttled
+        self.stats = RequestStats(method=method, endpoint=endpoint)
+        self.started = time.monotonic()
+        self._retry_after: Optional[float] = None
+
+    def begin(self) -> None:
+        self.stats.attempts += 1
+        self._retry_after = None
+
+    def response(self, status_code: int, headers: Mapping[str, str]) -> Outcome:
+        self.stats.status_code = status_code
+        header = headers.get("Retry-After")
+        feedback = parse_retry_after(header) if status_code in THROTTLE_STATUSES else None
+        if status_code < 400:
+            return Outcome(RETURN, retry_after=feedback)
+        if status_code not in self.policy.retry_statuses:
+            return Outcome(RAISE, safe=False, retry_after=feedback)
+        self._retry_after = 0.0 if feedback is not None and self.throttled else parse_retry_after(header)
+        # 429 means the request was rejected before being processed.
+        return Outcome(RETRY, safe=self.idempotent or status_code == 429, retry_after=feedback)
+
+    def transport_error(self, *, connect: bool = False) -> Outcome:
+        # A connect error never reached ERPNext, so it is always safe to resend.
+        return Outcome(RETRY, safe=self.idempotent or connect)
+
+    def must_probe(self, outcome: Outcome, error: Exception, cause=None, *, can_probe: bool = False) -> bool:
+        """Raise ``error`` when the failed attempt cannot be retried; True when the idempotency probe must run first."""
+        stats = self.stats
+        if stats.attempts >= self.policy.max_attempts:
+            logger.error("ERPNext %s %s failed after %s attempts: %s", stats.method, stats.endpoint, stats.attempts, error)
+            raise error from cause
+        if outcome.safe:
+            return False
+        if not can_probe:
+            logger.error("ERPNext %s %s not retried (not idempotent): %s", stats.method, stats.endpoint, error)
+            raise error from cause
+        return True
+
+    def next_delay(self, error: Exception, cause=None) -> float:
+        """Seconds to wait before the next attempt; raises ``error`` when the time budget would run out."""
+        stats = self.stats
+        delay = self.policy.delay(stats.attempts, self._retry_after)
+        if time.monotonic() - self.started + delay > self.policy.budget_seconds:
+            logger.error("ERPNext %s %s retry budget exhausted: %s", stats.method, stats.endpoint, error)
+            raise error from cause
+        logger.warning(
+            "ERPNext %s %s transient failure (%s); retry %s in %.2fs",
+            stats.method,
+            stats.endpoint,
+            error,
+            stats.attempts,
+            delay,
+        )
+        stats.retry_wait_s += delay
+        return delay
+
+    def finish(self) -> None:
+        self.stats.elapsed_s = time.monotonic() - self.started
+        record(self.stats)
+
+
+@dataclass
+class RequestStats:
+    method: str
+    endpoint: str
+    attempts: int = 0
+    retry_wait_s: float = 0.0
+    throttle_wait_s: float = 0.0
+    elapsed_s: float = 0.0
+    status_code: Optional[int] = None
+    reused_existing: bool = False
+
+    @property
+    def retries(self) -> int:
+        return max(self.attempts - 1, 0)
+
+
+@dataclass
+class CallStats:
+    """Aggregate of every ERPNext request made inside ``collect_stats()``."""
+
+    requests: List[RequestStats] = field(default_factory=list)
+
+    @property
+    def calls(self) -> int:
+        return sum(item.attempts for item in self.requests)
+
+    @property
+    def retries(self) -> int:
+        return sum(item.retries for item in self.requests)
+
+    @property
+    def retry_wait_s(self) -> float:
+        return sum(item.retry_wait_s for item in self.requests)
+
+    @property
+    def throttle_wait_s(self) -> float:
+        return sum(item.throttle_wait_s for item in self.requests)
+
+    @property
+    def elapsed_s(self) -> float:
+        return sum(item.elapsed_s for item in self.requests)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": len(self.requests),
+            "calls": self.calls,
+            "retries": self.retries,
+            "retry_wait_s": round(self.retry_wait_s, 3),
+            "throttle_wait_s": round(self.throttle_wait_s, 3),
+            "elapsed_s": round(self.elapsed_s, 3),
+        }
+
+
+# Una tupla por contexto: cada hilo y cada tarea asyncio ve solo los colectores que abrió.
+_collectors: ContextVar[Tuple[CallStats, ...]] = ContextVar("erpnext_call_stats", default=())
+
+
+@contextmanager
+def collect_stats() -> Iterator[CallStats]:
+    """Collect stats for every ERPNext request made by this thread or asyncio task inside the block."""
+    stats = CallStats()
+    token = _collectors.set(_collectors.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+def record(item: RequestStats) -> None:
+    for stats in _collectors.get():
+        stats.requests.append(item)
@@ -0,0 +1,65 @@
+"""Process-wide pool of keep-alive HTTP sessions for ERPNext sites."""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, Tuple
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+_sessions: Dict[Tuple[int, str], requests.Session] = {}
+_lock = threading.Lock()
+
+
+def _pool_key(base_url: str) -> Tuple[int, str]:
+    # Sessions are never shared across forked workers (Celery prefork).
+    return os.getpid(), base_url.rstrip("/").lower()
+
+
+def build_session() -> requests.Session:
+    pool_connections = getattr(settings, "ERPNEXT_HTTP_POOL_CONNECTIONS", 4)
+    pool_maxsize = getattr(settings, "ERPNEXT_HTTP_POOL_MAXSIZE", 20)
+    pool_block = getattr(settings, "ERPNEXT_HTTP_POOL_BLOCK", False)
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+        max_retries=0,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(
+        {
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+    )
+    return session
+
+
+def get_session(base_url: str) -> requests.Session:
+    """Return the shared session for ``base_url``, creating it on first use."""
+    key = _pool_key(base_url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = build_session()
+            _sessions[key] = session
+    return session
+
+
+def close_sessions() -> None:
+    """Close and forget every pooled session (tests, worker shutdown)."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
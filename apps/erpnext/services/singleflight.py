@@ -0,0 +1,149 @@
+"""Coalesce identical in-flight ERPNext GETs into one HTTP call."""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def flight_key(base_url: str, api_key: str, endpoint: str, params: Optional[dict] = None) -> str:
+    """Normalised URL + params; the API key is part of it because permissions differ per user."""
+    normalized = json.dumps(params or {}, sort_keys=True, default=str)
+    raw = f"{base_url.rstrip('/').lower()}|{api_key}|{endpoint.lstrip('/')}?{normalized}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class SingleFlight:
+    """Within a process, concurrent callers with the same key share the leader's result.
+
+    Followers get a deep copy so nobody mutates another caller's response, and an
+    exception raised by the leader is raised to every follower.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class RedisSingleFlight:
+    """Cross-process variant: a short Redis lock elects one caller, which publishes the result.
+
+    Callers that lose the lock poll for the published result until the lock
+    expires and then fall back to calling ERPNext themselves, so a crashed
+    leader only costs ``lock_ms``.
+    """
+
+    def __init__(self, connection=None, *, lock_ms: int = 2000, result_ttl_ms: int = 2000, poll_s: float = 0.02):
+        self._connection = connection
+        self.lock_ms = lock_ms
+        self.result_ttl_ms = result_ttl_ms
+        self.poll_s = poll_s
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            from django_redis import get_redis_connection
+
+            self._connection = get_redis_connection(getattr(settings, "ERPNEXT_CACHE_ALIAS", "default") or "default")
+        return self._connection
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        # Threads of this process coalesce locally first; only the local leader touches Redis.
+        return _local.do(key, lambda: self._do_distributed(key, fn))
+
+    def _do_distributed(self, key: str, fn: Callable[[], Any]) -> Any:
+        lock_key = f"erpnext:flight:{key}:lock"
+        result_key = f"erpnext:flight:{key}:result"
+        token = uuid.uuid4().hex
+        try:
+            leader = bool(self.connection.set(lock_key, token, nx=True, px=self.lock_ms))
+        except Exception as exc:
+            logger.warning("Single-flight Redis no disponible, llamando directo: %s", exc)
+            return fn()
+
+        if leader:
+            published = False
+            try:
+                result = fn()
+                try:
+                    self.connection.set(result_key, json.dumps(result), px=self.result_ttl_ms)
+                    published = True
+                except Exception as exc:
+                    logger.warning("No se pudo publicar el resultado single-flight: %s", exc)
+                return result
+            finally:
+                # Solo liberar el lock si sigue siendo nuestro; si no se publicó, los seguidores llaman directo.
+                try:
+                    if self.connection.get(lock_key) == token.encode():
+                        self.connection.delete(lock_key)
+                except Exception:
+                    if not published:
+                        logger.warning("No se pudo liberar el lock single-flight %s", lock_key)
+
+        deadline = time.monotonic() + self.lock_ms / 1000
+        while time.monotonic() < deadline:
+            raw = self.connection.get(result_key)
+            if raw is not None:
+                return json.loads(raw)
+            if not self.connection.exists(lock_key):
+                raw = self.connection.get(result_key)
+                if raw is not None:
+                    return json.loads(raw)
+                break
+            time.sleep(self.poll_s)
+        return fn()
+
+
+_local = SingleFlight()
+_distributed: Optional[RedisSingleFlight] = None
+
+
+def get_single_flight():
+    """Process-wide coalescer; the Redis variant when ERPNEXT_SINGLEFLIGHT_DISTRIBUTED is on."""
+    global _distributed
+    if not getattr(settings, "ERPNEXT_SINGLEFLIGHT_DISTRIBUTED", False):
+        return _local
+    if _distributed is None:
+        _distributed = RedisSingleFlight(
+            lock_ms=getattr(settings, "ERPNEXT_SINGLEFLIGHT_LOCK_MS", 2000),
+            result_ttl_ms=getattr(settings, "ERPNEXT_SINGLEFLIGHT_LOCK_MS", 2000),
+        )
+    return _distributed
@@ -1,8 +1,20 @@
 # tasks.py
-import math
 import logging
+from dataclasses import asdict
+from typing import List, Optional
+
 from celery import shared_task
-from .services import ERPNextClient, ERPNextClientError
+from apps.integrations.models import FulfillmentOrder
+from apps.organizations.models import Organization
+
+from .gateway.bulk import BulkFulfillmentEngine
+from .gateway.exceptions import GatewayConfigurationError
+from .gateway.settings import GatewaySettings
+from .services import ERPNextClientError, get_client
+from .services.backorders import sweep_backorders
+from .services.inventory import InventoryMirror
+from .services.propagation import deliver_status_propagations
+from .services.reservations import release_expired_reservations
 from .models import ERPNextCredential
 
 logger = logging.getLogger(__name__)
@@ -14,11 +26,10 @@ def create_invoices_from_pending_orders_task(self, organization_id: str):
         logger.error("No ERPNextCredential for org %s", organization_id)
         return
 
-    client = ERPNextClient(cred)
+    client = get_client(cred)
 
-    # 1) contar y paginar
-    limit = 50
-    offset = 0
+    # 1) recorrer por keyset (modified, name): facturar una SO la saca del filtro sin desplazar páginas
+    page_size = 50
 
     common_filters = [
         ["Sales Order", "docstatus", "=", 1],
@@ -29,22 +40,76 @@ def create_invoices_from_pending_orders_task(self, organization_id: str):
     ]
     fields = ["name", "customer", "grand_total", "per_billed"]
 
-    while True:
-        sos = client.list_sales_orders(filters=common_filters, fields=fields, limit=limit, offset=offset)
-        if not sos:
-            break
-
-        for so in sos:
-            so_name = so["name"]
-            try:
-                # Si necesitas due_date = posting_date (contado) o regla de crédito, calcula aquí
-                client.create_and_submit_invoice_from_order(so_name, update_stock=False)
-                logger.info("Submitted SI from SO %s", so_name)
-            except ERPNextClientError as e:
-                logger.exception("Failed SI for SO %s: %s", so_name, e)
-                # continúa con el siguiente (no abortar el batch)
-                continue
-
-        if len(sos) < limit:
-            break
-        offset += limit
+    sos = client.iter_resource("Sales Order", filters=common_filters, fields=fields, page_size=page_size, prefetch=True)
+    for so in sos:
+        so_name = so["name"]
+        try:
+            # Si necesitas due_date = posting_date (contado) o regla de crédito, calcula aquí
+            client.create_and_submit_invoice_from_order(so_name, update_stock=False)
+            logger.info("Submitted SI from SO %s", so_name)
+        except ERPNextClientError as e:
+            logger.exception("Failed SI for SO %s: %s", so_name, e)
+            # continúa con el siguiente (no abortar el batch)
+            continue
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def sync_inventory_mirror_task(self, organization_id: str, company: str, full: bool = False):
+    """Delta sync of the distributor's Bins into the local inventory mirror."""
+    cred = ERPNextCredential.objects.for_company(organization_id=organization_id, company=company)
+    if not cred:
+        logger.error("No ERPNextCredential for org %s / %s", organization_id, company)
+        return 0
+    try:
+        return InventoryMirror(organization_id, company).sync(get_client(cred), full=full)
+    except ERPNextClientError as exc:
+        raise self.retry(exc=exc)
+
+
+@shared_task
+def sync_inventory_mirrors_task():
+    """Periodic entry point: one sync task per organization with a fulfillment distributor."""
+    for organization in Organization.objects.active().filter(metadata__has_key="fulfillment_gateway"):
+        try:
+            company = GatewaySettings.for_organization(organization).distributor_company
+        except GatewayConfigurationError:
+            continue
+        if company:
+            sync_inventory_mirror_task.delay(str(organization.id), company)
+
+
+@shared_task
+def release_expired_reservations_task():
+    return release_expired_reservations()
+
+
+@shared_task
+def bulk_fulfill_distributor_task(
+    organization_id: str, distributor_company: str = "", limit: int = 200, order_ids: Optional[List[str]] = None
+):
+    """Fulfill the pending orders of one distributor together (see BulkFulfillmentEngine).
+
+    ``order_ids`` restricts the run to those orders (e.g. backorders woken by a stock increase).
+    """
+    organization = Organization.objects.filter(id=organization_id).first()
+    if not organization:
+        logger.error("Organization %s not found for bulk fulfillment", organization_id)
+        return []
+    engine = BulkFulfillmentEngine(organization, distributor_company or None)
+    if order_ids is not None:
+        orders = list(FulfillmentOrder.objects.filter(pk__in=order_ids).order_by("created_at")[:limit])
+    else:
+        orders = engine.pending_orders(limit=limit)
+    return [asdict(result) for result in engine.run(orders)]
+
+
+@shared_task
+def deliver_status_propagations_task(limit: int = 500):
+    """Outbox consumer: pushes pending fulfillment statuses to the seller sites."""
+    return deliver_status_propagations(limit=limit)
+
+
+@shared_task
+def sweep_backorders_task(limit: int = 500):
+    """Periodic retry of due waiting_stock orders, one stock query per distributor."""
+    return sweep_backorders(limit=limit)
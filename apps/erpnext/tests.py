@@ -1,3 +1,1036 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.erpnext.gateway.dto import MappedOrderLineDTO
+from apps.erpnext.gateway.bulk import BulkFulfillmentEngine
+from apps.erpnext.gateway.executor import FulfillmentExecutor
+from apps.erpnext.gateway.service import FulfillmentGatewayService
+from apps.erpnext.gateway.item_index import ItemMapIndexCache
+from apps.erpnext.gateway.normalizer import OrderNormalizer
+from apps.erpnext.gateway.settings import GatewaySettings
+from apps.erpnext.models import ERPNextCredential, InventoryLevel, StatusPropagation
+from apps.erpnext.services.async_client import AsyncERPNextClient
+from apps.erpnext.services.backorders import index_backorder, sweep_backorders
+from apps.erpnext.services.cache import ResourceCache
+from apps.erpnext.services.inventory import InventoryMirror
+from apps.erpnext.services.propagation import deliver_status_propagations, enqueue_status_update, propagation_lag
+from apps.erpnext.services.reservations import ReservationLedger
+from apps.erpnext.services.client import ERPNextClient, ERPNextClientError, get_client
+from apps.erpnext.services.ratelimit import AdaptiveRateLimiter, RateLimitConfig, RateLimitExceeded
+from apps.erpnext.services.retry import RAISE, RETRY, RETURN, RetryPolicy, RetryState, collect_stats, parse_retry_after
+from apps.erpnext.services.singleflight import SingleFlight
+from apps.integrations.exceptions import BackorderPending
+from apps.integrations.fake_servers import FakeFrappeServer, FaultProfile
+from apps.integrations.models import FulfillmentItemMap, FulfillmentOrder, IntegrationMessage
+from apps.organizations.models import Organization
+
+
+def _response(status_code: int, body=None, headers=None) -> mock.Mock:
+    response = mock.Mock()
+    response.status_code = status_code
+    response.ok = 200 <= status_code < 400
+    response.json.return_value = body if body is not None else {}
+    response.text = str(body)
+    response.headers = headers or {}
+    return response
+
+
+class ERPNextClientRetryTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.session = mock.Mock()
+        credential = SimpleNamespace(erpnext_url="https://erp.example.com", api_key="k", api_secret="s")
+        with override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False):
+            self.client = ERPNextClient(
+                credential,
+                session=self.session,
+                retry_policy=RetryPolicy(max_attempts=3, backoff_base=0.01, backoff_max=0.05),
+                resource_cache=ResourceCache(),
+            )
+        sleep_patcher = mock.patch("apps.erpnext.services.client.time.sleep")
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def test_get_retries_on_503_and_honours_retry_after(self):
+        self.session.request.side_effect = [
+            _response(503, headers={"Retry-After": "0.02"}),
+            _response(200, {"data": {"name": "ITEM-1"}}),
+        ]
+
+        with collect_stats() as stats:
+            doc = self.client.get_doc("Item", "ITEM-1")
+
+        self.assertEqual(doc, {"name": "ITEM-1"})
+        self.sleep.assert_called_once_with(0.02)
+        self.assertEqual((stats.calls, stats.retries), (2, 1))
+
+    def test_client_errors_are_not_retried(self):
+        self.session.request.return_value = _response(417, {"exc": "ValidationError"})
+
+        with self.assertRaises(ERPNextClientError) as ctx:
+            self.client.get_doc("Item", "ITEM-1")
+
+        self.assertEqual(ctx.exception.status_code, 417)
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_insert_reuses_document_created_by_failed_attempt(self):
+        self.session.request.side_effect = [
+            requests.exceptions.ReadTimeout("read timed out"),
+            _response(200, {"data": [{"name": "SO-0001", "docstatus": 0}]}),
+        ]
+
+        doc = self.client.insert_doc("Sales Order", {"custom_order_ref": "1042", "items": []})
+
+        self.assertEqual(doc["name"], "SO-0001")
+        probe_call = self.session.request.call_args_list[1]
+        self.assertEqual(probe_call.args[0], "GET")
+        self.sleep.assert_not_called()
+
+    def test_insert_without_idempotency_key_is_not_retried_on_5xx(self):
+        self.session.request.return_value = _response(502, {})
+
+        with self.assertRaises(ERPNextClientError):
+            self.client.insert_doc("Sales Invoice", {"customer": "C-1"})
+
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_insert_and_submit_uses_one_call_and_falls_back_on_403(self):
+        self.session.request.side_effect = [
+            _response(200, {"data": {"name": "DN-1", "docstatus": 1}}),
+        ]
+        doc = self.client.insert_and_submit("Delivery Note", {"custom_order_ref": "A"})
+        self.assertEqual((doc["name"], self.session.request.call_count), ("DN-1", 1))
+        self.assertEqual(self.session.request.call_args.kwargs["json"]["docstatus"], 1)
+
+        self.client._submit_on_insert = None
+        self.session.request.reset_mock()
+        self.session.request.side_effect = [
+            _response(403, {"exc_type": "PermissionError"}),
+            _response(200, {"data": {"name": "DN-2", "docstatus": 0}}),
+            _response(200, {"data": {"name": "DN-2", "docstatus": 1}}),
+        ]
+        doc = self.client.insert_and_submit("Delivery Note", {"custom_order_ref": "B"})
+        self.assertEqual(doc["docstatus"], 1)
+        self.assertIs(self.client._submit_on_insert, False)
+        self.assertEqual([c.args[0] for c in self.session.request.call_args_list], ["POST", "POST", "PUT"])
+
+    def test_insert_and_submit_raises_learnt_417_and_discards_failed_drafts(self):
+        self.client._submit_on_insert = True
+        self.session.request.side_effect = [_response(417, {"exc_type": "ValidationError"})]
+        with self.assertRaises(ERPNextClientError):
+            self.client.insert_and_submit("Delivery Note", {"custom_order_ref": "A"})
+        self.assertEqual(self.session.request.call_count, 1)
+
+        # Sin capacidad aprendida se prueba insert + submit; si el submit falla, el borrador se elimina.
+        self.client._submit_on_insert = None
+        self.session.request.reset_mock()
+        self.session.request.side_effect = [
+            _response(417, {"exc_type": "ValidationError"}),
+            _response(200, {"data": {"name": "DN-3", "docstatus": 0}}),
+            _response(417, {"exc_type": "ValidationError"}),
+            _response(202, {"message": "ok"}),
+        ]
+        with self.assertRaises(ERPNextClientError):
+            self.client.insert_and_submit("Delivery Note", {"custom_order_ref": "C"})
+        self.assertEqual([c.args[0] for c in self.session.request.call_args_list], ["POST", "POST", "PUT", "DELETE"])
+        self.assertIsNone(self.client._submit_on_insert)
+
+    def test_iter_resource_pages_by_modified_name_keyset(self):
+        self.session.request.side_effect = [
+            _response(200, {"data": [
+                {"name": "SO-1", "modified": "2024-01-01 10:00:00"},
+                {"name": "SO-2", "modified": "2024-01-01 10:00:00"},
+            ]}),
+            _response(200, {"data": [{"name": "SO-3", "modified": "2024-01-02 08:00:00"}]}),
+        ]
+
+        rows = list(self.client.iter_resource("Sales Order", [["docstatus", "=", 1]], ["name"], page_size=2, prefetch=True))
+
+        self.assertEqual([row["name"] for row in rows], ["SO-1", "SO-2", "SO-3"])
+        second = self.session.request.call_args_list[1].kwargs["params"]
+        self.assertNotIn("limit_start", second)
+        self.assertEqual(
+            json.loads(second["or_filters"]),
+            [["modified", ">", "2024-01-01 10:00:00"], ["name", ">", "SO-2"]],
+        )
+        self.assertIn(["modified", ">=", "2024-01-01 10:00:00"], json.loads(second["filters"]))
+
+    def test_item_reads_are_cached_revalidated_by_modified_and_invalidated(self):
+        item = {"name": "ITEM-1", "modified": "2024-01-01 10:00:00"}
+        self.session.request.side_effect = [
+            _response(200, {"data": item}),
+            _response(200, {"data": [{"modified": "2024-01-01 10:00:00"}]}),
+            _response(200, {"data": {**item, "item_name": "renamed"}}),
+        ]
+        cache = self.client.cache
+
+        self.assertEqual(self.client.get_item("ITEM-1"), item)
+        self.assertEqual(self.client.get_item("ITEM-1"), item)
+        self.assertEqual(self.session.request.call_count, 1)
+
+        # Expired but within the stale window: served stale, revalidated with a modified-only query.
+        with mock.patch("apps.erpnext.services.cache.time.time", return_value=time.time() + 3700):
+            self.assertEqual(self.client.get_item("ITEM-1"), item)
+        cache._executor.shutdown(wait=True)
+        self.assertEqual(self.session.request.call_count, 2)
+        self.assertIn("fields", self.session.request.call_args.kwargs["params"])
+
+        self.client.invalidate_cache("Item")
+        self.assertEqual(self.client.get_item("ITEM-1")["item_name"], "renamed")
+        self.assertEqual(
+            {k: cache.stats()[k] for k in ("local_hits", "stale_hits", "misses", "revalidated_unchanged")},
+            {"local_hits": 1, "stale_hits": 1, "misses": 2, "revalidated_unchanged": 1},
+        )
+
+    @override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False)
+    def test_get_client_is_rebuilt_when_the_secret_rotates(self):
+        credential = SimpleNamespace(erpnext_url="https://erp.example.com", api_key="k", api_secret="viejo")
+        client = get_client(credential)
+        self.assertIs(get_client(credential), client)
+
+        credential.api_secret = "nuevo"
+        rotated = get_client(credential)
+        self.assertIsNot(rotated, client)
+        self.assertEqual(rotated.api_secret, "nuevo")
+
+    def test_retry_state_decisions_are_shared_by_both_clients(self):
+        policy = RetryPolicy(max_attempts=2, backoff_base=0.01, backoff_max=5.0)
+        state = RetryState(policy, "POST", "/api/resource/Sales Order", throttled=True)
+        state.begin()
+        self.assertEqual(state.response(200, {}).action, RETURN)
+        self.assertEqual(state.response(417, {}).action, RAISE)
+        throttled = state.response(429, {"Retry-After": "3"})
+        # 429 no llegó a procesarse: se reenvía aunque sea un POST; la espera la hace el limiter.
+        self.assertEqual((throttled.action, throttled.safe, throttled.retry_after), (RETRY, True, 3.0))
+        self.assertEqual(state.next_delay(ERPNextClientError("x")), 0.0)
+        failed = state.response(502, {"Retry-After": "2"})
+        self.assertEqual((failed.action, failed.safe, failed.retry_after), (RETRY, False, None))
+        self.assertTrue(state.must_probe(failed, ERPNextClientError("x"), can_probe=True))
+        self.assertEqual(state.next_delay(ERPNextClientError("x")), 2.0)
+        state.begin()
+        with self.assertRaises(ERPNextClientError):
+            state.must_probe(state.transport_error(connect=True), ERPNextClientError("agotado"))
+
+    def test_parse_retry_after_accepts_http_dates(self):
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+class FakeFrappeServerTests(SimpleTestCase):
+    def test_client_round_trip_against_fake_site(self):
+        faults = FaultProfile(throttle_rate=0.3, retry_after=0, seed=7)
+        with FakeFrappeServer(faults=faults) as server:
+            server.seed_stock("ITEM-1", "Stores", 5)
+            for n in range(7):
+                server.seed("Sales Order", {"name": f"SO-{n}", "docstatus": 1})
+            with override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False):
+                client = ERPNextClient(
+                    server.credential(),
+                    retry_policy=RetryPolicy(max_attempts=10, backoff_base=0.001, backoff_max=0.001),
+                    resource_cache=ResourceCache(),
+                )
+
+            names = [row["name"] for row in client.iter_resource("Sales Order", [["docstatus", "=", 1]], page_size=3)]
+            dn = client.insert_and_submit(
+                "Delivery Note", {"items": [{"item_code": "ITEM-1", "warehouse": "Stores", "qty": 2}]}
+            )
+
+        self.assertEqual(sorted(names), [f"SO-{n}" for n in range(7)])
+        self.assertEqual(dn["docstatus"], 1)
+        self.assertEqual(server.docs["Bin"]["ITEM-1-Stores"]["actual_qty"], 3)
+        self.assertGreater(server.stats["status_429"], 0)
+
+    def test_stock_check_batches_bins_and_aggregates_repeated_items(self):
+        with FakeFrappeServer() as server:
+            for n in range(3):
+                server.seed_stock(f"ITEM-{n}", "Stores", 5)
+            with override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False):
+                client = ERPNextClient(server.credential(), resource_cache=ResourceCache())
+            executor = FulfillmentExecutor(client, GatewaySettings({}))
+            executor.STOCK_CHECK_CHUNK = 2
+
+            def line(item_code, qty):
+                return MappedOrderLineDTO(
+                    source_item_code=item_code,
+                    quantity=Decimal(qty),
+                    unit_price=Decimal("1"),
+                    target_item_code=item_code,
+                    warehouse="Stores",
+                )
+
+            executor.assign_serials([line("ITEM-0", "2"), line("ITEM-1", "5"), line("ITEM-2", "1"), line("ITEM-0", "3")])
+            self.assertEqual(server.stats["requests"], 2)
+
+            with self.assertRaisesMessage(BackorderPending, "ITEM-0"):
+                executor.assign_serials([line("ITEM-0", "3"), line("ITEM-1", "1"), line("ITEM-0", "3")])
+
+
+class InventoryMirrorTests(TestCase):
+    def test_delta_sync_answers_from_mirror_until_stale(self):
+        org_id = uuid.uuid4()
+        mirror = InventoryMirror(org_id, "Distribuidora", max_age=60)
+        key = ("ITEM-1", "Stores")
+        with FakeFrappeServer() as server:
+            server.seed_stock("ITEM-1", "Stores", 5)
+            server.seed_stock("ITEM-2", "Stores", 1)
+            with override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False):
+                client = ERPNextClient(server.credential(), resource_cache=ResourceCache())
+
+            self.assertIsNone(mirror.available([key]))
+            self.assertEqual(mirror.sync(client), 2)
+            self.assertEqual(mirror.available([key]), {key: Decimal("5")})
+
+            bin_doc = server.docs["Bin"]["ITEM-1-Stores"]
+            bin_doc.update(actual_qty=2, modified="9999-01-01 00:00:00")
+            mirror.sync(client)
+            self.assertEqual(mirror.available([key])[key], Decimal("2"))
+
+        # Un webhook atrasado no pisa un valor más nuevo.
+        mirror.apply_bins([{"item_code": "ITEM-1", "warehouse": "Stores", "actual_qty": 50, "modified": "2000-01-01"}])
+        self.assertEqual(mirror.available([key])[key], Decimal("2"))
+
+        with mock.patch("apps.erpnext.services.inventory.timezone.now", return_value=timezone.now() + timedelta(seconds=61)):
+            self.assertIsNone(mirror.available([key]))
+
+
+    def test_changed_bins_invalidate_cached_stock_reads(self):
+        org_id = uuid.uuid4()
+        ERPNextCredential.objects.create(
+            organization_id=org_id, erpnext_url="https://erp.example.com", company="Distribuidora", api_key="k", api_secret="s"
+        )
+        mirror = InventoryMirror(org_id, "Distribuidora")
+        row = {"item_code": "ITEM-1", "warehouse": "Stores", "actual_qty": 4, "modified": "2024-01-01"}
+        with mock.patch("apps.erpnext.services.inventory.invalidate_resource") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                mirror.apply_bins([row])
+            invalidate.assert_called_once_with("https://erp.example.com", "Bin")
+            # Sin cambios no hay nada que invalidar.
+            with self.captureOnCommitCallbacks(execute=True):
+                mirror.apply_bins([{**row, "modified": "2000-01-01"}])
+            self.assertEqual(invalidate.call_count, 1)
+
+
+class BinWebhookTests(TestCase):
+    def test_signature_selects_the_credential_and_its_company(self):
+        organization = Organization.objects.create(name="Hook", slug=f"hook-{uuid.uuid4().hex[:8]}")
+        other = Organization.objects.create(name="Otra", slug=f"otra-{uuid.uuid4().hex[:8]}")
+        for org, company, secret in ((organization, "Distribuidora", "s3cr3t"), (other, "Ajena", "ajeno")):
+            ERPNextCredential.objects.create(
+                organization_id=org.id,
+                erpnext_url="https://erp.example.com",
+                company=company,
+                api_key="k",
+                api_secret="s",
+                webhook_secret=secret,
+            )
+        body = json.dumps({"item_code": "ITEM-1", "warehouse": "Stores", "actual_qty": 7, "modified": "1"}).encode()
+
+        def post(secret, **extra):
+            signature = base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode()
+            url = reverse("erpnext:bin-webhook", kwargs={"organization_id": organization.id})
+            return self.client.post(
+                url + "?company=Ajena", body, content_type="application/json", HTTP_X_FRAPPE_WEBHOOK_SIGNATURE=signature, **extra
+            )
+
+        # El secreto de otra organización no sirve aquí.
+        self.assertEqual(post("ajeno").status_code, 403)
+        with mock.patch("apps.erpnext.services.inventory.invalidate_resource"):
+            self.assertEqual(post("s3cr3t").status_code, 202)
+        self.assertEqual(
+            list(InventoryLevel.objects.filter(organization_id=organization.id).values_list("company", flat=True)),
+            ["Distribuidora"],
+        )
+
+
+class ResourceCacheTests(SimpleTestCase):
+    def test_entries_are_per_api_key_and_bins_are_never_served_stale(self):
+        cache = ResourceCache()
+        calls = []
+
+        def fetch(value):
+            calls.append(value)
+            return {"data": value}
+
+        site = "https://erp.example.com/"
+        for api_key in ("a", "b", "a"):
+            key = ResourceCache.request_key("/api/resource/Item/ITEM-1", None, api_key)
+            cache.get_or_fetch(site, "Item", key, lambda: fetch(api_key))
+        self.assertEqual(calls, ["a", "b"])
+
+        key = ResourceCache.request_key("/api/resource/Bin", {"filters": "[]"}, "a")
+        cache.get_or_fetch(site, "Bin", key, lambda: fetch(1))
+        with mock.patch("apps.erpnext.services.cache.time.time", return_value=time.time() + cache.ttl_for("Bin") + 1):
+            self.assertEqual(cache.get_or_fetch(site, "Bin", key, lambda: fetch(2)), {"data": 2})
+        self.assertEqual(cache.stats()["stale_hits"], 0)
+
+
+class ReservationLedgerTests(TestCase):
+    def test_concurrent_orders_for_same_sku_are_admitted_once(self):
+        org_id = uuid.uuid4()
+        key = ("ITEM-1", "Stores")
+        first = ReservationLedger(org_id, "Distribuidora", "order-1")
+        second = ReservationLedger(org_id, "Distribuidora", "order-2", ttl=0)
+
+        self.assertEqual(first.reserve({key: Decimal("3")}, {key: 5}), [])
+        self.assertEqual(second.reserve({key: Decimal("3")}, {key: 5}), [key])
+        # Reintentar el mismo pedido no cuenta su propia reserva dos veces.
+        self.assertEqual(first.reserve({key: Decimal("3")}, {key: 5}), [])
+
+        first.release()
+        self.assertEqual(second.reserve({key: Decimal("3")}, {key: 5}), [])
+        # ttl=0: la reserva de order-2 ya expiró y no bloquea a order-1.
+        self.assertEqual(first.reserve({key: Decimal("5")}, {key: 5}), [])
+        self.assertEqual(first.commit(), 1)
+
+    def test_hold_committed_after_the_stock_read_still_counts(self):
+        org_id = uuid.uuid4()
+        key = ("ITEM-1", "Stores")
+        first = ReservationLedger(org_id, "Distribuidora", "order-1")
+        second = ReservationLedger(org_id, "Distribuidora", "order-2")
+        self.assertEqual(first.reserve({key: Decimal("3")}, {key: 5}), [])
+
+        # order-2 lee 5 en ERPNext; order-1 envía su DN y confirma antes de que order-2 reserve.
+        read_at = timezone.now()
+        first.commit()
+        self.assertEqual(second.reserve({key: Decimal("3")}, {key: 5}, read_at=read_at), [key])
+        # Una lectura posterior a la confirmación ya trae el stock descontado.
+        self.assertEqual(second.reserve({key: Decimal("2")}, {key: 2}, read_at=timezone.now()), [])
+
+
+class GatewaySettingsTests(SimpleTestCase):
+    def test_snapshot_is_shared_until_the_organization_changes(self):
+        gateway = {
+            "distributor_company": "Distribuidora",
+            "item_map": {"shopify": {"VENDEDOR": {"SKU-1": "ITEM-1"}, "*": {"SKU-2": {"target_item_code": "ITEM-2"}}}},
+            "sellers": {"shopify": {"company_selector": {"source": "tags", "prefix": "seller:", "domain_map": {"a.myshopify.com": "Tienda A"}}}},
+        }
+        saved_at = timezone.now()
+        organization = SimpleNamespace(id=uuid.uuid4(), metadata={"fulfillment_gateway": gateway}, updated_at=saved_at)
+
+        settings = GatewaySettings.for_organization(organization)
+        self.assertIs(GatewaySettings.for_organization(organization), settings)
+        lookup = settings.metadata_item_mapping
+        self.assertEqual(lookup(source="shopify", seller_company="vendedor", source_item_code="sku-1")["target_item_code"], "ITEM-1")
+        self.assertEqual(lookup(source="shopify", seller_company="Otro", source_item_code="SKU-2")["target_item_code"], "ITEM-2")
+        self.assertIsNone(lookup(source="shopify", seller_company="vendedor", source_item_code="SKU-2"))
+        self.assertEqual(settings.resolve_seller_company("shopify", {"tags": "vip, seller:Tienda B"}), "Tienda B")
+        self.assertEqual(settings.resolve_seller_company("shopify", {"_shopify_domain": "A.myshopify.com"}), "Tienda A")
+
+        organization.metadata = {"fulfillment_gateway": {**gateway, "distributor_company": "Otra"}}
+        # Sin guardar no se vuelve a leer la metadata; al guardar cambia updated_at.
+        self.assertIs(GatewaySettings.for_organization(organization), settings)
+        organization.updated_at = saved_at + timedelta(seconds=1)
+        self.assertEqual(GatewaySettings.for_organization(organization).distributor_company, "Otra")
+
+        # Sin updated_at (objetos armados a mano) la clave es el hash de la metadata.
+        del organization.updated_at
+        snapshot = GatewaySettings.for_organization(organization)
+        organization.metadata = {"fulfillment_gateway": gateway}
+        self.assertIsNot(GatewaySettings.for_organization(organization), snapshot)
+
+
+class NormalizedOrderReuseTests(SimpleTestCase):
+    def test_retry_loads_stored_order_until_payload_changes(self):
+        payload = {
+            "id": "5001",
+            "created_at": "2026-01-02T10:00:00-05:00",
+            "currency": "COP",
+            "line_items": ["nota", {"sku": "SKU-1", "quantity": 2, "price": "10.50", "title": "Uno"}],
+        }
+        fulfillment_order = FulfillmentOrder(
+            source="shopify",
+            order_id="5001",
+            seller_company="Vendedor",
+            distributor_company="Distribuidora",
+            payload=payload,
+        )
+        normalizer = OrderNormalizer(uuid.uuid4(), GatewaySettings({}))
+        first, reused = normalizer.normalize_stored(fulfillment_order)
+        self.assertFalse(reused)
+
+        # Lo que devuelve la base de datos es JSON.
+        fulfillment_order.normalized_order = json.loads(json.dumps(fulfillment_order.normalized_order))
+        with mock.patch("apps.erpnext.gateway.normalizer.parse_dt") as parse_dt:
+            second, reused = normalizer.normalize_stored(fulfillment_order)
+        self.assertTrue(reused)
+        parse_dt.assert_not_called()
+        self.assertEqual(second, first)
+        self.assertIs(second.lines[0].raw, payload["line_items"][1])
+
+        fulfillment_order.payload = {**payload, "line_items": payload["line_items"][1:]}
+        _, reused = normalizer.normalize_stored(fulfillment_order)
+        self.assertFalse(reused)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ItemMapIndexTests(TestCase):
+    def test_index_is_reused_until_an_item_map_changes(self):
+        org_id = uuid.uuid4()
+        cache = ItemMapIndexCache()
+
+        def item_map(code, target):
+            return FulfillmentItemMap(
+                organization_id=org_id,
+                source="shopify",
+                source_company="Vendedor",
+                source_item_code=code,
+                target_company="Distribuidora",
+                target_item_code=target,
+            )
+
+        FulfillmentItemMap.objects.bulk_create([item_map("SKU-1", "ITEM-1")])
+        index = cache.get(org_id, "shopify", "Vendedor")
+        self.assertEqual(index.lookup("sku-1").target_item_code, "ITEM-1")
+        with self.assertNumQueries(0):
+            self.assertIs(cache.get(org_id, "shopify", "Vendedor"), index)
+
+        with self.captureOnCommitCallbacks(execute=True), mock.patch(
+            "apps.erpnext.gateway.item_index._cache", cache
+        ):
+            item_map("SKU-2", "ITEM-2").save()
+        self.assertEqual(cache.get(org_id, "shopify", "Vendedor").lookup("SKU-2").target_item_code, "ITEM-2")
+        self.assertEqual(cache.builds, 2)
+
+
+class FulfillmentOrderUnitOfWorkTests(TestCase):
+    def test_upsert_keeps_progress_and_deferred_writes_flush_once(self):
+        def upsert(seller, payload):
+            return FulfillmentOrder.objects.upsert_for_processing(
+                organization_id=org_id,
+                source="shopify",
+                order_id="1001",
+                seller_company=seller,
+                distributor_company="Distribuidora",
+                payload=payload,
+            )
+
+        org_id = uuid.uuid4()
+        with self.assertNumQueries(1):
+            order = upsert("Vendedor", {"v": 1})
+        self.assertEqual((order.status, order.payload), (FulfillmentOrder.STATUS_PENDING, {"v": 1}))
+
+        with self.assertNumQueries(1):
+            with order.deferred_writes():
+                order.mark_status(FulfillmentOrder.STATUS_PROCESSING)
+                order.normalized_order = {"order_id": "1001"}
+                order.save(update_fields=["normalized_order", "updated_at"])
+                order.mark_status(FulfillmentOrder.STATUS_FAILED, error_code="x")
+
+        again = upsert("", {"v": 2})
+        self.assertEqual(again.pk, order.pk)
+        self.assertEqual(
+            (again.status, again.seller_company, again.payload, again.normalized_order),
+            (FulfillmentOrder.STATUS_FAILED, "Vendedor", {"v": 2}, {"order_id": "1001"}),
+        )
+
+
+@override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False)
+class CheckpointResumeTests(TestCase):
+    def test_retry_reuses_sales_order_left_by_crashed_attempt(self):
+        organization = Organization.objects.create(
+            name="Resume",
+            slug=f"resume-{uuid.uuid4().hex[:8]}",
+            metadata={"fulfillment_gateway": {"distributor_company": "Distribuidora", "default_warehouse": "Stores"}},
+        )
+        payload = {"id": "2001", "company": "Vendedor", "line_items": [{"sku": "ITEM-1", "quantity": 1, "price": "10"}]}
+        FulfillmentOrder.objects.create(
+            organization_id=organization.id,
+            source="shopify",
+            order_id="2001",
+            seller_company="Vendedor",
+            distributor_company="Distribuidora",
+            payload=payload,
+            status=FulfillmentOrder.STATUS_FAILED,
+            checkpoint=FulfillmentOrder.STEP_STOCK,
+        )
+        message = IntegrationMessage.objects.create(
+            organization_id=organization.id,
+            integration=IntegrationMessage.INTEGRATION_SHOPIFY,
+            direction=IntegrationMessage.DIRECTION_INBOUND,
+            payload=payload,
+        )
+
+        with FakeFrappeServer() as server:
+            server.seed_stock("ITEM-1", "Stores", 5)
+            # El intento anterior creó la SO y cayó antes de registrarla.
+            server.seed(
+                "Sales Order",
+                {"name": "SO-LEFT", "custom_order_ref": "2001", "customer": "Vendedor", "docstatus": 1},
+            )
+            ERPNextCredential.objects.create(
+                organization_id=organization.id,
+                erpnext_url=server.base_url,
+                company="Distribuidora",
+                api_key="resume",
+                api_secret="resume",
+            )
+            result = FulfillmentGatewayService(message).process()
+            sales_orders = list(server.docs["Sales Order"])
+
+        self.assertEqual((result["sales_order"], sales_orders), ("SO-LEFT", ["SO-LEFT"]))
+        order = FulfillmentOrder.objects.get(organization_id=organization.id, order_id="2001")
+        self.assertEqual(
+            (order.status, order.sales_order_name, order.checkpoint),
+            (FulfillmentOrder.STATUS_FULFILLED, "SO-LEFT", FulfillmentOrder.STEP_PROPAGATE),
+        )
+
+
+@override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False)
+class BulkFulfillmentEngineTests(TestCase):
+    def test_orders_share_one_stock_check_and_are_allocated_oldest_first(self):
+        organization = Organization.objects.create(
+            name="Bulk",
+            slug=f"bulk-{uuid.uuid4().hex[:8]}",
+            metadata={"fulfillment_gateway": {"distributor_company": "Distribuidora", "default_warehouse": "Stores"}},
+        )
+        orders = []
+        for index, qty in enumerate([2, 2, 2, 1]):
+            orders.append(
+                FulfillmentOrder.objects.create(
+                    organization_id=organization.id,
+                    source="shopify",
+                    order_id=f"100{index}",
+                    seller_company="Vendedor",
+                    distributor_company="Distribuidora",
+                    payload={"id": f"100{index}", "line_items": [{"sku": "ITEM-1", "quantity": qty, "price": "10"}]},
+                )
+            )
+            FulfillmentOrder.objects.filter(pk=orders[-1].pk).update(created_at=timezone.now() + timedelta(seconds=index))
+
+        with FakeFrappeServer() as server:
+            server.seed_stock("ITEM-1", "Stores", 5)
+            ERPNextCredential.objects.create(
+                organization_id=organization.id,
+                erpnext_url=server.base_url,
+                company="Distribuidora",
+                api_key="bulk",
+                api_secret="bulk",
+            )
+            engine = BulkFulfillmentEngine(organization, max_concurrency=2)
+            results = engine.run(engine.pending_orders())
+            requests_made = server.stats["requests"]
+
+        self.assertEqual(
+            [(result.order_id, result.status) for result in results],
+            [("1000", "fulfilled"), ("1001", "fulfilled"), ("1002", "waiting_stock"), ("1003", "fulfilled")],
+        )
+        # Un GET de Bins para los cuatro pedidos + SO y DN por cada pedido admitido.
+        self.assertEqual(requests_made, 1 + 3 * 2)
+        self.assertTrue(all(result.delivery_note for result in results if result.status == "fulfilled"))
+
+    def test_failed_delivery_note_keeps_the_sales_order_checkpoint_for_the_retry(self):
+        organization = Organization.objects.create(
+            name="BulkResume",
+            slug=f"bulk-resume-{uuid.uuid4().hex[:8]}",
+            metadata={"fulfillment_gateway": {"distributor_company": "Distribuidora", "default_warehouse": "Stores"}},
+        )
+        payload = {"id": "2100", "company": "Vendedor", "line_items": [{"sku": "ITEM-1", "quantity": 1, "price": "10"}]}
+        FulfillmentOrder.objects.create(
+            organization_id=organization.id,
+            source="shopify",
+            order_id="2100",
+            seller_company="Vendedor",
+            distributor_company="Distribuidora",
+            payload=payload,
+        )
+        message = IntegrationMessage.objects.create(
+            organization_id=organization.id,
+            integration=IntegrationMessage.INTEGRATION_SHOPIFY,
+            direction=IntegrationMessage.DIRECTION_INBOUND,
+            payload=payload,
+        )
+
+        with FakeFrappeServer() as server:
+            server.seed_stock("ITEM-1", "Stores", 5)
+            ERPNextCredential.objects.create(
+                organization_id=organization.id, erpnext_url=server.base_url, company="Distribuidora", api_key="r", api_secret="r"
+            )
+            engine = BulkFulfillmentEngine(organization)
+            with mock.patch.object(
+                FulfillmentExecutor, "insert_delivery_note", side_effect=ERPNextClientError("HTTP 502", status_code=502)
+            ):
+                results = engine.run(engine.pending_orders())
+            failed = FulfillmentOrder.objects.get(organization_id=organization.id, order_id="2100")
+
+            result = FulfillmentGatewayService(message).process()
+            sales_orders = list(server.docs["Sales Order"])
+
+        self.assertEqual(results[0].status, FulfillmentOrder.STATUS_FAILED)
+        self.assertEqual(failed.checkpoint, FulfillmentOrder.STEP_SALES_ORDER)
+        self.assertEqual(sales_orders, [failed.sales_order_name])
+        self.assertEqual(result["sales_order"], failed.sales_order_name)
+
+    def test_orders_held_by_another_run_are_skipped(self):
+        organization = Organization.objects.create(
+            name="Claim",
+            slug=f"claim-{uuid.uuid4().hex[:8]}",
+            metadata={"fulfillment_gateway": {"distributor_company": "Distribuidora", "default_warehouse": "Stores"}},
+        )
+        fulfillment_order = FulfillmentOrder.objects.create(
+            organization_id=organization.id,
+            source="shopify",
+            order_id="2000",
+            seller_company="Vendedor",
+            distributor_company="Distribuidora",
+            payload={"id": "2000", "line_items": [{"sku": "ITEM-1", "quantity": 1, "price": "10"}]},
+        )
+        stale = FulfillmentOrder.objects.get(pk=fulfillment_order.pk)
+        # Otra corrida lo tomó después de que este lote lo leyera como pendiente.
+        FulfillmentOrder.objects.filter(pk=fulfillment_order.pk).update(status=FulfillmentOrder.STATUS_PROCESSING)
+
+        with FakeFrappeServer() as server:
+            server.seed_stock("ITEM-1", "Stores", 5)
+            ERPNextCredential.objects.create(
+                organization_id=organization.id, erpnext_url=server.base_url, company="Distribuidora", api_key="c", api_secret="c"
+            )
+            results = BulkFulfillmentEngine(organization).run([stale])
+            requests_made = server.stats["requests"]
+
+        self.assertEqual((results[0].status, results[0].error_code), ("skipped", "already_claimed"))
+        self.assertEqual(requests_made, 0)
+
+    def test_service_and_bulk_runs_never_fulfill_the_same_order_twice(self):
+        organization = Organization.objects.create(
+            name="Interleave",
+            slug=f"interleave-{uuid.uuid4().hex[:8]}",
+            metadata={"fulfillment_gateway": {"distributor_company": "Distribuidora", "default_warehouse": "Stores"}},
+        )
+
+        def message(order_id):
+            payload = {"id": order_id, "company": "Vendedor", "line_items": [{"sku": "ITEM-1", "quantity": 1, "price": "10"}]}
+            return IntegrationMessage.objects.create(
+                organization_id=organization.id,
+                integration=IntegrationMessage.INTEGRATION_SHOPIFY,
+                direction=IntegrationMessage.DIRECTION_INBOUND,
+                payload=payload,
+            )
+
+        store_snapshot = FulfillmentGatewayService._store_mapping_snapshot
+        prepare = BulkFulfillmentEngine._prepare
+        seen = {}
+
+        def bulk_while_the_service_maps(service, snapshot):
+            # El servicio ya reclamó el pedido y aún no escribió nada de la unidad de trabajo.
+            stale = FulfillmentOrder.objects.get(pk=service.fulfillment_order.pk)
+            seen["bulk"] = BulkFulfillmentEngine(organization).run([stale])[0]
+            return store_snapshot(service, snapshot)
+
+        def service_while_the_bulk_prepares(engine, candidates, results):
+            seen["service"] = FulfillmentGatewayService(seen["message"]).process()
+            return prepare(engine, candidates, results)
+
+        with FakeFrappeServer() as server:
+            server.seed_stock("ITEM-1", "Stores", 5)
+            ERPNextCredential.objects.create(
+                organization_id=organization.id, erpnext_url=server.base_url, company="Distribuidora", api_key="i", api_secret="i"
+            )
+            with mock.patch.object(FulfillmentGatewayService, "_store_mapping_snapshot", bulk_while_the_service_maps):
+                first = FulfillmentGatewayService(message("2100")).process()
+
+            seen["message"] = message("2101")
+            pending = FulfillmentOrder.objects.create(
+                organization_id=organization.id,
+                source="shopify",
+                order_id="2101",
+                seller_company="Vendedor",
+                distributor_company="Distribuidora",
+                payload=seen["message"].payload,
+            )
+            with mock.patch.object(BulkFulfillmentEngine, "_prepare", service_while_the_bulk_prepares):
+                second = BulkFulfillmentEngine(organization).run([pending])[0]
+            sales_orders = [doc.get("custom_order_ref") for doc in server.docs["Sales Order"].values()]
+            delivery_notes = [doc.get("custom_order_ref") for doc in server.docs["Delivery Note"].values()]
+
+        self.assertEqual((seen["bulk"].status, seen["bulk"].error_code), ("skipped", "already_claimed"))
+        self.assertTrue(first["delivery_note"])
+        self.assertEqual(seen["service"]["status"], "already_claimed")
+        self.assertEqual(second.status, "fulfilled")
+        self.assertEqual(sorted(sales_orders), ["2100", "2101"])
+        self.assertEqual(sorted(delivery_notes), ["2100", "2101"])
+
+
+class BackorderWakeupTests(TestCase):
+    def test_stock_increase_wakes_only_affected_orders_oldest_first(self):
+        org_id = uuid.uuid4()
+        later = timezone.now() + timedelta(hours=1)
+        orders = {}
+        for index, (item_code, qty) in enumerate([("ITEM-1", 2), ("ITEM-1", 2), ("ITEM-1", 1), ("ITEM-2", 1)]):
+            order = FulfillmentOrder.objects.create(
+                organization_id=org_id,
+                source="shopify",
+                order_id=f"300{index}",
+                seller_company="Vendedor",
+                distributor_company="Distribuidora",
+                status=FulfillmentOrder.STATUS_WAITING_STOCK,
+                next_attempt_at=later,
+            )
+            order.created_at = timezone.now() + timedelta(seconds=index)
+            index_backorder(order, {(item_code, "Stores"): Decimal(qty)})
+            orders[order.order_id] = order
+
+        mirror = InventoryMirror(org_id, "Distribuidora")
+        with mock.patch("apps.erpnext.tasks.bulk_fulfill_distributor_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                mirror.apply_bins([{"item_code": "ITEM-1", "warehouse": "Stores", "actual_qty": 3, "modified": "1"}])
+
+        woken = {orders["3000"].pk, orders["3002"].pk}
+        delay.assert_called_once()
+        self.assertEqual(set(delay.call_args.kwargs["order_ids"]), {str(pk) for pk in woken})
+        brought_forward = set(FulfillmentOrder.objects.filter(next_attempt_at__lt=later).values_list("pk", flat=True))
+        self.assertEqual(brought_forward, woken)
+
+    @override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False)
+    def test_order_is_waiting_stock_in_the_database_before_it_is_indexed(self):
+        organization = Organization.objects.create(
+            name="Indexed",
+            slug=f"indexed-{uuid.uuid4().hex[:8]}",
+            metadata={"fulfillment_gateway": {"distributor_company": "Distribuidora", "default_warehouse": "Stores"}},
+        )
+        payload = {"id": "3100", "company": "Vendedor", "line_items": [{"sku": "ITEM-1", "quantity": 2, "price": "10"}]}
+        message = IntegrationMessage.objects.create(
+            organization_id=organization.id,
+            integration=IntegrationMessage.INTEGRATION_SHOPIFY,
+            direction=IntegrationMessage.DIRECTION_INBOUND,
+            payload=payload,
+        )
+        seen = []
+
+        def index(fulfillment_order, shortages):
+            # Lo que vería wake_backorders si el stock entrara justo ahora.
+            seen.append(FulfillmentOrder.objects.get(pk=fulfillment_order.pk).status)
+            index_backorder(fulfillment_order, shortages)
+
+        with FakeFrappeServer() as server:
+            server.seed_stock("ITEM-1", "Stores", 1)
+            ERPNextCredential.objects.create(
+                organization_id=organization.id,
+                erpnext_url=server.base_url,
+                company="Distribuidora",
+                api_key="indexed",
+                api_secret="indexed",
+            )
+            with mock.patch("apps.erpnext.gateway.service.index_backorder", side_effect=index):
+                with self.assertRaises(BackorderPending):
+                    FulfillmentGatewayService(message).process()
+
+        self.assertEqual(seen, [FulfillmentOrder.STATUS_WAITING_STOCK])
+
+    @override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False)
+    def test_sweep_checks_stock_once_per_distributor_and_defers_the_rest(self):
+        organization = Organization.objects.create(
+            name="Sweep",
+            slug=f"sweep-{uuid.uuid4().hex[:8]}",
+            metadata={"fulfillment_gateway": {"distributor_company": "Distribuidora", "backorder": {"retry_delay_seconds": 600}}},
+        )
+        orders = {}
+        for index, shortage in enumerate([("ITEM-1", 2), ("ITEM-1", 2), ("ITEM-2", 1), None]):
+            order = FulfillmentOrder.objects.create(
+                organization_id=organization.id,
+                source="shopify",
+                order_id=f"400{index}",
+                seller_company="Vendedor",
+                distributor_company="Distribuidora",
+                status=FulfillmentOrder.STATUS_WAITING_STOCK,
+                next_attempt_at=timezone.now() - timedelta(seconds=1),
+            )
+            order.created_at = timezone.now() + timedelta(seconds=index)
+            if shortage:
+                index_backorder(order, {(shortage[0], "Stores"): Decimal(shortage[1])})
+            orders[order.order_id] = order
+
+        with FakeFrappeServer() as server:
+            server.seed_stock("ITEM-1", "Stores", 3)
+            ERPNextCredential.objects.create(
+                organization_id=organization.id,
+                erpnext_url=server.base_url,
+                company="Distribuidora",
+                api_key="sweep",
+                api_secret="sweep",
+            )
+            with mock.patch("apps.erpnext.tasks.bulk_fulfill_distributor_task.delay") as delay:
+                stats = sweep_backorders()
+            requests_made = server.stats["requests"]
+
+        self.assertEqual((stats["claimed"], stats["requeued"], stats["deferred"]), (4, 2, 2))
+        self.assertEqual(requests_made, 1)
+        # Sin líneas indexadas (4003) se reencola para que el motor decida.
+        self.assertEqual(
+            set(delay.call_args.kwargs["order_ids"]), {str(orders["4000"].pk), str(orders["4003"].pk)}
+        )
+        self.assertEqual(FulfillmentOrder.objects.needing_retry().count(), 0)
+        deferred = FulfillmentOrder.objects.get(pk=orders["4001"].pk)
+        self.assertGreater(deferred.next_attempt_at, timezone.now() + timedelta(seconds=500))
+
+
+@override_settings(ERPNEXT_RATE_LIMIT_ENABLED=False)
+class StatusPropagationOutboxTests(TestCase):
+    def test_updates_are_grouped_per_site_and_missing_docs_retry(self):
+        org_id = uuid.uuid4()
+        with FakeFrappeServer() as server:
+            for company in ("Vendedor A", "Vendedor B"):
+                ERPNextCredential.objects.create(
+                    organization_id=org_id, erpnext_url=server.base_url, company=company, api_key="k", api_secret="s"
+                )
+            server.docs["Sales Invoice"]["SI-1"] = {"name": "SI-1", "docstatus": 1}
+            server.docs["Sales Invoice"]["SI-2"] = {"name": "SI-2", "docstatus": 1}
+            for company, docname in (("Vendedor A", "SI-1"), ("Vendedor B", "SI-2"), ("Vendedor B", "SI-404")):
+                enqueue_status_update(org_id, company, "Sales Invoice", docname, {"custom_fulfillment_status": "fulfilled"})
+            self.assertIsNotNone(propagation_lag())
+
+            stats = deliver_status_propagations()
+            requests_made = server.stats["requests"]
+            delivered = server.docs["Sales Invoice"]["SI-2"].get("custom_fulfillment_status")
+
+        self.assertEqual((stats["sent"], stats["retried"], requests_made), (2, 1, 1))
+        self.assertEqual(delivered, "fulfilled")
+        retry = StatusPropagation.objects.get(docname="SI-404")
+        self.assertEqual((retry.status, retry.attempts), (StatusPropagation.STATUS_PENDING, 1))
+        self.assertGreater(retry.next_attempt_at, timezone.now())
+
+    def test_rows_without_credential_retry_and_failures_match_the_doctype(self):
+        org_id = uuid.uuid4()
+        with FakeFrappeServer() as server:
+            ERPNextCredential.objects.create(
+                organization_id=org_id, erpnext_url=server.base_url, company="Vendedor A", api_key="k", api_secret="s"
+            )
+            server.docs["Sales Invoice"]["DOC-1"] = {"name": "DOC-1", "docstatus": 1}
+            # Mismo nombre en otro doctype que el sitio no tiene: solo esa fila se reintenta.
+            enqueue_status_update(org_id, "Vendedor A", "Sales Invoice", "DOC-1", {"custom_fulfillment_status": "fulfilled"})
+            enqueue_status_update(org_id, "Vendedor A", "Sales Order", "DOC-1", {"custom_fulfillment_status": "fulfilled"})
+            enqueue_status_update(org_id, "Vendedor C", "Sales Invoice", "SI-9", {"custom_fulfillment_status": "fulfilled"})
+
+            stats = deliver_status_propagations()
+
+        self.assertEqual((stats["sent"], stats["retried"], stats["failed"]), (1, 2, 0))
+        rows = {(row.doctype, row.docname): row for row in StatusPropagation.objects.filter(organization_id=org_id)}
+        self.assertEqual(rows[("Sales Invoice", "DOC-1")].status, StatusPropagation.STATUS_SENT)
+        for key in (("Sales Order", "DOC-1"), ("Sales Invoice", "SI-9")):
+            self.assertEqual((rows[key].status, rows[key].attempts), (StatusPropagation.STATUS_PENDING, 1))
+            self.assertGreater(rows[key].next_attempt_at, timezone.now())
+
+
+class AdaptiveRateLimiterTests(SimpleTestCase):
+    def test_rate_backs_off_on_429_and_recovers_additively(self):
+        config = RateLimitConfig(rate=10.0, min_rate=1.0, max_rate=12.0, burst=1.0, max_wait=0.5, increase=1.0)
+        limiter = AdaptiveRateLimiter("https://erp.example.com", config, use_redis=False)
+
+        limiter.feedback(status_code=429, latency=0.1)
+        limiter.feedback(status_code=429, latency=0.1)  # within cooldown: only one decrease
+        self.assertEqual(limiter.rate, 5.0)
+        limiter.feedback(status_code=200, latency=0.1)
+        self.assertEqual(limiter.rate, 6.0)
+
+        limiter.feedback(status_code=429, latency=0.1, retry_after=5)
+        with mock.patch("apps.erpnext.services.ratelimit.time.sleep") as sleep:
+            with self.assertRaises(RateLimitExceeded):
+                limiter.acquire()
+        sleep.assert_not_called()
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_identical_calls_share_one_execution(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(1)
+            return {"data": {"actual_qty": 3}}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("bin:ITEM-1", fetch))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while flight.followers < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"data": {"actual_qty": 3}}] * 5)
+        self.assertEqual(len({id(result) for result in results}), 5)
+
+
+class AsyncERPNextClientTests(SimpleTestCase):
+    def test_gather_is_bounded_per_downstream_and_retries(self):
+        in_flight = peak = 0
+        failed_once = set()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            name = request.url.path.rsplit("/", 1)[-1]
+            if name == "ITEM-3" and name not in failed_once:
+                failed_once.add(name)
+                return httpx.Response(503, headers={"Retry-After": "0"})
+            return httpx.Response(200, json={"data": {"name": name}})
+
+        limiter = AdaptiveRateLimiter("https://erp.example.com", RateLimitConfig(rate=10.0, max_rate=10.0, burst=20.0), use_redis=False)
+
+        async def run():
+            credential = SimpleNamespace(erpnext_url="https://erp.example.com", api_key="k", api_secret="s")
+            transport = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            async with AsyncERPNextClient(
+                credential, client=transport, max_concurrency=3, resource_cache=ResourceCache(), rate_limiter=limiter
+            ) as client:
+                docs = await asyncio.gather(*(client.get_doc("Item", f"ITEM-{i}") for i in range(10)))
+            await transport.aclose()
+            return docs
+
+        docs = asyncio.run(run())
+
+        self.assertEqual([doc["name"] for doc in docs], [f"ITEM-{i}" for i in range(10)])
+        self.assertLessEqual(peak, 3)
+        self.assertEqual(failed_once, {"ITEM-3"})
+        # El 503 pasó por el limitador compartido con el cliente síncrono.
+        self.assertLess(limiter.rate, 10.0)
+
+    def test_reads_share_the_cache_and_stats_stay_per_task(self):
+        calls = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"data": {"name": request.url.path.rsplit("/", 1)[-1]}})
+
+        async def task(client, name, count):
+            with collect_stats() as stats:
+                for _ in range(count):
+                    await client.get_doc("Sales Order", name)
+            return stats.calls
+
+        async def run():
+            credential = SimpleNamespace(erpnext_url="https://erp.example.com", api_key="k", api_secret="s")
+            transport = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            async with AsyncERPNextClient(credential, client=transport, resource_cache=cache, rate_limiter=None) as client:
+                per_task = await asyncio.gather(task(client, "SO-1", 1), task(client, "SO-2", 3))
+                await client.get_item("ITEM-1")
+                await client.get_item("ITEM-1")
+            await transport.aclose()
+            return per_task
+
+        cache = ResourceCache()
+        self.assertEqual(asyncio.run(run()), [1, 3])
+        self.assertEqual(calls.count("/api/resource/Item/ITEM-1"), 1)
+        self.assertEqual(cache.stats()["local_hits"], 1)
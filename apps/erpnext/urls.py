@@ -12,9 +12,15 @@ urlpatterns = [
     path("sales-orders/",views.SalesOrderListView.as_view(), name="sales-order-list"),
     path("actions/create-sales-invoices/",views.CreateSalesInvoicesView.as_view(), name="create-sales-invoices"),
     path("stock-levels/", views.StockLevelListView.as_view(), name="stock-level-list"),
+    path("cache-stats/", views.CacheStatsView.as_view(), name="cache-stats"),
     path(
         "organizations/<uuid:organization_id>/webhooks/pos-invoice/",
         ERPNextPOSWebhookView.as_view(),
         name="pos-invoice-webhook",
     ),
+    path(
+        "organizations/<uuid:organization_id>/webhooks/bin/",
+        views.BinWebhookView.as_view(),
+        name="bin-webhook",
+    ),
 ]
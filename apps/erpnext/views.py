@@ -1,12 +1,22 @@
+import base64
+import hashlib
+import hmac
 import logging
 import json
 
+from django.shortcuts import get_object_or_404
 from rest_framework import status
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apps.erpnext.gateway.settings import GatewaySettings
+from apps.organizations.models import Organization
+
 from .models import ERPNextCredential
-from .services import ERPNextClient, ERPNextClientError
+from .services import ERPNextClientError, get_client
+from .services.cache import get_resource_cache
+from .services.inventory import InventoryMirror
 from .serializers import ItemSerializer
 
 logger = logging.getLogger(__name__)
@@ -35,7 +45,7 @@ class ItemDetailView(APIView):
             )
 
         try:
-            client = ERPNextClient(credential=credential)
+            client = get_client(credential)
             item_data = client.get_item(item_code=item_code)
         except ERPNextClientError as e:
             logger.error("Failed to fetch item %s for org %s: %s", item_code, organization.id, e)
@@ -101,7 +111,7 @@ class SalesOrderListView(APIView):
             limit = int(request.query_params.get("limit", 20))
             offset = int(request.query_params.get("offset", 0))
 
-            client = ERPNextClient(credential=credential)
+            client = get_client(credential)
             orders_data = client.list_sales_orders(
                 filters=json.dumps(filters) if filters else None,
                 fields=fields,
@@ -176,8 +186,8 @@ class StockLevelListView(APIView):
             if warehouse:
                 query_filters.append(["warehouse", "=", warehouse])
 
-            client = ERPNextClient(credential=credential)
-            stock_data = client.get_stock_levels(filters=str(query_filters) if query_filters else None)
+            client = get_client(credential)
+            stock_data = client.get_stock_levels(filters=query_filters or None, cache=True)
 
         except ERPNextClientError as e:
             logger.error("Failed to fetch stock levels for org %s: %s", organization.id, e)
@@ -192,4 +202,53 @@ class StockLevelListView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        return Response(stock_data)
\ No newline at end of file
+        return Response(stock_data)
+
+
+class CacheStatsView(APIView):
+    """Hit/miss counters of this worker's ERPNext resource cache."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_resource_cache().stats())
+
+
+class BinWebhookView(APIView):
+    """Webhook de ERPNext (doctype Bin, on_update) que actualiza el espejo local de inventario.
+
+    ERPNext firma el cuerpo con el "Webhook Secret" en ``X-Frappe-Webhook-Signature``
+    (HMAC-SHA256 en base64). La firma se valida contra el ``webhook_secret`` de cada
+    credencial activa de la organización y los Bins se aplican a la compañía de la
+    credencial que firmó; sin secreto configurado se rechaza todo.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes: list = []
+
+    def post(self, request, organization_id, *args, **kwargs):
+        credential = self._signing_credential(organization_id, request)
+        if credential is None:
+            return Response({"detail": "Firma de webhook inválida."}, status=status.HTTP_403_FORBIDDEN)
+
+        organization = get_object_or_404(Organization, id=organization_id)
+        # La compañía sale de la credencial (o de la configuración), nunca de la petición.
+        company = credential.company or GatewaySettings.for_organization(organization).distributor_company
+        if not company:
+            return Response({"detail": "Compañía distribuidora no configurada."}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = request.data if isinstance(request.data, list) else [request.data]
+        applied = InventoryMirror(organization.id, company).apply_bins(row for row in rows if isinstance(row, dict))
+        return Response({"applied": applied}, status=status.HTTP_202_ACCEPTED)
+
+    @staticmethod
+    def _signing_credential(organization_id, request):
+        signature = request.headers.get("X-Frappe-Webhook-Signature", "")
+        if not signature:
+            return None
+        credentials = ERPNextCredential.objects.active().filter(organization_id=organization_id).exclude(webhook_secret="")
+        for credential in credentials:
+            digest = hmac.new(credential.webhook_secret.encode(), request.body, hashlib.sha256).digest()
+            if hmac.compare_digest(signature, base64.b64encode(digest).decode()):
+                return credential
+        return None
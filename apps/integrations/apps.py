@@ -3,4 +3,9 @@ from django.apps import AppConfig
 class IntegrationsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.integrations"
-    verbose_name = "Integrations"
\ No newline at end of file
+    verbose_name = "Integrations"
+
+    def ready(self) -> None:
+        super().ready()
+        from .router import registry
+        registry.freeze()
@@ -0,0 +1,27 @@
+"""Shared limits for async clients talking to downstream systems."""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import weakref
+from typing import Dict
+
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def downstream_semaphore(base_url: str, limit: int) -> asyncio.Semaphore:
+    """Semaphore shared by every async client of ``base_url`` on the running loop."""
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    key = base_url.rstrip("/").lower()
+    semaphore = per_loop.get(key)
+    if semaphore is None:
+        semaphore = per_loop[key] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+def http2_available() -> bool:
+    """httpx only speaks HTTP/2 when the optional ``h2`` package is installed."""
+    return importlib.util.find_spec("h2") is not None
@@ -45,13 +45,21 @@ class FulfillmentError(Exception):
 class BackorderPending(FulfillmentError):
     """Raised when fulfillment should wait for stock replenishment."""
 
-    def __init__(self, message: str = "Waiting for available serial numbers", *, status_code: int | None = 409):
+    def __init__(
+        self,
+        message: str = "Waiting for available serial numbers",
+        *,
+        status_code: int | None = 409,
+        shortages: dict | None = None,
+    ):
         super().__init__(
             message,
             error_code="waiting_stock",
             retryable=True,
             status_code=status_code,
         )
+        # (item_code, warehouse) -> cantidad requerida de las líneas sin stock.
+        self.shortages = shortages or {}
 
 
 class FulfillmentConfigurationError(FulfillmentError):
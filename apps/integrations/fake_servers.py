@@ -0,0 +1,391 @@
+"""In-process stand-ins for ERPNext (Frappe) and Alegra used by benchmarks and load tests.
+
+Both servers implement only the endpoints our clients call, keep documents in
+memory and can inject latency, 5xx errors and 429 throttling::
+
+    with FakeFrappeServer(faults=FaultProfile.parse("lognormal:40:0.5", error_rate=0.01)) as erp:
+        erp.seed_stock("ITEM-1", "Stores - D", 100)
+        client = ERPNextClient(erp.credential())
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+@dataclass
+class FaultProfile:
+    """Latency distribution plus error/throttle injection.
+
+    ``latency`` is ``fixed:MS``, ``uniform:MIN_MS:MAX_MS``, ``lognormal:MEDIAN_MS:SIGMA``
+    or ``exponential:MEAN_MS``. ``rate_limit`` (req/s, 0 = off) answers 429 with
+    ``Retry-After`` once the server-wide token bucket is empty; ``throttle_rate``
+    sends random 429s on top of that.
+    """
+
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    rate_limit: float = 0.0
+    retry_after: float = 1.0
+    seed: Optional[int] = None
+    _rng: random.Random = field(init=False, repr=False)
+    _bucket: List[float] = field(init=False, repr=False)
+    _lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+        self._bucket = [self.rate_limit, time.monotonic()]
+        kind, *params = self.latency.split(":")
+        if kind not in {"fixed", "uniform", "lognormal", "exponential"}:
+            raise ValueError(f"Distribución de latencia desconocida: {self.latency}")
+        self._kind, self._params = kind, [float(p) for p in params]
+
+    @classmethod
+    def parse(cls, latency: str = "fixed:0", **kwargs) -> "FaultProfile":
+        return cls(latency=latency, **kwargs)
+
+    def sample_latency(self) -> float:
+        with self._lock:
+            kind, p = self._kind, self._params
+            if kind == "fixed":
+                ms = p[0] if p else 0.0
+            elif kind == "uniform":
+                ms = self._rng.uniform(p[0], p[1])
+            elif kind == "lognormal":
+                ms = self._rng.lognormvariate(math.log(max(p[0], 1e-3)), p[1] if len(p) > 1 else 0.5)
+            else:
+                ms = self._rng.expovariate(1 / p[0]) if p and p[0] > 0 else 0.0
+        return max(ms, 0.0) / 1000
+
+    def fault(self) -> Optional[int]:
+        """Status code to inject for this request, if any."""
+        with self._lock:
+            if self.rate_limit > 0:
+                tokens, ts = self._bucket
+                now = time.monotonic()
+                tokens = min(self.rate_limit, tokens + (now - ts) * self.rate_limit)
+                if tokens < 1:
+                    self._bucket = [tokens, now]
+                    return 429
+                self._bucket = [tokens - 1, now]
+            if self.throttle_rate and self._rng.random() < self.throttle_rate:
+                return 429
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return 503
+        return None
+
+
+class _FakeServer:
+    """Threaded HTTP server with fault injection; subclasses implement ``route``."""
+
+    def __init__(self, *, host: str = "127.0.0.1", port: int = 0, faults: Optional[FaultProfile] = None) -> None:
+        self.faults = faults or FaultProfile()
+        self.stats: Counter = Counter()
+        self.latencies: List[float] = []
+        self._lock = threading.RLock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "_FakeServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def route(self, method: str, path: str, query: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers + body in one segment; avoids Nagle/delayed-ACK stalls on keep-alive.
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def _dispatch(self, method: str) -> None:
+                started = time.monotonic()
+                delay = server.faults.sample_latency()
+                if delay:
+                    time.sleep(delay)
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                parts = urlsplit(self.path)
+                query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                headers = {"Content-Type": "application/json"}
+
+                status = server.faults.fault()
+                if status == 429:
+                    payload = {"exc_type": "TooManyRequests"}
+                    headers["Retry-After"] = str(server.faults.retry_after)
+                elif status:
+                    payload = {"exc_type": "ServiceUnavailable"}
+                else:
+                    try:
+                        body = json.loads(raw) if raw else {}
+                    except ValueError:
+                        body = {}
+                    try:
+                        status, payload = server.route(method, unquote(parts.path), query, body)
+                    except Exception as exc:  # el fake no debe tumbar el hilo del servidor
+                        status, payload = 500, {"exc_type": exc.__class__.__name__, "exception": str(exc)}
+
+                encoded = json.dumps(payload, default=str).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+                with server._lock:
+                    server.stats["requests"] += 1
+                    server.stats[f"status_{status}"] += 1
+                    server.latencies.append(time.monotonic() - started)
+
+            def do_GET(self):  # noqa: N802 - http.server API
+                self._dispatch("GET")
+
+            def do_POST(self):  # noqa: N802
+                self._dispatch("POST")
+
+            def do_PUT(self):  # noqa: N802
+                self._dispatch("PUT")
+
+            def do_DELETE(self):  # noqa: N802
+                self._dispatch("DELETE")
+
+            def log_message(self, format, *args):
+                return
+
+        return Handler
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _matches(doc: dict, filters) -> bool:
+    if not filters:
+        return True
+    if isinstance(filters, dict):
+        filters = [[key, "=", value] for key, value in filters.items()]
+    for condition in filters:
+        field_name, op, value = condition[-3:]
+        current = doc.get(field_name)
+        if op == "=" and not current == value:
+            return False
+        if op == "!=" and not current != value:
+            return False
+        if op == "in" and current not in value:
+            return False
+        if op == "not in" and current in value:
+            return False
+        if op == "like" and str(value).strip("%") not in str(current or ""):
+            return False
+        if op in ("<", ">", "<=", ">="):
+            if current is None:
+                return False
+            compare = {"<": current < value, ">": current > value, "<=": current <= value, ">=": current >= value}
+            if not compare[op]:
+                return False
+    return True
+
+
+class FakeFrappeServer(_FakeServer):
+    """Frappe REST subset: ``/api/resource`` CRUD plus the methods ERPNextClient calls.
+
+    Submitting a Delivery Note decrements the matching Bin rows, so stock checks
+    behave like a real site during a run.
+    """
+
+    PREFIXES = {"Sales Order": "SO", "Delivery Note": "DN", "Sales Invoice": "SI"}
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.docs: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        self._names = count(1)
+
+    def credential(self, api_key: str = "fake", api_secret: str = "fake") -> SimpleNamespace:
+        """Credential-shaped object accepted by ERPNextClient/get_client."""
+        return SimpleNamespace(pk=f"fake-{id(self)}", erpnext_url=self.base_url, api_key=api_key, api_secret=api_secret)
+
+    # ---------- seeding ----------
+    def seed(self, doctype: str, doc: dict) -> dict:
+        with self._lock:
+            return self._insert(doctype, dict(doc))
+
+    def seed_stock(self, item_code: str, warehouse: str, qty: float, serials: int = 0) -> None:
+        self.seed("Bin", {"name": f"{item_code}-{warehouse}", "item_code": item_code, "warehouse": warehouse, "actual_qty": qty})
+        for n in range(serials):
+            self.seed(
+                "Serial No",
+                {"name": f"{item_code}-SN{n:05d}", "serial_no": f"{item_code}-SN{n:05d}", "item_code": item_code,
+                 "warehouse": warehouse, "status": "Available"},
+            )
+
+    # ---------- routing ----------
+    def route(self, method, path, query, body):
+        if path.startswith("/api/resource/"):
+            parts = path[len("/api/resource/"):].split("/", 1)
+            doctype, name = parts[0], (parts[1] if len(parts) > 1 else None)
+            with self._lock:
+                return self._resource(method, doctype, name, query, body)
+        if path.startswith("/api/method/"):
+            with self._lock:
+                return self._method(path[len("/api/method/"):], body)
+        return 404, {"exc_type": "DoesNotExistError"}
+
+    def _resource(self, method, doctype, name, query, body):
+        store = self.docs[doctype]
+        if method == "GET" and name is None:
+            return 200, {"data": self._list(doctype, query)}
+        if method == "POST" and name is None:
+            return 200, {"data": self._insert(doctype, body)}
+        if name not in store:
+            return 404, {"exc_type": "DoesNotExistError", "exception": f"{doctype} {name} not found"}
+        doc = store[name]
+        if method == "GET":
+            return 200, {"data": doc}
+        if method == "PUT":
+            submitting = body.get("docstatus") == 1 and doc.get("docstatus") != 1
+            if doc.get("docstatus") == 1 and body.get("docstatus") == 1:
+                return 417, {"exc_type": "ValidationError", "exception": "Document already submitted"}
+            doc.update(body)
+            doc["modified"] = _now()
+            if submitting:
+                self._on_submit(doctype, doc)
+            return 200, {"data": doc}
+        if method == "DELETE":
+            del store[name]
+            return 202, {"message": "ok"}
+        return 405, {"exc_type": "MethodNotAllowed"}
+
+    def _list(self, doctype, query):
+        filters = json.loads(query.get("filters") or "[]")
+        or_filters = json.loads(query.get("or_filters") or "[]")
+        fields = json.loads(query.get("fields") or '["name"]')
+        rows = [
+            doc
+            for doc in self.docs[doctype].values()
+            if _matches(doc, filters) and (not or_filters or any(_matches(doc, [f]) for f in or_filters))
+        ]
+        order_by = query.get("order_by") or "modified desc"
+        for clause in reversed([c.strip() for c in order_by.split(",")]):
+            key, _, direction = clause.partition(" ")
+            rows.sort(key=lambda d, k=key: (d.get(k) is None, d.get(k)), reverse=direction.strip().lower() == "desc")
+        start = int(query.get("limit_start") or 0)
+        length = int(query.get("limit_page_length") or 20)
+        rows = rows[start : start + length] if length else rows[start:]
+        if "*" in fields:
+            return [dict(doc) for doc in rows]
+        return [{f: doc.get(f) for f in fields} for doc in rows]
+
+    def _insert(self, doctype, doc):
+        name = doc.get("name") or f"{self.PREFIXES.get(doctype, doctype.replace(' ', '').upper())}-{next(self._names):05d}"
+        if name in self.docs[doctype]:
+            raise ValueError(f"Duplicate name {name}")
+        now = _now()
+        doc = {**doc, "name": name, "doctype": doctype, "creation": now, "modified": now}
+        doc.setdefault("docstatus", 0)
+        self.docs[doctype][name] = doc
+        if doc["docstatus"] == 1:
+            self._on_submit(doctype, doc)
+        return doc
+
+    def _on_submit(self, doctype, doc):
+        if doctype != "Delivery Note" or doc.get("is_return"):
+            return
+        for item in doc.get("items") or []:
+            bin_doc = self.docs["Bin"].get(f"{item.get('item_code')}-{item.get('warehouse')}")
+            if bin_doc is not None:
+                bin_doc["actual_qty"] = bin_doc.get("actual_qty", 0) - float(item.get("qty") or 0)
+                bin_doc["modified"] = _now()
+
+    def _method(self, method, body):
+        if method.endswith("make_sales_invoice"):
+            so = self.docs["Sales Order"].get(body.get("source_name"))
+            if so is None:
+                return 404, {"exc_type": "DoesNotExistError"}
+            items = [{**item, "sales_order": so["name"]} for item in so.get("items") or []]
+            return 200, {"message": {"doctype": "Sales Invoice", "customer": so.get("customer"),
+                                     "company": so.get("company"), "items": items}}
+        if method == "frappe.client.bulk_update":
+            failed = []
+            for doc in json.loads(body.get("docs") or "[]"):
+                doc = dict(doc)
+                doctype, name = doc.pop("doctype", None), doc.pop("docname", None)
+                status, payload = self._resource("PUT", doctype, name, {}, doc)
+                if status != 200:
+                    failed.append({"doc": {"doctype": doctype, "docname": name}, "exc": payload.get("exception")})
+            return 200, {"message": {"failed_docs": failed}}
+        return 404, {"exc_type": "DoesNotExistError", "exception": f"Method {method} not found"}
+
+
+class FakeAlegraServer(_FakeServer):
+    """Alegra subset: ``contacts`` (get/search/create) and ``invoices`` (create)."""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.contacts: Dict[str, dict] = {}
+        self.invoices: Dict[str, dict] = {}
+        self._ids = count(1)
+
+    def client_kwargs(self) -> dict:
+        """Keyword arguments for AlegraClient/AsyncAlegraClient (minus organization_id)."""
+        return {"base_url": self.base_url, "api_key": "fake", "api_secret": "fake", "timeout_s": 15, "max_retries": 0}
+
+    def route(self, method, path, query, body):
+        parts = [p for p in path.split("/") if p]
+        if parts and parts[0] == "api":
+            parts = parts[2:]  # /api/v1/...
+        if not parts:
+            return 404, {"message": "Not found"}
+        with self._lock:
+            if parts[0] == "contacts":
+                if method == "GET" and len(parts) == 2:
+                    contact = self.contacts.get(parts[1])
+                    return (200, contact) if contact else (404, {"message": "Contacto no encontrado"})
+                if method == "GET":
+                    needle = (query.get("query") or "").lower()
+                    return 200, [c for c in self.contacts.values() if needle in json.dumps(c).lower()]
+                if method == "POST":
+                    contact = {**body, "id": str(next(self._ids))}
+                    self.contacts[contact["id"]] = contact
+                    return 201, contact
+            if parts[0] == "invoices" and method == "POST":
+                if not body.get("client"):
+                    return 400, {"message": "El cliente es obligatorio", "code": 400}
+                invoice = {**body, "id": str(next(self._ids)), "numberTemplate": {"fullNumber": f"FV-{uuid.uuid4().hex[:6]}"}}
+                self.invoices[invoice["id"]] = invoice
+                return 201, invoice
+        return 404, {"message": "Not found"}
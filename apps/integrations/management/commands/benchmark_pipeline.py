@@ -0,0 +1,440 @@
+import base64
+import contextlib
+import hashlib
+import hmac
+import io
+import json
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from apps.alegra.models import AlegraCredential
+from apps.erpnext.gateway import process_fulfillment_message
+from apps.erpnext.models import ERPNextCredential, StatusPropagation
+from apps.erpnext.services.propagation import deliver_status_propagations
+from apps.integrations.fake_servers import FakeAlegraServer, FakeFrappeServer, FaultProfile
+from apps.integrations.models import FulfillmentOrder, IntegrationMessage
+from apps.integrations.router import registry
+from apps.organizations.models import Organization
+from apps.shopify.models import ShopifyStore
+
+SCENARIOS = ("shopify", "erpnext", "pos")
+SHOPIFY_TOPIC = "orders/paid"
+DISTRIBUTOR = "Distribuidora Bench"
+SELLER = "Tienda Bench"
+WAREHOUSE = "Stores - BENCH"
+
+# Métricas comparadas contra el baseline: (ruta, True si más alto es mejor).
+COMPARED_METRICS = (
+    (("msgs_per_sec",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p99"), False),
+    (("db_queries_per_message",), False),
+    (("http_calls_per_message", "total"), False),
+)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+class Command(BaseCommand):
+    help = (
+        "Pushes synthetic Shopify orders and ERPNext invoices through the real webhook -> IntegrationMessage -> "
+        "process_integration_message -> EventBus -> gateway path against fake ERPNext/Alegra servers and "
+        "reports msgs/sec, p50/p99 latency, DB queries and HTTP calls per message."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=100, help="Messages per scenario.")
+        parser.add_argument(
+            "--scenarios",
+            default=",".join(SCENARIOS),
+            help="shopify (orders/paid -> fulfillment), erpnext (sales_invoice.submit -> fulfillment), "
+            "pos (pos_invoice.on_submit -> Alegra).",
+        )
+        parser.add_argument("--lines", type=int, default=3, help="Lines per order/invoice.")
+        parser.add_argument("--concurrency", type=int, default=1, help="Webhook requests in flight.")
+        parser.add_argument("--warmup", type=int, default=5, help="Unmeasured messages per scenario.")
+        parser.add_argument(
+            "--latency",
+            default="fixed:20",
+            help="Fake downstream latency: fixed:MS | uniform:MIN:MAX | lognormal:MEDIAN_MS:SIGMA | exponential:MEAN_MS",
+        )
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--throttle-rate", type=float, default=0.0)
+        parser.add_argument("--output", help="Write the results as JSON to this path.")
+        parser.add_argument("--baseline", help="JSON from a previous run to compare against.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.10,
+            help="Relative change against the baseline reported as a regression (0.10 = 10%%).",
+        )
+        parser.add_argument("--fail-on-regression", action="store_true")
+        parser.add_argument("--keep-data", action="store_true", help="Do not delete the benchmark organization.")
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options["scenarios"].split(",") if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+        if options["concurrency"] > 1 and connection.vendor == "sqlite":
+            raise CommandError("--concurrency > 1 requiere PostgreSQL; SQLite serializa las escrituras.")
+        baseline = self._load_baseline(options["baseline"]) if options["baseline"] else None
+
+        def faults():
+            return FaultProfile.parse(
+                options["latency"],
+                error_rate=options["error_rate"],
+                throttle_rate=options["throttle_rate"],
+            )
+
+        erpnext = FakeFrappeServer(faults=faults())
+        alegra = FakeAlegraServer(faults=faults())
+        for n in range(options["lines"]):
+            erpnext.seed_stock(f"ITEM-{n}", WAREHOUSE, 10_000_000)
+        erpnext.start()
+        alegra.start()
+
+        # Las tareas corren inline para que cada request mida el camino completo.
+        from core.celery import app as celery_app
+
+        previous_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        overrides = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            ERPNEXT_RATE_LIMIT_ENABLED=False,
+        )
+        overrides.enable()
+        fixtures = self._create_fixtures(erpnext, alegra)
+        # Shopify aún no tiene una ruta de producción hacia el gateway; el benchmark la registra
+        # para medir el camino de fulfillment con payloads de Shopify.
+        registry.register(IntegrationMessage.INTEGRATION_SHOPIFY, SHOPIFY_TOPIC.replace("/", "."), process_fulfillment_message)
+
+        results = {}
+        try:
+            for scenario in scenarios:
+                results[scenario] = self._run_scenario(scenario, fixtures, erpnext, alegra, options)
+        finally:
+            celery_app.conf.task_always_eager = previous_eager
+            if not options["keep_data"]:
+                self._delete_fixtures(fixtures)
+            overrides.disable()
+            erpnext.stop()
+            alegra.stop()
+
+        report = {
+            "timestamp": datetime.now(dt_timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "database": connection.vendor,
+            "config": {
+                key: options[key]
+                for key in ("messages", "lines", "concurrency", "warmup", "latency", "error_rate", "throttle_rate")
+            },
+            "scenarios": results,
+        }
+        self._print_report(report)
+        if options["output"]:
+            path = Path(options["output"])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, indent=2, sort_keys=True))
+            self.stdout.write(f"Resultados guardados en {path}")
+        if baseline:
+            regressions = self._compare(report, baseline, options["tolerance"])
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} regresiones frente al baseline.")
+
+    # ------------------------------------------------------------------
+    # Fixtures
+    # ------------------------------------------------------------------
+    def _create_fixtures(self, erpnext, alegra):
+        suffix = uuid.uuid4().hex[:8]
+        domain = f"bench-{suffix}.myshopify.com"
+        organization = Organization.objects.create(
+            name=f"Benchmark {suffix}",
+            slug=f"benchmark-{suffix}",
+            metadata={
+                "fulfillment_gateway": {
+                    "distributor_company": DISTRIBUTOR,
+                    "default_warehouse": WAREHOUSE,
+                    "default_seller_company": SELLER,
+                    "sellers": {"shopify": {"company_selector": {"domain_map": {domain: SELLER}}}},
+                }
+            },
+        )
+        for company in (DISTRIBUTOR, SELLER):
+            ERPNextCredential.objects.create(
+                organization_id=organization.id,
+                erpnext_url=erpnext.base_url,
+                company=company,
+                api_key=f"bench-{suffix}",
+                api_secret="bench",
+            )
+        AlegraCredential.objects.create(
+            organization_id=organization.id,
+            name="Benchmark",
+            email="bench@example.com",
+            token="bench",
+            base_url=f"{alegra.base_url}/api/v1",
+            timeout_s=15,
+            max_retries=0,
+        )
+        store = ShopifyStore.objects.create(
+            organization_id=organization.id,
+            shopify_domain=domain,
+            webhook_shared_secret=uuid.uuid4().hex,
+        )
+        return {"organization": organization, "store": store, "suffix": suffix}
+
+    @staticmethod
+    def _delete_fixtures(fixtures):
+        organization_id = fixtures["organization"].id
+        IntegrationMessage.objects.filter(organization_id=organization_id).delete()
+        FulfillmentOrder.objects.filter(organization_id=organization_id).delete()
+        StatusPropagation.objects.filter(organization_id=organization_id).delete()
+        ERPNextCredential.objects.filter(organization_id=organization_id).delete()
+        AlegraCredential.objects.filter(organization_id=organization_id).delete()
+        fixtures["store"].delete()
+        fixtures["organization"].delete()
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+    def _build_request(self, scenario, index, fixtures, lines, erpnext):
+        organization = fixtures["organization"]
+        reference = f"{scenario.upper()}-{fixtures['suffix']}-{index}"
+        if scenario == "shopify":
+            store = fixtures["store"]
+            body = json.dumps(
+                {
+                    "id": reference,
+                    "name": f"#{index}",
+                    "email": f"cliente{index}@example.com",
+                    "currency": "COP",
+                    "created_at": "2024-01-01T10:00:00-05:00",
+                    "processed_at": "2024-01-01T10:00:00-05:00",
+                    "total_price": str(10 * lines),
+                    "line_items": [
+                        {"sku": f"ITEM-{n}", "title": f"Item {n}", "quantity": 1, "price": "10.00"}
+                        for n in range(lines)
+                    ],
+                }
+            ).encode()
+            signature = base64.b64encode(
+                hmac.new(store.webhook_shared_secret.encode("utf-8"), body, hashlib.sha256).digest()
+            ).decode()
+            headers = {
+                "HTTP_X_SHOPIFY_SHOP_DOMAIN": store.shopify_domain,
+                "HTTP_X_SHOPIFY_TOPIC": SHOPIFY_TOPIC,
+                "HTTP_X_SHOPIFY_WEBHOOK_ID": uuid.uuid4().hex,
+                "HTTP_X_SHOPIFY_HMAC_SHA256": signature,
+            }
+            return reverse("shopify:webhook"), body, headers
+
+        items = [
+            {"item_code": f"ITEM-{n}", "item_name": f"Item {n}", "qty": 1, "rate": 10, "amount": 10}
+            for n in range(lines)
+        ]
+        payload = {
+            "name": reference,
+            "company": SELLER,
+            "customer": f"CUST-{index}",
+            "customer_name": f"Cliente {index}",
+            "contact_email": f"cliente{index}@example.com",
+            "tax_id": f"900{index:06d}",
+            "custom_document_type": "NIT",
+            "posting_date": "2024-01-01",
+            "grand_total": 10 * lines,
+            "items": items,
+            "payments": [{"mode_of_payment": "Cash", "amount": 10 * lines}],
+        }
+        if scenario == "pos":
+            payload.update({"doctype": "POS Invoice", "event": "on_submit"})
+        else:
+            payload.update({"doctype": "Sales Invoice", "event": "sales_invoice.submit"})
+            # La factura del vendedor existe en ERPNext para que la propagación de estado la actualice.
+            erpnext.seed("Sales Invoice", {"name": reference, "company": SELLER, "docstatus": 1})
+        url = reverse("erpnext:pos-invoice-webhook", kwargs={"organization_id": organization.id})
+        return url, json.dumps(payload).encode(), {}
+
+    def _run_scenario(self, scenario, fixtures, erpnext, alegra, options):
+        lines = options["lines"]
+        samples = []
+        samples_lock = threading.Lock()
+        local = threading.local()
+
+        def send(index, measure=True):
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = Client()
+            url, body, headers = self._build_request(scenario, index, fixtures, lines, erpnext)
+            with CaptureQueriesContext(connections["default"]) as queries:
+                started = time.perf_counter()
+                response = client.post(url, data=body, content_type="application/json", **headers)
+                elapsed = time.perf_counter() - started
+            if measure:
+                with samples_lock:
+                    samples.append((elapsed, len(queries), response.status_code))
+
+        def worker(indexes):
+            try:
+                for index in indexes:
+                    send(index)
+            finally:
+                connections.close_all()
+
+        # El código del pipeline imprime trazas por cada paso; se silencian para no medir la consola.
+        with contextlib.redirect_stdout(io.StringIO()):
+            for index in range(options["warmup"]):
+                send(-1 - index, measure=False)
+            erpnext_before = erpnext.stats["requests"]
+            alegra_before = alegra.stats["requests"]
+            started_at = datetime.now(dt_timezone.utc)
+            started = time.perf_counter()
+            concurrency = max(1, options["concurrency"])
+            if concurrency == 1:
+                for index in range(options["messages"]):
+                    send(index)
+            else:
+                chunks = [range(offset, options["messages"], concurrency) for offset in range(concurrency)]
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    list(pool.map(worker, chunks))
+            wall = time.perf_counter() - started
+            # El estado al vendedor sale por el outbox: se drena fuera del tiempo medido, sus llamadas sí cuentan.
+            propagation_before = erpnext.stats["requests"]
+            propagation = deliver_status_propagations(limit=max(500, options["messages"]))
+            propagation_calls = erpnext.stats["requests"] - propagation_before
+
+        count = len(samples) or 1
+        latencies = [sample[0] * 1000 for sample in samples]
+        erpnext_calls = erpnext.stats["requests"] - erpnext_before
+        alegra_calls = alegra.stats["requests"] - alegra_before
+        return {
+            "messages": len(samples),
+            "wall_seconds": round(wall, 3),
+            "msgs_per_sec": round(len(samples) / wall, 2) if wall else 0.0,
+            "latency_ms": {
+                "mean": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+                "p50": round(_percentile(latencies, 50), 2),
+                "p90": round(_percentile(latencies, 90), 2),
+                "p99": round(_percentile(latencies, 99), 2),
+                "max": round(max(latencies, default=0.0), 2),
+            },
+            "db_queries_per_message": round(sum(sample[1] for sample in samples) / count, 2),
+            "http_calls_per_message": {
+                "erpnext": round(erpnext_calls / count, 2),
+                "alegra": round(alegra_calls / count, 2),
+                "total": round((erpnext_calls + alegra_calls) / count, 2),
+            },
+            "http_status": dict(Counter(str(sample[2]) for sample in samples)),
+            "propagation": {
+                "sent": propagation["sent"],
+                "failed": propagation["failed"],
+                "http_calls": propagation_calls,
+                "lag_seconds": propagation["lag_seconds"],
+            },
+            "outcomes": self._outcomes(scenario, fixtures, started_at),
+        }
+
+    @staticmethod
+    def _outcomes(scenario, fixtures, since):
+        integration = (
+            IntegrationMessage.INTEGRATION_SHOPIFY if scenario == "shopify" else IntegrationMessage.INTEGRATION_ERPNEXT_POS
+        )
+        messages = (
+            IntegrationMessage.objects.filter(
+                organization_id=fixtures["organization"].id,
+                integration=integration,
+                received_at__gte=since,
+            )
+            .values("event_type", "status")
+            .annotate(total=Count("id"))
+        )
+        outcomes = defaultdict(int)
+        for row in messages:
+            if scenario == "pos" and row["event_type"] != "pos_invoice.on_submit":
+                continue
+            if scenario == "erpnext" and row["event_type"] == "pos_invoice.on_submit":
+                continue
+            outcomes[row["status"]] += row["total"]
+        return dict(outcomes)
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def _print_report(self, report):
+        self.stdout.write(
+            f"{'scenario':<10} {'msgs/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8} {'erpnext':>8} {'alegra':>7}  outcomes"
+        )
+        for name, result in report["scenarios"].items():
+            calls = result["http_calls_per_message"]
+            self.stdout.write(
+                f"{name:<10} {result['msgs_per_sec']:>8.2f} {result['latency_ms']['p50']:>9.1f} "
+                f"{result['latency_ms']['p99']:>9.1f} {result['db_queries_per_message']:>8.1f} "
+                f"{calls['erpnext']:>8.1f} {calls['alegra']:>7.1f}  {result['outcomes']}"
+            )
+
+    @staticmethod
+    def _load_baseline(path):
+        try:
+            return json.loads(Path(path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"No se pudo leer el baseline {path}: {exc}") from exc
+
+    def _compare(self, report, baseline, tolerance):
+        regressions = []
+        self.stdout.write(f"\nComparación contra baseline {baseline.get('commit') or baseline.get('timestamp', '')}:")
+        for name, result in report["scenarios"].items():
+            previous = (baseline.get("scenarios") or {}).get(name)
+            if not previous:
+                self.stdout.write(f"  {name}: sin datos en el baseline")
+                continue
+            for path, higher_is_better in COMPARED_METRICS:
+                current, before = result, previous
+                for key in path:
+                    current = (current or {}).get(key) if isinstance(current, dict) else None
+                    before = (before or {}).get(key) if isinstance(before, dict) else None
+                if current is None or before is None:
+                    continue
+                change = (current - before) / before if before else 0.0
+                worse = -change if higher_is_better else change
+                flag = ""
+                if worse > tolerance:
+                    flag = "  REGRESIÓN"
+                    regressions.append((name, ".".join(path)))
+                elif -worse > tolerance:
+                    flag = "  mejora"
+                self.stdout.write(f"  {name:<10} {'.'.join(path):<26} {before:>10} -> {current:<10} {change:+.1%}{flag}")
+        return regressions
@@ -0,0 +1,58 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from apps.integrations.fake_servers import FakeAlegraServer, FakeFrappeServer, FaultProfile
+
+
+class Command(BaseCommand):
+    help = "Runs local ERPNext (Frappe) and Alegra stand-ins with configurable latency, errors and 429s."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--erpnext-port", type=int, default=8001)
+        parser.add_argument("--alegra-port", type=int, default=8002)
+        parser.add_argument(
+            "--latency",
+            default="fixed:0",
+            help="fixed:MS | uniform:MIN:MAX | lognormal:MEDIAN_MS:SIGMA | exponential:MEAN_MS",
+        )
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered 503.")
+        parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered 429.")
+        parser.add_argument("--rate-limit", type=float, default=0.0, help="Server-side req/s before 429 (0 = off).")
+        parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429.")
+        parser.add_argument("--seed-items", type=int, default=20, help="Items ITEM-0..N seeded with stock.")
+        parser.add_argument("--warehouse", default="Stores - FAKE")
+        parser.add_argument("--stock", type=float, default=1000)
+
+    def handle(self, *args, **options):
+        def faults():
+            return FaultProfile.parse(
+                options["latency"],
+                error_rate=options["error_rate"],
+                throttle_rate=options["throttle_rate"],
+                rate_limit=options["rate_limit"],
+                retry_after=options["retry_after"],
+            )
+
+        erpnext = FakeFrappeServer(host=options["host"], port=options["erpnext_port"], faults=faults())
+        alegra = FakeAlegraServer(host=options["host"], port=options["alegra_port"], faults=faults())
+        for n in range(options["seed_items"]):
+            erpnext.seed("Item", {"name": f"ITEM-{n}", "item_code": f"ITEM-{n}", "item_name": f"Item {n}"})
+            erpnext.seed_stock(f"ITEM-{n}", options["warehouse"], options["stock"])
+
+        erpnext.start()
+        alegra.start()
+        self.stdout.write(f"ERPNext fake: {erpnext.base_url}")
+        self.stdout.write(f"Alegra fake:  {alegra.base_url}")
+
+        stop = threading.Event()
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        stop.wait()
+
+        erpnext.stop()
+        alegra.stop()
+        for label, server in (("ERPNext", erpnext), ("Alegra", alegra)):
+            self.stdout.write(f"{label}: {dict(server.stats)}")
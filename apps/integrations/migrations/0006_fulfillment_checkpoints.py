@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("integrations", "0005_add_return_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fulfillmentorder",
+            name="checkpoint",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("normalize", "Normalize"),
+                    ("map", "Map"),
+                    ("stock", "Stock"),
+                    ("sales_order", "Sales Order"),
+                    ("delivery_note", "Delivery Note"),
+                    ("submit", "Submit"),
+                    ("propagate", "Propagate"),
+                ],
+                max_length=32,
+            ),
+        ),
+        migrations.AddField(
+            model_name="fulfillmentorder",
+            name="checkpoint_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
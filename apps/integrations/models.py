@@ -1,12 +1,17 @@
 import json
 import uuid
+from contextlib import contextmanager
 from datetime import timedelta
 
 from django.contrib.postgres.indexes import GinIndex
 from django.core.exceptions import ValidationError
-from django.db import models, transaction
+from django.db import connections, models, router, transaction
+from django.dispatch import Signal
 from django.utils import timezone
 
+# Sent with ``scopes``: set of (organization_id, source, source_company) whose item maps changed.
+fulfillment_item_map_changed = Signal()
+
 class IntegrationMessageQuerySet(models.QuerySet):
     def for_company(self, company_id):
         return self.filter(organization_id=company_id)
@@ -238,10 +243,48 @@ class IntegrationMessage(models.Model):
         base = 5 * (2 ** min(retries, 6))
         return min(base, 3600)
     
+SCOPE_FIELDS = ("organization_id", "source", "source_company")
+
+
+def _item_map_scopes_changed(scopes) -> None:
+    scopes = {scope for scope in scopes if all(scope)}
+    if scopes:
+        # Tras el commit: otro proceso no debe recompilar con datos aún no visibles.
+        transaction.on_commit(lambda: fulfillment_item_map_changed.send(sender=FulfillmentItemMap, scopes=scopes))
+
+
 class FulfillmentItemMapQuerySet(models.QuerySet):
     def active(self):
         return self.filter(is_active=True)
 
+    # Las operaciones masivas no disparan post_save/post_delete: avisar a los índices compilados.
+    def update(self, **kwargs):
+        pks = list(self.values_list("pk", flat=True))
+        scopes = set(self.model.objects.filter(pk__in=pks).values_list(*SCOPE_FIELDS))
+        updated = super().update(**kwargs)
+        if set(kwargs) & set(SCOPE_FIELDS):
+            scopes |= set(self.model.objects.filter(pk__in=pks).values_list(*SCOPE_FIELDS))
+        _item_map_scopes_changed(scopes)
+        return updated
+
+    def delete(self):
+        scopes = set(self.values_list(*SCOPE_FIELDS))
+        result = super().delete()
+        _item_map_scopes_changed(scopes)
+        return result
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        _item_map_scopes_changed(obj.scope for obj in created)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        scopes = set(self.model.objects.filter(pk__in=[obj.pk for obj in objs]).values_list(*SCOPE_FIELDS))
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        _item_map_scopes_changed(scopes | {obj.scope for obj in objs})
+        return updated
+
     def for_source(self, *, organization_id, source: str, source_company: str):
         return (
             self.active()
@@ -285,6 +328,28 @@ class FulfillmentItemMap(models.Model):
             ),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(name in field_names for name in SCOPE_FIELDS):
+            instance._loaded_scope = instance.scope
+        return instance
+
+    @property
+    def scope(self):
+        return (self.organization_id, self.source, self.source_company)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _item_map_scopes_changed({self.scope, getattr(self, "_loaded_scope", self.scope)})
+        self._loaded_scope = self.scope
+
+    def delete(self, *args, **kwargs):
+        scope = self.scope
+        result = super().delete(*args, **kwargs)
+        _item_map_scopes_changed({scope})
+        return result
+
     def __str__(self) -> str:  # pragma: no cover - debug aid
         return (
             f"{self.organization_id} · {self.source}/{self.source_company}:{self.source_item_code}"
@@ -302,6 +367,56 @@ class FulfillmentOrderQuerySet(models.QuerySet):
             models.Q(next_attempt_at__isnull=True) | models.Q(next_attempt_at__lte=now)
         )
 
+    def upsert_for_processing(
+        self,
+        *,
+        organization_id,
+        source: str,
+        order_id: str,
+        seller_company: str,
+        distributor_company: str,
+        payload: dict,
+    ) -> "FulfillmentOrder":
+        """Create or refresh the order row in one ``INSERT ... ON CONFLICT DO UPDATE ... RETURNING``.
+
+        On conflict only the payload and the non-empty companies are replaced;
+        status, documents and counters of an existing order are kept.
+        """
+        model = self.model
+        connection = connections[router.db_for_write(model)]
+        quote = connection.ops.quote_name
+        now = timezone.now()
+        candidate = model(
+            organization_id=organization_id,
+            source=source,
+            order_id=order_id,
+            seller_company=seller_company or "",
+            distributor_company=distributor_company or "",
+            payload=payload,
+            status=model.STATUS_PENDING,
+            created_at=now,
+            updated_at=now,
+        )
+        fields = [field for field in model._meta.concrete_fields]
+        params = [field.get_db_prep_save(getattr(candidate, field.attname), connection) for field in fields]
+        table = quote(model._meta.db_table)
+        columns = ", ".join(quote(field.column) for field in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+
+        def keep_existing(column: str) -> str:
+            column = quote(column)
+            return f"{column} = COALESCE(NULLIF(EXCLUDED.{column}, ''), {table}.{column})"
+
+        sql = (
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({quote('organization_id')}, {quote('source')}, {quote('order_id')}) DO UPDATE SET "
+            f"{quote('payload')} = EXCLUDED.{quote('payload')}, "
+            f"{keep_existing('seller_company')}, {keep_existing('distributor_company')}, "
+            f"{quote('updated_at')} = EXCLUDED.{quote('updated_at')} "
+            f"RETURNING {columns}"
+        )
+        return next(iter(self.raw(sql, params).using(connection.alias)))
+
 
 class FulfillmentOrder(models.Model):
     STATUS_PENDING = "pending"
@@ -319,6 +434,25 @@ class FulfillmentOrder(models.Model):
         (STATUS_RETURNED, "Returned"),
     )
 
+    # Pasos del pipeline en orden; ``checkpoint`` guarda el último completado.
+    STEP_NORMALIZE = "normalize"
+    STEP_MAP = "map"
+    STEP_STOCK = "stock"
+    STEP_SALES_ORDER = "sales_order"
+    STEP_DELIVERY_NOTE = "delivery_note"
+    STEP_SUBMIT = "submit"
+    STEP_PROPAGATE = "propagate"
+    STEPS = (
+        STEP_NORMALIZE,
+        STEP_MAP,
+        STEP_STOCK,
+        STEP_SALES_ORDER,
+        STEP_DELIVERY_NOTE,
+        STEP_SUBMIT,
+        STEP_PROPAGATE,
+    )
+    STEP_CHOICES = tuple((step, step.replace("_", " ").title()) for step in STEPS)
+
     SOURCE_CHOICES = FulfillmentItemMap.SOURCE_CHOICES
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -343,11 +477,16 @@ class FulfillmentOrder(models.Model):
     last_error_code = models.CharField(max_length=64, blank=True)
     last_error_message = models.TextField(blank=True)
     next_attempt_at = models.DateTimeField(blank=True, null=True)
+    checkpoint = models.CharField(max_length=32, choices=STEP_CHOICES, blank=True)
+    checkpoint_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     objects = FulfillmentOrderQuerySet.as_manager()
 
+    # Campos pendientes mientras hay una unidad de trabajo abierta (ver deferred_writes).
+    _deferred_fields = None
+
     class Meta:
         app_label = "integrations"
         ordering = ("-created_at",)
@@ -358,6 +497,54 @@ class FulfillmentOrder(models.Model):
             )
         ]
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if self._deferred_fields is not None and update_fields is not None:
+            self._deferred_fields.update(update_fields)
+            return
+        super().save(*args, **kwargs)
+
+    @contextmanager
+    def deferred_writes(self):
+        """Unit of work: ``save(update_fields=...)`` calls are collected and written in one UPDATE.
+
+        Pending fields are flushed on exit, also when the block raises, and
+        whenever ``flush_writes`` is called explicitly to make state durable.
+        """
+        if self._deferred_fields is not None:
+            yield self
+            return
+        self._deferred_fields = set()
+        try:
+            yield self
+        finally:
+            try:
+                self.flush_writes()
+            finally:
+                self._deferred_fields = None
+
+    def flush_writes(self) -> None:
+        fields = self._deferred_fields
+        if not fields:
+            return
+        self._deferred_fields = None
+        try:
+            super().save(update_fields=fields | {"updated_at"})
+        finally:
+            self._deferred_fields = set()
+
+    def reached(self, step: str) -> bool:
+        """True when a previous run (or this one) completed ``step``."""
+        return bool(self.checkpoint) and self.STEPS.index(self.checkpoint) >= self.STEPS.index(step)
+
+    def reach(self, step: str) -> None:
+        """Advance the checkpoint; it never moves back, so a retry resumes after the last completed step."""
+        if self.reached(step):
+            return
+        self.checkpoint = step
+        self.checkpoint_at = timezone.now()
+        self.save(update_fields=["checkpoint", "checkpoint_at", "updated_at"])
+
     def mark_status(self, status: str, *, error_code: str = "", error_message: str = "", next_attempt_at=None):
         updates = {"status": status}
         if error_code is not None:
@@ -1,33 +1,169 @@
+import logging
 from collections import defaultdict
-from typing import Any, Callable, Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
 from apps.integrations.models import IntegrationMessage
 
+logger = logging.getLogger(__name__)
+
 Handler = Callable[[IntegrationMessage], Any]
+# A payload condition is either a collection of accepted values or a predicate.
+Condition = Any
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class Route:
+    handler: Handler
+    integration: str
+    event_type: Optional[str]
+    conditions: Tuple[Tuple[str, Condition], ...] = ()
+
+    @property
+    def name(self) -> str:
+        return getattr(self.handler, "__qualname__", repr(self.handler))
+
+    def rejects(self, values: Mapping[str, Any]) -> Optional[str]:
+        """Return the first payload key whose condition fails, or ``None`` on match."""
+        for key, condition in self.conditions:
+            value = values.get(key, _MISSING)
+            if callable(condition):
+                if value is _MISSING or not condition(value):
+                    return key
+                continue
+            try:
+                if value is _MISSING or value not in condition:
+                    return key
+            except TypeError:  # unhashable payload value
+                return key
+        return None
+
+
+@dataclass
+class RoutingDecision:
+    integration: str
+    event_type: Optional[str]
+    matched: List[Route] = field(default_factory=list)
+    skipped: List[Tuple[Route, str]] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "integration": self.integration,
+            "event_type": self.event_type,
+            "matched": [route.name for route in self.matched],
+            "skipped": [{"handler": route.name, "key": key} for route, key in self.skipped],
+        }
+
+
+@dataclass(frozen=True)
+class _CompiledBucket:
+    routes: Tuple[Route, ...]
+    payload_keys: Tuple[str, ...]
 
 
 class IntegrationHandlerRegistry:
     def __init__(self) -> None:
-        self._handlers: Dict[str, Dict[Optional[str], List[Handler]]] = defaultdict(lambda: defaultdict(list))
+        self._routes: List[Route] = []
+        self._table: Optional[Dict[Tuple[str, Optional[str]], _CompiledBucket]] = None
+
+    def register(
+        self,
+        integration: str,
+        event_type: Optional[str] = None,
+        handler: Optional[Handler] = None,
+        *,
+        when: Optional[Mapping[str, Condition]] = None,
+    ):
+        """Register ``handler`` for an integration, optional event_type and payload conditions.
 
-    def register(self, integration: str, event_type: Optional[str] = None, handler: Optional[Handler] = None):
+        ``when`` maps payload keys to the accepted values (any collection) or to a
+        predicate; the handler only runs when every condition holds.
+        """
         if handler is None:
-            return lambda fn: self.register(integration, event_type, fn)
-        bucket = self._handlers[integration][event_type]
-        if handler not in bucket:
-            bucket.append(handler)
+            return lambda fn: self.register(integration, event_type, fn, when=when)
+        conditions = tuple((key, self._compile_condition(condition)) for key, condition in (when or {}).items())
+        route = Route(handler=handler, integration=integration, event_type=event_type, conditions=conditions)
+        for existing in self._routes:
+            if (existing.handler, existing.integration, existing.event_type) == (handler, integration, event_type):
+                return handler
+        self._routes.append(route)
+        self._table = None
         return handler
 
-    def dispatch(self, integration: str, event_type: Optional[str], message: IntegrationMessage) -> List[Any]:
-        handlers = []
-        integration_handlers = self._handlers.get(integration, {})
-        handlers.extend(integration_handlers.get(event_type, []))
-        handlers.extend(integration_handlers.get(None, []))
+    def freeze(self) -> None:
+        """Compile registrations into a per (integration, event_type) dispatch table."""
+        grouped: Dict[Tuple[str, Optional[str]], List[Route]] = defaultdict(list)
+        wildcards: Dict[str, List[Route]] = defaultdict(list)
+        for route in self._routes:
+            grouped[(route.integration, route.event_type)].append(route)
+            if route.event_type is None:
+                wildcards[route.integration].append(route)
+
+        table: Dict[Tuple[str, Optional[str]], _CompiledBucket] = {}
+        for (integration, event_type), routes in grouped.items():
+            if event_type is not None:
+                routes = routes + wildcards.get(integration, [])
+            table[(integration, event_type)] = self._compile_bucket(routes)
+        self._table = table
+
+    def route(self, integration: str, event_type: Optional[str], message: IntegrationMessage) -> RoutingDecision:
+        table = self._table
+        if table is None:
+            self.freeze()
+            table = self._table
+        bucket = table.get((integration, event_type)) or table.get((integration, None))
+        decision = RoutingDecision(integration=integration, event_type=event_type)
+        if bucket is None:
+            return decision
+
+        payload = message.payload if isinstance(message.payload, dict) else {}
+        values = {key: payload.get(key, _MISSING) for key in bucket.payload_keys}
+        for route in bucket.routes:
+            rejected_key = route.rejects(values)
+            if rejected_key is None:
+                decision.matched.append(route)
+            else:
+                decision.skipped.append((route, rejected_key))
+        return decision
+
+    def dispatch(
+        self,
+        integration: str,
+        event_type: Optional[str],
+        message: IntegrationMessage,
+        *,
+        decision: Optional[RoutingDecision] = None,
+    ) -> List[Any]:
+        decision = decision or self.route(integration, event_type, message)
+        logger.debug("[ROUTER] message=%s routing=%s", message.id, decision.as_dict())
         results: List[Any] = []
-        for handler in handlers:
-            result = handler(message)
+        for route in decision.matched:
+            result = route.handler(message)
             results.append(result)
+        # Como antes, un handler que no aplica deja constancia en los resultados.
+        for route, key in decision.skipped:
+            results.append({"skipped": True, "reason": "condition_not_met", "handler": route.name, "key": key})
         return results
 
+    @staticmethod
+    def _compile_condition(condition: Condition) -> Condition:
+        if callable(condition):
+            return condition
+        # Un valor suelto (p. ej. "Sales Invoice") es un único valor aceptado, no una colección de caracteres.
+        if isinstance(condition, (str, bytes)) or not hasattr(condition, "__iter__"):
+            return frozenset({condition})
+        return frozenset(condition)
+
+    @staticmethod
+    def _compile_bucket(routes: List[Route]) -> _CompiledBucket:
+        keys: List[str] = []
+        for route in routes:
+            for key, _ in route.conditions:
+                if key not in keys:
+                    keys.append(key)
+        return _CompiledBucket(routes=tuple(routes), payload_keys=tuple(keys))
+
 
 registry = IntegrationHandlerRegistry()
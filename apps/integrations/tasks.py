@@ -5,6 +5,7 @@ from django.utils import timezone
 
 from events import event_bus
 from events.events import IntegrationInboundEvent, IntegrationOutboundEvent
+from events.events.integration_events import IntegrationMessageReceived
 
 from apps.integrations.models import IntegrationMessage
 from apps.integrations.router import registry
@@ -33,19 +34,23 @@ def process_integration_message(self, message_id: str) -> str:
 
 def _process_inbound_message(task, message: IntegrationMessage) -> str:
     print("--- PASO 8: PROCESANDO MENSAJE INBOUND ---")
-    event_bus.publish(IntegrationMessageReceived(message_id=str(message.id)))
 
     try:
         print("--- PASO 9: PUBLICANDO EVENTO EN EVENT BUS ---")
-        results: List[Any] = event_bus.publish(event)
+        results: List[Any] = event_bus.publish(IntegrationMessageReceived(message_id=str(message.id)))
         print(f"--- PASO 10: RESULTADOS DEL EVENT BUS ---\n{results}")
         print("--- PASO 11: DESPACHANDO A REGISTRY ---")
-        results.extend(registry.dispatch(message.integration, message.event_type or None, message))
+        decision = registry.route(message.integration, message.event_type or None, message)
+        results.extend(registry.dispatch(message.integration, message.event_type or None, message, decision=decision))
         print(f"--- PASO 12: RESULTADOS DEL REGISTRY ---\n{results}")
         message.mark_acknowledged()
         print("--- PASO 13.2: MENSAJE MARCADO COMO ACKNOWLEDGED ---")
         message.mark_processed(
-            response={"handlers": len(results), "results": [repr(r) for r in results]},
+            response={
+                "handlers": len(results),
+                "results": [repr(r) for r in results],
+                "routing": decision.as_dict(),
+            },
             http_status=202,
             latency_ms=None,
         )
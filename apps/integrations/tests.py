@@ -1,3 +1,53 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from apps.integrations.models import IntegrationMessage
+from apps.integrations.router import IntegrationHandlerRegistry
+
+
+def _message(event_type="on_submit", **payload):
+    return IntegrationMessage(integration="alegra", event_type=event_type, payload=payload)
+
+
+class IntegrationHandlerRegistryTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.registry = IntegrationHandlerRegistry()
+        self.calls = []
+
+    def handler(self, name):
+        def run(message):
+            self.calls.append(name)
+            return name
+
+        run.__qualname__ = name
+        return run
+
+    def test_conditions_accept_collections_single_values_and_predicates(self):
+        self.registry.register("alegra", "on_submit", self.handler("coleccion"), when={"doctype": {"POS Invoice", "Sales Invoice"}})
+        self.registry.register("alegra", "on_submit", self.handler("valor"), when={"doctype": "Sales Invoice"})
+        self.registry.register("alegra", "on_submit", self.handler("predicado"), when={"total": lambda value: value > 100})
+
+        decision = self.registry.route("alegra", "on_submit", _message(doctype="Sales Invoice", total=50))
+        self.assertEqual([route.name for route in decision.matched], ["coleccion", "valor"])
+        self.assertEqual(decision.as_dict()["skipped"], [{"handler": "predicado", "key": "total"}])
+
+        decision = self.registry.route("alegra", "on_submit", _message(doctype="Sales", total=500))
+        self.assertEqual([route.name for route in decision.matched], ["predicado"])
+
+    def test_wildcards_run_with_exact_routes_and_late_registrations_refreeze(self):
+        self.registry.register("alegra", "on_submit", self.handler("exacto"))
+        self.registry.register("alegra", None, self.handler("comodin"))
+        self.registry.freeze()
+        self.assertEqual(self.registry.dispatch("alegra", "on_submit", _message()), ["exacto", "comodin"])
+        self.assertEqual(self.registry.dispatch("alegra", "on_cancel", _message("on_cancel")), ["comodin"])
+
+        self.registry.register("alegra", "on_submit", self.handler("tardio"))
+        self.assertEqual(self.registry.dispatch("alegra", "on_submit", _message()), ["exacto", "tardio", "comodin"])
+
+    def test_skipped_handlers_are_reported_in_results(self):
+        self.registry.register("alegra", "on_submit", self.handler("facturas"), when={"doctype": "Sales Invoice"})
+        results = self.registry.dispatch("alegra", "on_submit", _message(doctype="Delivery Note"))
+        self.assertEqual(self.calls, [])
+        self.assertEqual(
+            results,
+            [{"skipped": True, "reason": "condition_not_met", "handler": "facturas", "key": "doctype"}],
+        )
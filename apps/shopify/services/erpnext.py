@@ -1,7 +1,7 @@
 import logging
 
 from apps.erpnext.models import ERPNextCredential
-from apps.erpnext.services.client import ERPNextClient
+from apps.erpnext.services.client import ERPNextClient, get_client
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +25,7 @@ class ShopifyToErpNextService:
 
     def _get_client(self) -> ERPNextClient:
         """Get an instance of the ERPNextClient."""
-        return ERPNextClient(self.credential)
+        return get_client(self.credential)
 
     def process(self) -> dict:
         """
@@ -43,9 +43,8 @@ class ShopifyToErpNextService:
         si_doc = self._build_sales_invoice()
 
         try:
-            inserted = self.client.insert_doc("Sales Invoice", si_doc)
-            invoice_name = inserted.get("name")
-            submitted = self.client.submit_doc("Sales Invoice", invoice_name)
+            submitted = self.client.insert_and_submit("Sales Invoice", si_doc)
+            invoice_name = submitted.get("name")
             return {
                 "invoice_name": invoice_name,
                 "outbound_request": si_doc,
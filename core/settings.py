@@ -169,6 +169,74 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# ERPNext HTTP client
+ERPNEXT_HTTP_POOL_CONNECTIONS = env.int("ERPNEXT_HTTP_POOL_CONNECTIONS", default=4)
+ERPNEXT_HTTP_POOL_MAXSIZE = env.int("ERPNEXT_HTTP_POOL_MAXSIZE", default=20)
+ERPNEXT_HTTP_POOL_BLOCK = env.bool("ERPNEXT_HTTP_POOL_BLOCK", default=False)
+ERPNEXT_CLIENT_CACHE_SIZE = env.int("ERPNEXT_CLIENT_CACHE_SIZE", default=256)
+ERPNEXT_RETRY_MAX_ATTEMPTS = env.int("ERPNEXT_RETRY_MAX_ATTEMPTS", default=3)
+ERPNEXT_RETRY_BACKOFF_BASE = env.float("ERPNEXT_RETRY_BACKOFF_BASE", default=0.5)
+ERPNEXT_RETRY_BACKOFF_MAX = env.float("ERPNEXT_RETRY_BACKOFF_MAX", default=10.0)
+ERPNEXT_RETRY_BUDGET_SECONDS = env.float("ERPNEXT_RETRY_BUDGET_SECONDS", default=30.0)
+ERPNEXT_CACHE_ENABLED = env.bool("ERPNEXT_CACHE_ENABLED", default=True)
+ERPNEXT_CACHE_ALIAS = env("ERPNEXT_CACHE_ALIAS", default="default")
+ERPNEXT_CACHE_STALE_SECONDS = env.int("ERPNEXT_CACHE_STALE_SECONDS", default=300)
+ERPNEXT_CACHE_MAX_ENTRIES = env.int("ERPNEXT_CACHE_MAX_ENTRIES", default=2048)
+# Per-doctype TTL overrides in seconds, e.g. ERPNEXT_CACHE_TTLS="Item=3600,Bin=10"
+ERPNEXT_CACHE_TTLS = env.dict("ERPNEXT_CACHE_TTLS", cast={"value": int}, default={})
+ERPNEXT_SINGLEFLIGHT_ENABLED = env.bool("ERPNEXT_SINGLEFLIGHT_ENABLED", default=True)
+ERPNEXT_SINGLEFLIGHT_DISTRIBUTED = env.bool("ERPNEXT_SINGLEFLIGHT_DISTRIBUTED", default=False)
+ERPNEXT_SINGLEFLIGHT_LOCK_MS = env.int("ERPNEXT_SINGLEFLIGHT_LOCK_MS", default=2000)
+ERPNEXT_RATE_LIMIT_ENABLED = env.bool("ERPNEXT_RATE_LIMIT_ENABLED", default=True)
+ERPNEXT_RATE_LIMIT_RATE = env.float("ERPNEXT_RATE_LIMIT_RATE", default=10.0)
+ERPNEXT_RATE_LIMIT_MIN_RATE = env.float("ERPNEXT_RATE_LIMIT_MIN_RATE", default=1.0)
+ERPNEXT_RATE_LIMIT_MAX_RATE = env.float("ERPNEXT_RATE_LIMIT_MAX_RATE", default=50.0)
+ERPNEXT_RATE_LIMIT_BURST = env.float("ERPNEXT_RATE_LIMIT_BURST", default=20.0)
+ERPNEXT_RATE_LIMIT_MAX_WAIT = env.float("ERPNEXT_RATE_LIMIT_MAX_WAIT", default=10.0)
+ERPNEXT_RATE_LIMIT_TARGET_LATENCY = env.float("ERPNEXT_RATE_LIMIT_TARGET_LATENCY", default=2.0)
+ERPNEXT_HTTP2 = env.bool("ERPNEXT_HTTP2", default=False)
+ERPNEXT_MAX_CONCURRENCY = env.int("ERPNEXT_MAX_CONCURRENCY", default=10)
+# Local Bin mirror used by fulfillment availability checks
+ERPNEXT_INVENTORY_MIRROR_ENABLED = env.bool("ERPNEXT_INVENTORY_MIRROR_ENABLED", default=True)
+ERPNEXT_INVENTORY_MIRROR_MAX_AGE = env.int("ERPNEXT_INVENTORY_MIRROR_MAX_AGE", default=180)
+ERPNEXT_INVENTORY_SYNC_INTERVAL = env.int("ERPNEXT_INVENTORY_SYNC_INTERVAL", default=60)
+# Stock reservations held between the availability check and the DN submit
+ERPNEXT_RESERVATIONS_ENABLED = env.bool("ERPNEXT_RESERVATIONS_ENABLED", default=True)
+ERPNEXT_RESERVATION_TTL = env.int("ERPNEXT_RESERVATION_TTL", default=900)
+# A processing order not touched for this long is taken to be left by a dead run and can be claimed again
+ERPNEXT_FULFILLMENT_CLAIM_LEASE_SECONDS = env.int("ERPNEXT_FULFILLMENT_CLAIM_LEASE_SECONDS", default=900)
+# Backorders: wake-up when their Bins go up (webhook or mirror sync) and periodic sweep
+ERPNEXT_BACKORDER_WAKEUP_ENABLED = env.bool("ERPNEXT_BACKORDER_WAKEUP_ENABLED", default=True)
+ERPNEXT_BACKORDER_SWEEP_INTERVAL = env.int("ERPNEXT_BACKORDER_SWEEP_INTERVAL", default=60)
+# Outbox of fulfillment statuses owed to seller ERPNext sites
+ERPNEXT_PROPAGATION_INTERVAL = env.int("ERPNEXT_PROPAGATION_INTERVAL", default=5)
+ERPNEXT_PROPAGATION_MAX_ATTEMPTS = env.int("ERPNEXT_PROPAGATION_MAX_ATTEMPTS", default=10)
+# Compiled FulfillmentItemMap index per seller, invalidated through a Redis version counter
+FULFILLMENT_ITEM_INDEX_ENABLED = env.bool("FULFILLMENT_ITEM_INDEX_ENABLED", default=True)
+
+CELERY_BEAT_SCHEDULE = {
+    "erpnext-inventory-mirror-sync": {
+        "task": "apps.erpnext.tasks.sync_inventory_mirrors_task",
+        "schedule": ERPNEXT_INVENTORY_SYNC_INTERVAL,
+    },
+    "erpnext-release-expired-reservations": {
+        "task": "apps.erpnext.tasks.release_expired_reservations_task",
+        "schedule": 300,
+    },
+    "erpnext-deliver-status-propagations": {
+        "task": "apps.erpnext.tasks.deliver_status_propagations_task",
+        "schedule": ERPNEXT_PROPAGATION_INTERVAL,
+    },
+    "erpnext-sweep-backorders": {
+        "task": "apps.erpnext.tasks.sweep_backorders_task",
+        "schedule": ERPNEXT_BACKORDER_SWEEP_INTERVAL,
+    },
+}
+
+# Alegra async client
+ALEGRA_HTTP2 = env.bool("ALEGRA_HTTP2", default=False)
+ALEGRA_MAX_CONCURRENCY = env.int("ALEGRA_MAX_CONCURRENCY", default=5)
+
 # CORS
 CORS_ALLOW_ALL_ORIGINS = False
 CORS_ALLOWED_ORIGINS = [env("FRONTEND_URL")]
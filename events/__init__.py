@@ -1,3 +1,4 @@
 from .bus import event_bus
+from .codec import event_codec, event_registry, register_event
 
-__all__ = ["event_bus"]
+__all__ = ["event_bus", "event_codec", "event_registry", "register_event"]
@@ -0,0 +1,137 @@
+"""Compare the binary event codec against plain JSON.
+
+Run with ``python -m events.benchmarks [--iterations N]``; it needs no Django setup.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import time
+from dataclasses import asdict
+from typing import Callable, Dict, List
+from uuid import uuid4
+
+from .codec import EventCodec, event_registry, msgpack
+from .events.alegra_events import ErpnextPosInvoiceSubmitted
+from .events.base_event import DomainEvent
+from .events.integration_events import IntegrationInboundEvent, ShopifyWebhookReceivedEvent
+
+
+def _sample_order(lines: int = 12) -> Dict:
+    return {
+        "id": 5512345678901,
+        "name": "#1042",
+        "currency": "COP",
+        "total_price": "520000.00",
+        "contact_email": "cliente@example.com",
+        "created_at": "2025-10-02T10:15:00-05:00",
+        "tags": "company:Company B, vip",
+        "line_items": [
+            {
+                "id": 1000 + index,
+                "sku": f"PIN-PSN-{index:03d}",
+                "title": f"PIN PlayStation {index}",
+                "quantity": 1 + index % 3,
+                "price": "50000.00",
+            }
+            for index in range(lines)
+        ],
+    }
+
+
+def sample_events() -> List[DomainEvent]:
+    order = _sample_order()
+    raw_body = json.dumps(order).encode("utf-8")
+    message_id = uuid4()
+    return [
+        ShopifyWebhookReceivedEvent(
+            shopify_domain="tienda.myshopify.com",
+            headers={
+                "X-Shopify-Topic": "orders/paid",
+                "X-Shopify-Hmac-Sha256": "c2lnbmF0dXJl",
+                "X-Shopify-Webhook-Id": str(uuid4()),
+            },
+            body=json.loads(raw_body),
+            raw_body=raw_body,
+        ),
+        IntegrationInboundEvent(
+            company_id=str(uuid4()),
+            integration="shopify",
+            message_id=str(message_id),
+            payload=order,
+            external_reference=str(order["id"]),
+        ),
+        ErpnextPosInvoiceSubmitted(
+            event_id=str(message_id),
+            organization_id=uuid4(),
+            message_id=message_id,
+        ),
+    ]
+
+
+def _json_encode(event: DomainEvent) -> bytes:
+    def default(value):
+        if isinstance(value, (bytes, bytearray)):
+            return base64.b64encode(value).decode("ascii")
+        return str(value)
+
+    data = asdict(event)
+    data["event_type"] = event.event_type
+    return json.dumps(data, default=default).encode("utf-8")
+
+
+def _time(fn: Callable[[], object], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def run(iterations: int = 20000) -> List[Dict[str, object]]:
+    codecs = {"json-codec": EventCodec(event_registry, use_msgpack=False)}
+    if msgpack is not None:
+        codecs["msgpack-codec"] = EventCodec(event_registry, use_msgpack=True)
+
+    rows: List[Dict[str, object]] = []
+    for event in sample_events():
+        baseline = _json_encode(event)
+        rows.append(
+            {
+                "event_type": event.event_type,
+                "format": "json (asdict)",
+                "bytes": len(baseline),
+                "encode_us": _time(lambda: _json_encode(event), iterations),
+                "decode_us": _time(lambda: json.loads(baseline), iterations),
+            }
+        )
+        for name, codec in codecs.items():
+            frame = codec.encode(event)
+            assert codec.decode(frame) == event
+            rows.append(
+                {
+                    "event_type": event.event_type,
+                    "format": name,
+                    "bytes": len(frame),
+                    "encode_us": _time(lambda: codec.encode(event), iterations),
+                    "decode_us": _time(lambda: codec.decode(frame), iterations),
+                }
+            )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    print(f"{'event_type':<34}{'format':<16}{'bytes':>8}{'encode µs':>12}{'decode µs':>12}")
+    for row in run(args.iterations):
+        print(
+            f"{row['event_type']:<34}{row['format']:<16}{row['bytes']:>8}"
+            f"{row['encode_us']:>12.2f}{row['decode_us']:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
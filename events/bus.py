@@ -1,18 +1,104 @@
+import asyncio
 import threading
-from collections import defaultdict
-from typing import Any, Callable, Dict, List, Optional
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from .events.base_event import DomainEvent
 
 Handler = Callable[[DomainEvent], Any]
 
 
+class CorrelationRegistry:
+    """Bounded map of pending request ids to futures, evicted by TTL.
+
+    Responses that arrive after the waiter is gone are dropped instead of being
+    kept around, and the oldest waiters are failed when ``max_pending`` is hit.
+    """
+
+    def __init__(self, *, max_pending: int = 10000, default_ttl: float = 300.0) -> None:
+        self.max_pending = max_pending
+        self.default_ttl = default_ttl
+        self._pending: "OrderedDict[str, Tuple[Future, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+        self.evicted = 0
+        self.late_responses = 0
+
+    def create(self, request_id: str, ttl: Optional[float] = None) -> Future:
+        future: Future = Future()
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            self._evict_expired_locked()
+            while len(self._pending) >= self.max_pending:
+                _, (oldest, _) = self._pending.popitem(last=False)
+                self._expire(oldest, "Registro de correlación lleno")
+            previous = self._pending.pop(request_id, None)
+            if previous:
+                previous[0].cancel()
+            self._pending[request_id] = (future, expires_at)
+        return future
+
+    def resolve(self, request_id: str, response: Any) -> bool:
+        with self._lock:
+            self._sweep_locked()
+            entry = self._pending.pop(request_id, None)
+        if entry is None or entry[0].done():
+            self.late_responses += 1
+            return False
+        entry[0].set_result(response)
+        return True
+
+    def fail(self, request_id: str, exc: BaseException) -> bool:
+        with self._lock:
+            self._sweep_locked()
+            entry = self._pending.pop(request_id, None)
+        if entry is None or entry[0].done():
+            return False
+        entry[0].set_exception(exc)
+        return True
+
+    def discard(self, request_id: str) -> None:
+        with self._lock:
+            self._sweep_locked()
+            self._pending.pop(request_id, None)
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            return self._evict_expired_locked()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _sweep_locked(self) -> None:
+        # A lo sumo un barrido por segundo fuera de create(): sin nuevas peticiones también se expulsa.
+        if time.monotonic() >= self._next_sweep:
+            self._evict_expired_locked()
+
+    def _evict_expired_locked(self) -> int:
+        now = time.monotonic()
+        self._next_sweep = now + 1.0
+        expired = [key for key, (_, expires_at) in self._pending.items() if expires_at <= now]
+        for key in expired:
+            future, _ = self._pending.pop(key)
+            self._expire(future, f"Timeout esperando respuesta para {key}")
+        return len(expired)
+
+    def _expire(self, future: Future, reason: str) -> None:
+        self.evicted += 1
+        if not future.done():
+            future.set_exception(TimeoutError(reason))
+
+
 class EventBus:
-    def __init__(self) -> None:
+    def __init__(self, *, max_pending_requests: int = 10000, request_ttl: float = 300.0) -> None:
         self._subscribers: Dict[str, List[Handler]] = defaultdict(list)
         self._lock = threading.Lock()
-        self._response_events: Dict[str, threading.Event] = {}
-        self._responses: Dict[str, Any] = {}
+        self._pending_requests = CorrelationRegistry(
+            max_pending=max_pending_requests,
+            default_ttl=request_ttl,
+        )
 
     def subscribe(self, event_type: str, handler: Handler) -> None:
         print(f"[EVENTBUS] Subscribing {handler.__name__} to {event_type}")
@@ -36,22 +122,63 @@ class EventBus:
         return results
 
     def publish_and_wait(self, event: DomainEvent, timeout: Optional[float] = None) -> Any:
-        waiter = threading.Event()
-        self._response_events[event.event_id] = waiter
+        # Sin timeout explícito se espera lo que dura la correlación, nunca indefinidamente.
+        timeout = self._effective_timeout(timeout)
+        future = self._start_request(event, timeout)
         try:
-            self.publish(event)
-            finished = waiter.wait(timeout)
-            if not finished:
-                raise TimeoutError(f"Timeout esperando respuesta para {event.event_id}")
-            return self._responses.pop(event.event_id, None)
+            return future.result(timeout)
+        except TimeoutError as exc:
+            raise TimeoutError(f"Timeout esperando respuesta para {event.event_id}") from exc
         finally:
-            self._response_events.pop(event.event_id, None)
+            self._pending_requests.discard(event.event_id)
 
-    def respond_to_request(self, request_id: str, response: Any) -> None:
-        event = self._response_events.get(request_id)
-        if event:
-            self._responses[request_id] = response
-            event.set()
+    async def request(self, event: DomainEvent, timeout: Optional[float] = None) -> Any:
+        """Publish ``event`` and await the matching ``respond_to_request`` without blocking the loop.
+
+        Handlers are synchronous, so they run in the default executor.
+        """
+        timeout = self._effective_timeout(timeout)
+        future = self._pending_requests.create(event.event_id, ttl=timeout)
+        try:
+            await asyncio.to_thread(self.publish, event)
+        except BaseException:
+            self._pending_requests.discard(event.event_id)
+            raise
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError as exc:
+            raise TimeoutError(f"Timeout esperando respuesta para {event.event_id}") from exc
+        finally:
+            self._pending_requests.discard(event.event_id)
+
+    async def request_many(
+        self,
+        events: Iterable[DomainEvent],
+        timeout: Optional[float] = None,
+    ) -> List[Any]:
+        """Fan out several requests and await them together; failures are returned in place."""
+        return await asyncio.gather(
+            *(self.request(event, timeout) for event in events),
+            return_exceptions=True,
+        )
+
+    def respond_to_request(self, request_id: str, response: Any) -> bool:
+        return self._pending_requests.resolve(request_id, response)
+
+    def fail_request(self, request_id: str, exc: BaseException) -> bool:
+        return self._pending_requests.fail(request_id, exc)
+
+    def _effective_timeout(self, timeout: Optional[float]) -> float:
+        return timeout if timeout is not None else self._pending_requests.default_ttl
+
+    def _start_request(self, event: DomainEvent, timeout: Optional[float]) -> Future:
+        future = self._pending_requests.create(event.event_id, ttl=timeout)
+        try:
+            self.publish(event)
+        except BaseException:
+            self._pending_requests.discard(event.event_id)
+            raise
+        return future
 
 
 event_bus = EventBus()
@@ -0,0 +1,252 @@
+"""Versioned binary codec for DomainEvents with a schema registry keyed by event_type."""
+
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Optional, Tuple, Type
+from uuid import UUID
+
+try:  # msgpack is optional; JSON frames are used when it is not installed.
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+if TYPE_CHECKING:
+    from .events.base_event import DomainEvent
+
+FRAME_MAGIC = 0xDE
+FORMAT_MSGPACK = 1
+FORMAT_JSON = 2
+
+_EXT_DATETIME = 1
+_EXT_UUID = 2
+_EXT_DECIMAL = 3
+
+Upcaster = Callable[[List[Any]], List[Any]]
+
+
+class EventCodecError(Exception):
+    """Raised when an event cannot be encoded or decoded."""
+
+
+@dataclass(frozen=True)
+class EventSchema:
+    event_type: str
+    cls: Type["DomainEvent"]
+    version: int
+    fields: Tuple[str, ...]
+    # field -> (source field, derive fn). The field is left off the wire when the
+    # source field is populated and rebuilt from it on decode.
+    derived: Mapping[str, Tuple[str, Callable[[Any], Any]]] = field(default_factory=dict)
+    # version -> fn(values) migrating positional values from ``version`` to ``version + 1``.
+    upcasters: Mapping[int, Upcaster] = field(default_factory=dict)
+
+
+class EventRegistry:
+    """Maps ``event_type`` to the dataclass and wire schema used to (de)serialize it."""
+
+    def __init__(self) -> None:
+        self._schemas: Dict[str, EventSchema] = {}
+
+    def register(
+        self,
+        cls: Optional[Type["DomainEvent"]] = None,
+        *,
+        version: int = 1,
+        derived: Optional[Mapping[str, Tuple[str, Callable[[Any], Any]]]] = None,
+        upcasters: Optional[Mapping[int, Upcaster]] = None,
+    ):
+        if cls is None:
+            return lambda target: self.register(target, version=version, derived=derived, upcasters=upcasters)
+        event_type = getattr(cls, "event_type", "")
+        if not isinstance(event_type, str) or not event_type:
+            raise EventCodecError(f"{cls.__name__} no define event_type.")
+        existing = self._schemas.get(event_type)
+        if existing and existing.cls is not cls:
+            raise EventCodecError(
+                f"event_type {event_type} ya registrado por {existing.cls.__name__}."
+            )
+        self._schemas[event_type] = EventSchema(
+            event_type=event_type,
+            cls=cls,
+            version=version,
+            fields=tuple(f.name for f in fields(cls) if f.init),
+            derived=dict(derived or {}),
+            upcasters=dict(upcasters or {}),
+        )
+        return cls
+
+    def get(self, event_type: str) -> EventSchema:
+        schema = self._schemas.get(event_type)
+        if schema is None:
+            raise EventCodecError(f"event_type {event_type} no registrado.")
+        return schema
+
+    def __contains__(self, event_type: str) -> bool:
+        return event_type in self._schemas
+
+    def event_types(self) -> Tuple[str, ...]:
+        return tuple(self._schemas)
+
+
+class EventCodec:
+    """Encode events as ``[magic, format]`` + ``[event_type, version, *values]``.
+
+    Values are positional in schema field order, so field names never travel on
+    the wire. msgpack is used when available, JSON otherwise; both can be decoded.
+    """
+
+    def __init__(self, registry: EventRegistry, *, use_msgpack: Optional[bool] = None) -> None:
+        self.registry = registry
+        if use_msgpack is None:
+            use_msgpack = msgpack is not None
+        if use_msgpack and msgpack is None:
+            raise EventCodecError("msgpack no está instalado.")
+        self.use_msgpack = use_msgpack
+
+    def encode(self, event: "DomainEvent") -> bytes:
+        schema = self.registry.get(event.event_type)
+        if type(event) is not schema.cls:
+            raise EventCodecError(
+                f"{type(event).__name__} no coincide con el esquema de {schema.event_type}."
+            )
+        values = []
+        for name in schema.fields:
+            value = getattr(event, name)
+            derived = schema.derived.get(name)
+            # Solo se omite si el receptor lo reconstruye idéntico desde el campo fuente.
+            if derived and getattr(event, derived[0]) and derived[1](getattr(event, derived[0])) == value:
+                value = None
+            values.append(value)
+        frame = [schema.event_type, schema.version, *values]
+        if self.use_msgpack:
+            body = msgpack.packb(frame, default=_msgpack_default, use_bin_type=True)
+            return bytes((FRAME_MAGIC, FORMAT_MSGPACK)) + body
+        body = json.dumps(_json_escape(frame), default=_json_default, separators=(",", ":")).encode("utf-8")
+        return bytes((FRAME_MAGIC, FORMAT_JSON)) + body
+
+    def decode(self, data: bytes) -> "DomainEvent":
+        if len(data) < 2 or data[0] != FRAME_MAGIC:
+            raise EventCodecError("Trama de evento inválida.")
+        fmt = data[1]
+        try:
+            if fmt == FORMAT_MSGPACK:
+                if msgpack is None:
+                    raise EventCodecError("msgpack no está instalado.")
+                frame = msgpack.unpackb(data[2:], ext_hook=_msgpack_ext_hook, raw=False)
+            elif fmt == FORMAT_JSON:
+                frame = json.loads(data[2:], object_hook=_json_object_hook)
+            else:
+                raise EventCodecError(f"Formato de trama {fmt} no soportado.")
+        except (ValueError, TypeError) as exc:
+            raise EventCodecError(f"No se pudo decodificar el evento: {exc}") from exc
+
+        if not isinstance(frame, list) or len(frame) < 2:
+            raise EventCodecError("Trama de evento incompleta.")
+        event_type, version, *values = frame
+        schema = self.registry.get(event_type)
+        payload = self._upcast(schema, version, values)
+        for name, (source, derive) in schema.derived.items():
+            if payload.get(name) is None and payload.get(source):
+                payload[name] = derive(payload[source])
+        return schema.cls(**payload)
+
+    def _upcast(self, schema: EventSchema, version: int, values: List[Any]) -> Dict[str, Any]:
+        if version > schema.version:
+            raise EventCodecError(
+                f"Versión {version} de {schema.event_type} es más nueva que la registrada ({schema.version})."
+            )
+        while version < schema.version:
+            upcaster = schema.upcasters.get(version)
+            if upcaster is None:
+                raise EventCodecError(
+                    f"Sin upcaster para {schema.event_type} v{version} -> v{version + 1}."
+                )
+            values = upcaster(values)
+            version += 1
+        if len(values) != len(schema.fields):
+            raise EventCodecError(f"Trama de {schema.event_type} con campos inesperados.")
+        return dict(zip(schema.fields, values))
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, value.isoformat().encode("ascii"))
+    if isinstance(value, UUID):
+        return msgpack.ExtType(_EXT_UUID, value.bytes)
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(value).encode("ascii"))
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Tipo {type(value).__name__} no serializable")
+
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode("ascii"))
+    if code == _EXT_UUID:
+        return UUID(bytes=data)
+    if code == _EXT_DECIMAL:
+        return Decimal(data.decode("ascii"))
+    return msgpack.ExtType(code, data)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__t": "dt", "v": value.isoformat()}
+    if isinstance(value, UUID):
+        return {"__t": "uuid", "v": str(value)}
+    if isinstance(value, Decimal):
+        return {"__t": "dec", "v": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__t": "b", "v": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Tipo {type(value).__name__} no serializable")
+
+
+def _json_escape(value: Any) -> Any:
+    """Wrap payload dicts that use the tag key so the decoder never mistakes them for tagged values.
+
+    Returns ``value`` itself when nothing inside needs escaping.
+    """
+    if isinstance(value, dict):
+        items = {key: _json_escape(item) for key, item in value.items()}
+        if "__t" in value:
+            return {"__t": "esc", "v": [[key, item] for key, item in items.items()]}
+        if any(items[key] is not value[key] for key in value):
+            return items
+        return value
+    if isinstance(value, (list, tuple)):
+        escaped = [_json_escape(item) for item in value]
+        if any(new is not old for new, old in zip(escaped, value)):
+            return escaped
+        return value
+    return value
+
+
+def _json_object_hook(obj: Dict[str, Any]) -> Any:
+    tag = obj.get("__t")
+    if tag is None or len(obj) != 2:
+        return obj
+    value = obj.get("v")
+    if tag == "esc":
+        return dict(value)
+    if tag == "dt":
+        return datetime.fromisoformat(value)
+    if tag == "uuid":
+        return UUID(value)
+    if tag == "dec":
+        return Decimal(value)
+    if tag == "b":
+        return base64.b64decode(value)
+    return obj
+
+
+event_registry = EventRegistry()
+register_event = event_registry.register
+event_codec = EventCodec(event_registry)
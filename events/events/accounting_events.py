@@ -1,14 +1,15 @@
 from dataclasses import dataclass, field
-from typing import Any, Dict
-from uuid import uuid4
+from typing import Any, ClassVar, Dict
+
+from events.codec import register_event
 
 from .base_event import DomainEvent
 
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class AccountingInvoiceSyncedEvent(DomainEvent):
-    event_id: str = field(default_factory=lambda: str(uuid4()))
-    event_type: str = "accounting.invoice.synced"
+    event_type: ClassVar[str] = "accounting.invoice.synced"
     company_id: str = ""
     invoice_id: str = ""
     payload: Dict[str, Any] = field(default_factory=dict)
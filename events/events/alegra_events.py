@@ -1,32 +1,40 @@
 from dataclasses import dataclass, field, KW_ONLY
-from uuid import UUID, uuid4
+from typing import ClassVar
+from uuid import UUID
+from events.codec import register_event
 from events.events.base_event import DomainEvent
 
-@dataclass
+# The invoice payload lives on the IntegrationMessage referenced by ``message_id``;
+# handlers reload it from there, so ``payload`` is optional and usually left empty.
+
+@register_event
+@dataclass(slots=True)
 class ErpnextPosInvoiceSubmitted(DomainEvent):
-    event_type = "ErpnextPosInvoiceSubmitted"
+    event_type: ClassVar[str] = "ErpnextPosInvoiceSubmitted"
     _: KW_ONLY
-    payload: dict
     organization_id: UUID
     message_id: UUID
+    payload: dict = field(default_factory=dict)
 
     def get_aggregate_id(self) -> str:
         return str(self.organization_id)
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class ErpnextSalesInvoiceSubmitted(DomainEvent):
-    event_type = "ErpnextSalesInvoiceSubmitted"
+    event_type: ClassVar[str] = "ErpnextSalesInvoiceSubmitted"
     _: KW_ONLY
-    payload: dict
     organization_id: UUID
     message_id: UUID
+    payload: dict = field(default_factory=dict)
 
     def get_aggregate_id(self) -> str:
         return str(self.organization_id)
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class ERPNextInvoiceSyncRequested(DomainEvent):
-    event_type = "ERPNextInvoiceSyncRequested"
+    event_type: ClassVar[str] = "ERPNextInvoiceSyncRequested"
     _: KW_ONLY
     message_id: UUID
 
@@ -3,13 +3,14 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, ClassVar, Dict
+from uuid import uuid4
 
 
-@dataclass
+@dataclass(slots=True)
 class DomainEvent(ABC):
-    event_id: str
-    event_type: str
+    event_type: ClassVar[str] = ""
+    event_id: str = field(default_factory=lambda: str(uuid4()))
     timestamp: datetime = field(default_factory=datetime.utcnow)
     metadata: Dict[str, Any] = field(default_factory=dict)
 
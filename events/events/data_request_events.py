@@ -1,11 +1,15 @@
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, ClassVar, Dict, Optional
+
+from events.codec import register_event
 
 from .base_event import DomainEvent
 
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class DataRequestEvent(DomainEvent):
+    event_type: ClassVar[str] = "data.request"
     source_app: str = ""
     target_app: str = ""
     requested_by: str = ""
@@ -15,8 +19,10 @@ class DataRequestEvent(DomainEvent):
         return self.request_id or self.event_id
 
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class DataResponseEvent(DomainEvent):
+    event_type: ClassVar[str] = "data.response"
     original_request_id: str = ""
     source_app: str = ""
     target_app: str = ""
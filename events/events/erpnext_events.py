@@ -1,19 +1,23 @@
 from dataclasses import dataclass, KW_ONLY
+from typing import ClassVar
 from uuid import UUID
+from events.codec import register_event
 from events.events.base_event import DomainEvent
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class ERPNextFulfillmentRequested(DomainEvent):
-    event_type = "ERPNextFulfillmentRequested"
+    event_type: ClassVar[str] = "ERPNextFulfillmentRequested"
     _: KW_ONLY
     message_id: UUID
 
     def get_aggregate_id(self) -> str:
         return str(self.message_id)
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class ERPNextFulfillmentProcessRequested(DomainEvent):
-    event_type = "ERPNextFulfillmentProcessRequested"
+    event_type: ClassVar[str] = "ERPNextFulfillmentProcessRequested"
     _: KW_ONLY
     message_id: UUID
 
@@ -1,14 +1,23 @@
+import json
 from dataclasses import dataclass, field
-from typing import Any, Dict
-from uuid import uuid4
+from typing import Any, ClassVar, Dict
+
+from events.codec import register_event
 
 from .base_event import DomainEvent
 
 
-@dataclass
+def _parse_raw_body(raw_body: bytes) -> Dict[str, Any]:
+    try:
+        return json.loads(raw_body)
+    except ValueError:
+        return {}
+
+
+@register_event
+@dataclass(slots=True)
 class IntegrationInboundEvent(DomainEvent):
-    event_id: str = field(default_factory=lambda: str(uuid4()))
-    event_type: str = "integration.inbound"
+    event_type: ClassVar[str] = "integration.inbound"
     company_id: str = ""
     integration: str = ""
     message_id: str = ""
@@ -19,10 +28,10 @@ class IntegrationInboundEvent(DomainEvent):
         return self.message_id or self.external_reference or self.company_id
 
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class IntegrationOutboundEvent(DomainEvent):
-    event_id: str = field(default_factory=lambda: str(uuid4()))
-    event_type: str = "integration.outbound"
+    event_type: ClassVar[str] = "integration.outbound"
     company_id: str = ""
     integration: str = ""
     message_id: str = ""
@@ -34,10 +43,11 @@ class IntegrationOutboundEvent(DomainEvent):
         return self.message_id or self.external_reference or self.company_id
 
 
-@dataclass
+# ``body`` is always the parsed ``raw_body``; the codec sends only the raw bytes.
+@register_event(derived={"body": ("raw_body", _parse_raw_body)})
+@dataclass(slots=True)
 class ShopifyWebhookReceivedEvent(DomainEvent):
-    event_id: str = field(default_factory=lambda: str(uuid4()))
-    event_type: str = "shopify.webhook.received"
+    event_type: ClassVar[str] = "shopify.webhook.received"
     shopify_domain: str = ""
     headers: Dict[str, Any] = field(default_factory=dict)
     body: Dict[str, Any] = field(default_factory=dict)
@@ -46,10 +56,10 @@ class ShopifyWebhookReceivedEvent(DomainEvent):
     def get_aggregate_id(self) -> str:
         return self.shopify_domain
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class IntegrationMessageReceived(DomainEvent):
-    event_id: str = field(default_factory=lambda: str(uuid4()))
-    event_type: str = "integration.message.received"
+    event_type: ClassVar[str] = "integration.message.received"
     message_id: str = ""
 
     def get_aggregate_id(self) -> str:
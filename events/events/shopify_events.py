@@ -1,10 +1,13 @@
 from dataclasses import dataclass, KW_ONLY
+from typing import ClassVar
 from uuid import UUID
+from events.codec import register_event
 from events.events.base_event import DomainEvent
 
-@dataclass
+@register_event
+@dataclass(slots=True)
 class ShopifyFulfillmentRequested(DomainEvent):
-    event_type = "ShopifyFulfillmentRequested"
+    event_type: ClassVar[str] = "ShopifyFulfillmentRequested"
     _: KW_ONLY
     message_id: UUID
 
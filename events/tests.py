@@ -0,0 +1,148 @@
+import asyncio
+import time
+from dataclasses import MISSING, fields
+from datetime import datetime
+from decimal import Decimal
+from uuid import uuid4
+
+from django.test import SimpleTestCase
+
+from events.bus import CorrelationRegistry, EventBus
+from events.codec import EventCodec, event_registry
+from events.events import (  # noqa: F401 - registra los esquemas de todos los módulos de eventos
+    accounting_events,
+    alegra_events,
+    data_request_events,
+    erpnext_events,
+    integration_events,
+    shopify_events,
+)
+from events.events.integration_events import IntegrationMessageReceived, ShopifyWebhookReceivedEvent
+
+
+def _sample_value(field):
+    if field.default is not MISSING:
+        current = field.default
+    elif field.default_factory is not MISSING:
+        current = field.default_factory()
+    else:
+        annotation = str(field.type)
+        current = {} if "Dict" in annotation or "dict" in annotation else [] if "List" in annotation else ""
+    if isinstance(current, bytes):
+        return b'{"id": 1}'
+    if isinstance(current, str):
+        return f"{field.name}-1"
+    if isinstance(current, dict):
+        return {"id": field.name, "total": Decimal("10.50"), "at": datetime(2026, 1, 2, 3, 4, 5), "ref": uuid4()}
+    if isinstance(current, list):
+        return [field.name, 1]
+    if isinstance(current, bool):
+        return not current
+    if isinstance(current, int):
+        return current + 7
+    return current
+
+
+def _sample(schema):
+    """Instance of the schema's class with every field set to a non-default value."""
+    values = {
+        field.name: _sample_value(field)
+        for field in fields(schema.cls)
+        if field.init and field.name not in ("event_id", "timestamp") and field.name not in schema.derived
+    }
+    for name, (source, derive) in schema.derived.items():
+        values[name] = derive(values[source])
+    return schema.cls(**values)
+
+
+class EventCodecTests(SimpleTestCase):
+    codecs = (EventCodec(event_registry, use_msgpack=False), EventCodec(event_registry))
+
+    def test_every_registered_event_round_trips(self):
+        self.assertTrue(event_registry.event_types())
+        for codec in self.codecs:
+            for event_type in event_registry.event_types():
+                with self.subTest(event_type=event_type, msgpack=codec.use_msgpack):
+                    event = _sample(event_registry.get(event_type))
+                    self.assertEqual(codec.decode(codec.encode(event)), event)
+
+    def test_payload_dicts_shaped_like_tagged_values_are_kept(self):
+        event = integration_events.IntegrationInboundEvent(
+            payload={"__t": "dt", "v": "2026-01-02T00:00:00", "nested": [{"__t": "esc", "v": 1}]}
+        )
+        for codec in self.codecs:
+            with self.subTest(msgpack=codec.use_msgpack):
+                self.assertEqual(codec.decode(codec.encode(event)).payload, event.payload)
+
+    def test_body_travels_when_raw_body_cannot_rebuild_it(self):
+        event = ShopifyWebhookReceivedEvent(body={"id": 1}, raw_body=b"id=1")
+        for codec in self.codecs:
+            with self.subTest(msgpack=codec.use_msgpack):
+                self.assertEqual(codec.decode(codec.encode(event)).body, {"id": 1})
+
+
+class CorrelationRegistryTests(SimpleTestCase):
+    def test_expired_and_overflowing_waiters_fail_and_late_responses_are_dropped(self):
+        registry = CorrelationRegistry(max_pending=2, default_ttl=60)
+        expiring = registry.create("a", ttl=0)
+        registry.create("b")
+        registry.create("c")
+        registry.create("d")  # Lleno: falla el más antiguo que queda ("b").
+        self.assertIsInstance(expiring.exception(timeout=0), TimeoutError)
+        self.assertEqual(len(registry), 2)
+        self.assertFalse(registry.resolve("b", "tarde"))
+        self.assertEqual(registry.late_responses, 1)
+        self.assertTrue(registry.resolve("c", "ok"))
+
+    def test_expired_entries_are_evicted_without_new_requests(self):
+        registry = CorrelationRegistry(default_ttl=60)
+        future = registry.create("a", ttl=0)
+        registry._next_sweep = 0.0
+        registry.discard("otro")
+        self.assertEqual(len(registry), 0)
+        self.assertIsInstance(future.exception(timeout=0), TimeoutError)
+
+
+class EventBusRequestTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.bus = EventBus(request_ttl=5)
+
+        def handler(event):
+            # Handler síncrono y lento: no debe bloquear el loop ni serializar el fan-out.
+            time.sleep(0.2)
+            self.bus.respond_to_request(event.event_id, {"message_id": event.message_id})
+
+        self.bus.subscribe(IntegrationMessageReceived.event_type, handler)
+
+    def test_request_resolves_with_the_response(self):
+        response = asyncio.run(self.bus.request(IntegrationMessageReceived(message_id="m1"), timeout=2))
+        self.assertEqual(response, {"message_id": "m1"})
+
+    def test_request_many_runs_handlers_concurrently(self):
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            started = time.monotonic()
+            results = await self.bus.request_many(
+                [IntegrationMessageReceived(message_id=f"m{index}") for index in range(4)], timeout=2
+            )
+            task.cancel()
+            return results, time.monotonic() - started, ticks
+
+        results, elapsed, ticks = asyncio.run(run())
+        self.assertEqual([result["message_id"] for result in results], ["m0", "m1", "m2", "m3"])
+        self.assertLess(elapsed, 0.6)
+        self.assertGreater(ticks, 5)
+
+    def test_request_times_out_and_cleans_up(self):
+        bus = EventBus(request_ttl=0.05)
+        with self.assertRaises(TimeoutError):
+            asyncio.run(bus.request(IntegrationMessageReceived(message_id="sin-respuesta")))
+        self.assertEqual(len(bus._pending_requests), 0)